@@ -0,0 +1,32 @@
+"""Move transações e notificações antigas para o arquivo frio: ``python -m src.archive``.
+
+Uso: ``python -m src.archive [--days N] [--before AAAA-MM-DD] [--vacuum]``.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from src import config
+from src.main import create_app
+from src.models.user import db
+from src.services.archive import archive
+
+parser = argparse.ArgumentParser(description='Arquiva transações e notificações antigas')
+parser.add_argument('--days', type=int, default=config.ARCHIVE_HOT_DAYS,
+                    help='mantém nas tabelas quentes os últimos N dias')
+parser.add_argument('--before', type=datetime.fromisoformat,
+                    help='arquiva tudo antes desta data (substitui --days)')
+parser.add_argument('--vacuum', action='store_true',
+                    help='compacta o arquivo do banco depois de arquivar')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    cutoff = args.before or datetime.utcnow() - timedelta(days=args.days)
+    archived = archive(cutoff, log=print)
+    print(f"Arquivadas antes de {cutoff:%Y-%m-%d %H:%M}: "
+          + ', '.join(f'{table}={count}' for table, count in archived.items()))
+    if args.vacuum and any(archived.values()):
+        db.session.remove()
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('VACUUM')
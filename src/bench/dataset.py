@@ -0,0 +1,239 @@
+"""Gera um banco grande e realista: ``python -m src.bench.dataset --output /tmp/big.db``.
+
+Aplica as migrações num arquivo novo e insere, em lotes, usuários,
+transações, notificações, avaliações, motoristas, veículos (com posição e
+traçado em cache), linhas e inscrições. Determinístico para a mesma
+semente. Todos os usuários gerados têm a senha ``senha123``; o
+administrador é ``admin`` / ``admin123``.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+CHUNK = 50_000
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Centro aproximado de Chapecó, como em config.ROUTE_ORIGIN_*
+CENTER_LAT = -27.10
+CENTER_LON = -52.62
+
+STREETS = ('Centro', 'Efapi', 'Passo dos Fortes', 'Palmital', 'São Cristóvão', 'Bela Vista',
+           'Cristo Rei', 'Jardim Itália', 'Presidente Médici', 'Santa Maria', 'Seminário', 'Universitário')
+
+
+def _insert(conn, sql, rows, log=None, label=None):
+    """Insere ``rows`` (gerador de tuplas) em lotes de CHUNK."""
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK:
+            conn.exec_driver_sql(sql, batch)
+            total += len(batch)
+            batch = []
+            if log and total % (CHUNK * 10) == 0:
+                log(f'  {label}: {total}')
+    if batch:
+        conn.exec_driver_sql(sql, batch)
+        total += len(batch)
+    return total
+
+
+def _moment(rng, now, days):
+    return (now - timedelta(seconds=rng.uniform(0, days * 86400))).strftime(DATETIME_FORMAT)
+
+
+def _polyline(rng):
+    from src.services.geo import encode_polyline
+
+    lat = CENTER_LAT + rng.uniform(-0.03, 0.03)
+    lon = CENTER_LON + rng.uniform(-0.03, 0.03)
+    heading = rng.uniform(0, 2 * math.pi)
+    points = []
+    for _ in range(400):
+        heading += rng.uniform(-0.3, 0.3)
+        lat += 0.0003 * math.cos(heading)
+        lon += 0.0003 * math.sin(heading)
+        points.append((lat, lon))
+    return encode_polyline(points)
+
+
+def generate(conn, args, log=print):
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    password = generate_password_hash('senha123')
+
+    conn.exec_driver_sql(
+        'INSERT INTO user (username, email, password, role, card_balance, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        ('admin', 'admin@bench.local', generate_password_hash('admin123'), 'admin', 0.0, now.strftime(DATETIME_FORMAT))
+    )
+    count = _insert(conn,
+        'INSERT INTO user (username, email, password, role, card_balance, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        ((f'user{i:06d}', f'user{i:06d}@bench.local', password, 'user',
+          round(rng.uniform(20, 500), 2), _moment(rng, now, 730)) for i in range(args.users)),
+        log, 'usuários')
+    log(f'usuários: {count}')
+    user_ids = range(2, args.users + 2)
+
+    routes = []
+    for i in range(1, args.routes + 1):
+        origin, destination = rng.sample(STREETS, 2)
+        routes.append((f'{i:03d}', f'{origin} - {destination}', origin, destination,
+                       rng.choice((3.5, 4.5, 5.0)), 1))
+    conn.exec_driver_sql(
+        'INSERT INTO bus_route (route_number, route_name, origin, destination, fare, active) VALUES (?, ?, ?, ?, ?, ?)',
+        routes)
+    route_ids = range(1, args.routes + 1)
+    fares = {route_id: routes[route_id - 1][4] for route_id in route_ids}
+    log(f'linhas: {len(routes)}')
+
+    def transactions():
+        for _ in range(args.transactions):
+            user_id = rng.choice(user_ids)
+            created_at = _moment(rng, now, args.days)
+            if rng.random() < 0.15:
+                amount = rng.choice((10.0, 20.0, 50.0, 100.0))
+                yield (user_id, amount, 'recharge', f'Recarga via PIX - R$ {amount:.2f}', None, created_at)
+            else:
+                route_id = rng.choice(route_ids)
+                yield (user_id, -fares[route_id], 'usage',
+                       f'Uso do transporte - Linha {route_id:03d}', route_id, created_at)
+    count = _insert(conn,
+        'INSERT INTO "transaction" (user_id, amount, transaction_type, description, route_id, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)', transactions(), log, 'transações')
+    log(f'transações: {count}')
+
+    # Contadores de embarques coerentes com as transações geradas
+    conn.exec_driver_sql('''INSERT OR REPLACE INTO ridership_hourly (route_id, hour, taps, revenue)
+        SELECT route_id, strftime('%Y-%m-%d %H:00:00.000000', created_at), COUNT(*), -SUM(amount)
+        FROM "transaction"
+        WHERE transaction_type = 'usage' AND route_id IS NOT NULL
+        GROUP BY route_id, strftime('%Y-%m-%d %H:00:00.000000', created_at)''')
+
+    count = _insert(conn,
+        'INSERT INTO notification (user_id, title, message, read, created_at) VALUES (?, ?, ?, ?, ?)',
+        ((rng.choice(user_ids), 'Recarga Realizada',
+          'Sua recarga foi realizada com sucesso. Seu novo saldo já está disponível.',
+          rng.random() < 0.7, _moment(rng, now, args.days)) for _ in range(args.notifications)),
+        log, 'notificações')
+    log(f'notificações: {count}')
+
+    def ratings():
+        for _ in range(args.ratings):
+            moment = now - timedelta(seconds=rng.uniform(0, args.days * 86400))
+            yield (rng.choice(user_ids), rng.randint(1, 5), rng.randint(0, 5), rng.randint(0, 5),
+                   rng.randint(0, 5), rng.randint(0, 5), rng.choice(('', 'Ônibus lotado', 'Motorista atencioso')),
+                   f'{rng.choice(route_ids):03d}', moment.strftime('%Y-%m-%d'), moment.strftime('%H:%M:00.000000'),
+                   moment.strftime(DATETIME_FORMAT))
+    count = _insert(conn,
+        'INSERT INTO rating (user_id, overall_rating, punctuality_rating, cleanliness_rating, comfort_rating, '
+        'service_rating, comments, bus_line, trip_date, trip_time, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        ratings(), log, 'avaliações')
+    log(f'avaliações: {count}')
+
+    def line_of(route_id):
+        return f'{routes[route_id - 1][0]} - {routes[route_id - 1][1]}'
+
+    driver_lines = [rng.choice(route_ids) for _ in range(args.drivers)]
+    _insert(conn,
+        'INSERT INTO driver (name, email, cpf, cnh, bus_line, code, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        ((f'Motorista {i:05d}', f'motorista{i:05d}@bench.local',
+          f'{i // 1000000 % 1000:03d}.{i // 1000 % 1000:03d}.{i % 1000:03d}-00', f'{i:011d}',
+          line_of(driver_lines[i]), f'MOT{i:05d}', _moment(rng, now, 730)) for i in range(args.drivers)))
+    log(f'motoristas: {args.drivers}')
+
+    vehicles = []
+    for i in range(args.vehicles):
+        driver_index = i if i < args.drivers else None
+        route_id = driver_lines[driver_index] if driver_index is not None else rng.choice(route_ids)
+        vehicles.append((route_id, driver_index + 1 if driver_index is not None else None))
+    _insert(conn,
+        'INSERT INTO vehicle (plate, model, brand, year, capacity, status, bus_line, driver_id, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        ((f'BUS{i:05d}', rng.choice(('OF-1721', 'Apache VIP', 'Torino')),
+          rng.choice(('Mercedes-Benz', 'Caio', 'Marcopolo')), rng.randint(2010, 2024),
+          rng.choice((40, 60, 80)), rng.choices(('ativo', 'manutencao', 'inativo'), (90, 7, 3))[0],
+          line_of(route_id), driver_id, _moment(rng, now, 730))
+         for i, (route_id, driver_id) in enumerate(vehicles)))
+    fix_time = now.strftime(DATETIME_FORMAT)
+    _insert(conn,
+        'INSERT INTO bus_location (route_id, bus_id, bus_number, latitude, longitude, last_updated) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        ((route_id, i + 1, f'BUS{i:05d}', CENTER_LAT + rng.uniform(-0.05, 0.05),
+          CENTER_LON + rng.uniform(-0.05, 0.05), fix_time) for i, (route_id, _) in enumerate(vehicles)))
+    # Traçados em cache para /api/route/<bus_id> não depender da API do Google
+    _insert(conn,
+        'INSERT INTO route (route_name, origin_lat, origin_lon, destination_lat, destination_lon, polyline) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        ((f'Linha_{i + 1}', CENTER_LAT, CENTER_LON, CENTER_LAT, CENTER_LON, _polyline(rng))
+         for i in range(args.vehicles)))
+    log(f'veículos: {args.vehicles}')
+
+    subscribed = set()
+    for user_id in rng.sample(user_ids, len(user_ids) // 2):
+        for route_id in rng.sample(route_ids, min(2, len(route_ids))):
+            subscribed.add((user_id, route_id))
+    count = _insert(conn,
+        'INSERT INTO line_subscription (user_id, route_id, created_at) VALUES (?, ?, ?)',
+        ((user_id, route_id, fix_time) for user_id, route_id in sorted(subscribed)))
+    log(f'inscrições em linhas: {count}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output', required=True, help='arquivo SQLite a criar')
+    parser.add_argument('--force', action='store_true', help='sobrescreve o arquivo se existir')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--days', type=int, default=365, help='período coberto pelo histórico')
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--transactions', type=int, default=2_000_000)
+    parser.add_argument('--notifications', type=int, default=1_000_000)
+    parser.add_argument('--ratings', type=int, default=200_000)
+    parser.add_argument('--routes', type=int, default=60)
+    parser.add_argument('--drivers', type=int, default=2_000)
+    parser.add_argument('--vehicles', type=int, default=3_000)
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.output)
+    if os.path.exists(path):
+        if not args.force:
+            print(f'{path} já existe (use --force para sobrescrever)')
+            return 1
+        os.remove(path)
+
+    from src.main import create_app
+    from src.models.user import db
+    from src.migrations import upgrade
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        upgrade(db.engine)
+        start = time.perf_counter()
+        with db.engine.connect() as conn:
+            # Sem diário durante a carga: se falhar, basta gerar de novo
+            conn.exec_driver_sql('PRAGMA journal_mode=OFF')
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            conn.commit()
+            with conn.begin():
+                generate(conn, args)
+            conn.exec_driver_sql('ANALYZE')
+        # Níveis simplificados dos traçados, como em toda gravação de traçado
+        from src.models.bus_location import Route
+        from src.services.route_geometry import build_tiers
+        for route_id, polyline in db.session.query(Route.id, Route.polyline).all():
+            build_tiers(route_id, polyline)
+        db.session.commit()
+        db.engine.dispose()
+    size_mb = os.path.getsize(path) / 1e6
+    print(f'{path}: {size_mb:.0f} MB em {time.perf_counter() - start:.0f} s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
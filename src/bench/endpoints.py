@@ -0,0 +1,272 @@
+"""Benchmark dos endpoints: ``python -m src.bench.endpoints --database /tmp/big.db``.
+
+Roda, em processo (cliente de teste do Flask), cada endpoint de ``user_bp``
+e ``tracking_bp`` contra uma cópia do banco gerado por
+``python -m src.bench.dataset``, e mede por endpoint a latência (p50/p95),
+o número de consultas SQL e o pico de memória alocada numa execução.
+
+``--save-baseline`` grava os números; ``--baseline`` compara com eles e
+falha (código de saída 1) se a latência mediana piorar mais que a
+tolerância ou se o número de consultas aumentar.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Diferenças abaixo disto são ruído, seja qual for a tolerância relativa
+NOISE_FLOOR_MS = 1.0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Context:
+    """Ids do banco usados pelos casos e um contador para dados únicos por chamada."""
+
+    def __init__(self, user_id, admin_id, route_id, vehicle_ids, driver_id):
+        self.user_id = user_id
+        self.admin_id = admin_id
+        self.route_id = route_id
+        self.vehicle_ids = vehicle_ids
+        self.driver_id = driver_id
+        self.counter = 0
+
+    def next(self):
+        self.counter += 1
+        return self.counter
+
+
+def _new_driver(ctx):
+    from src.models.user import db, Driver
+
+    n = ctx.next()
+    driver = Driver(name=f'Bench {n}', email=f'bench{n}@bench.local', cpf=f'bench-{n}', cnh=f'b{n:010d}',
+                    bus_line='001', code=f'BENCH{n}')
+    db.session.add(driver)
+    db.session.commit()
+    return driver.id
+
+
+def _new_vehicle(ctx):
+    from src.models.user import db, Vehicle
+
+    vehicle = Vehicle(plate=f'BCH{ctx.next():05d}', model='m', brand='b', year=2020, capacity=40, status='ativo')
+    db.session.add(vehicle)
+    db.session.commit()
+    return vehicle.id
+
+
+def _driver_body(ctx, n=None):
+    n = n if n is not None else ctx.next()
+    return {'name': f'Bench {n}', 'email': f'benchp{n}@bench.local', 'cpf': f'benchp-{n}',
+            'cnh': f'p{n:010d}', 'bus_line': '001 - Bench', 'code': f'BENCHP{n}'}
+
+
+def _fix(ctx):
+    return {'bus_id': ctx.vehicle_ids[ctx.next() % len(ctx.vehicle_ids)],
+            'latitude': -27.1 + (ctx.counter % 100) * 0.001, 'longitude': -52.62,
+            'timestamp': datetime.utcnow().isoformat() + 'Z'}
+
+
+# (nome, método, caminho, corpo, sessão, preparo)
+# caminho e corpo podem ser funções de (ctx, preparado); sessão é None, 'user' ou 'admin';
+# preparo roda fora da medição (ex.: criar a linha que o DELETE vai apagar).
+CASES = [
+    ('register', 'POST', '/api/register',
+     lambda ctx, _: {'username': f'bench{ctx.next()}', 'email': f'bench{ctx.counter}@x.local', 'password': 'senha123'},
+     None, None),
+    ('login', 'POST', '/api/login', {'username': 'user000000', 'password': 'senha123'}, None, None),
+    ('logout', 'POST', '/api/logout', None, 'user', None),
+    ('profile', 'GET', '/api/profile', None, 'user', None),
+    ('profile_update', 'PUT', '/api/profile', {'username': 'user000000', 'email': 'user000000@bench.local'},
+     'user', None),
+    ('balance', 'GET', '/api/balance', None, 'user', None),
+    ('dashboard', 'GET', '/api/dashboard', None, 'user', None),
+    ('recharge', 'POST', '/api/recharge', {'amount': 20, 'payment_method': 'pix'}, 'user', None),
+    ('notifications', 'GET', '/api/notifications', None, 'user', None),
+    ('transactions', 'GET', '/api/transactions', None, 'user', None),
+    ('routes', 'GET', '/api/routes', None, None, None),
+    ('bus_locations', 'GET', lambda ctx, _: f'/api/bus-locations/{ctx.route_id}', None, None, None),
+    ('use_transport', 'POST', '/api/use-transport', lambda ctx, _: {'route_id': ctx.route_id}, 'user', None),
+    ('drivers_list', 'GET', '/api/admin/drivers', None, 'admin', None),
+    ('driver_create', 'POST', '/api/admin/drivers', lambda ctx, _: _driver_body(ctx), 'admin', None),
+    ('driver_update', 'PUT', lambda ctx, _: f'/api/admin/drivers/{ctx.driver_id}',
+     lambda ctx, _: _driver_body(ctx, 0), 'admin', None),
+    ('driver_get', 'GET', lambda ctx, _: f'/api/admin/drivers/{ctx.driver_id}', None, 'admin', None),
+    ('driver_delete', 'DELETE', lambda ctx, driver_id: f'/api/admin/drivers/{driver_id}', None, 'admin', _new_driver),
+    ('populate_routes', 'POST', '/api/admin/populate-routes', None, 'admin', None),
+    ('forgot_password', 'POST', '/api/forgot-password', {'email': 'user000000@bench.local'}, None, None),
+    ('reset_password', 'POST', '/api/reset-password',
+     lambda ctx, _: {'user_id': ctx.user_id, 'new_password': 'senha123', 'confirm_password': 'senha123'},
+     None, None),
+    ('submit_rating', 'POST', '/api/submit-rating',
+     {'overall_rating': 4, 'punctuality_rating': 3, 'bus_line': '001', 'trip_date': '2026-01-10', 'trip_time': '08:15'},
+     'user', None),
+    ('ratings', 'GET', '/api/ratings', None, 'user', None),
+    ('ratings_stats', 'GET', '/api/ratings/stats', None, None, None),
+    ('vehicles_list', 'GET', '/api/admin/vehicles', None, 'admin', None),
+    ('vehicle_create', 'POST', '/api/admin/vehicles',
+     lambda ctx, _: {'plate': f'BCP{ctx.next():05d}', 'model': 'm', 'brand': 'b', 'year': 2020, 'capacity': 40,
+                     'status': 'ativo'}, 'admin', None),
+    ('vehicle_update', 'PUT', lambda ctx, _: f'/api/admin/vehicles/{ctx.vehicle_ids[0]}',
+     {'plate': 'BUS00000', 'model': 'Torino', 'brand': 'Marcopolo', 'year': 2020, 'capacity': 60,
+      'status': 'ativo', 'bus_line': '001 - Bench'}, 'admin', None),
+    ('vehicle_get', 'GET', lambda ctx, _: f'/api/admin/vehicles/{ctx.vehicle_ids[0]}', None, 'admin', None),
+    ('vehicle_delete', 'DELETE', lambda ctx, vehicle_id: f'/api/admin/vehicles/{vehicle_id}', None, 'admin',
+     _new_vehicle),
+    ('search_typeahead', 'GET', '/api/admin/search?q=mot', None, 'admin', None),
+    ('search_multiword', 'GET', '/api/admin/search?q=motorista+0001&kind=driver', None, 'admin', None),
+    ('update_location', 'POST', '/api/update_location', lambda ctx, _: _fix(ctx), None, None),
+    ('bus_clusters', 'GET', '/api/bus-clusters?bbox=-52.70,-27.15,-52.55,-27.05&zoom=13', None, None, None),
+    ('route_geometry', 'GET', lambda ctx, _: f'/api/route/{ctx.vehicle_ids[0]}?zoom=12', None, None, None),
+]
+
+
+def _resolve(value, ctx, prepared):
+    return value(ctx, prepared) if callable(value) else value
+
+
+def run_case(app, client, ctx, case, iterations, counter):
+    name, method, path, body, role, prepare = case
+    user_ids = {'user': ctx.user_id, 'admin': ctx.admin_id}
+
+    def call(measure_memory=False):
+        with client.session_transaction() as session:
+            session.clear()
+            if role:
+                session['user_id'] = user_ids[role]
+        prepared = None
+        if prepare:
+            with app.app_context():
+                prepared = prepare(ctx)
+        url = _resolve(path, ctx, prepared)
+        payload = _resolve(body, ctx, prepared)
+
+        if measure_memory:
+            tracemalloc.start()
+        queries_before = counter[0]
+        start = time.perf_counter()
+        response = client.open(url, method=method, json=payload)
+        elapsed = (time.perf_counter() - start) * 1000
+        queries = counter[0] - queries_before
+        peak = 0
+        if measure_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return response.status_code, elapsed, queries, peak
+
+    call()  # aquecimento: caches, planos de consulta, carga preguiçosa dos serviços
+    timings, queries, statuses = [], [], set()
+    for _ in range(iterations):
+        status, elapsed, query_count, _ = call()
+        timings.append(elapsed)
+        queries.append(query_count)
+        statuses.add(status)
+    _, _, _, peak = call(measure_memory=True)
+    return {
+        'status': sorted(statuses),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = result['p50_ms'] - base['p50_ms']
+        if slower > NOISE_FLOOR_MS and result['p50_ms'] > base['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {base['p50_ms']:.1f} -> {result['p50_ms']:.1f} ms")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: consultas {base['queries']} -> {result['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', required=True, help='arquivo SQLite gerado por src.bench.dataset')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--only', help='padrão (fnmatch) dos nomes dos casos, ex.: "driver_*"')
+    parser.add_argument('--baseline', help='JSON de referência para comparar')
+    parser.add_argument('--save-baseline', help='grava os resultados como referência')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='piora relativa aceita no p50')
+    args = parser.parse_args()
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from src.main import create_app
+    from src.models.user import User, BusRoute, Driver, Vehicle
+
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        # Os casos escrevem no banco: cada execução parte de uma cópia limpa
+        database = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(args.database, database)
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}',
+            'ARCHIVE_DIR': os.path.join(workdir, 'archive'),
+            'TESTING': True
+        })
+
+        counter = [0]
+
+        def count_query(*_):
+            counter[0] += 1
+        event.listen(Engine, 'before_cursor_execute', count_query)
+
+        with app.app_context():
+            ctx = Context(
+                user_id=User.query.filter_by(username='user000000').first().id,
+                admin_id=User.query.filter_by(role='admin').first().id,
+                route_id=BusRoute.query.order_by(BusRoute.id).first().id,
+                vehicle_ids=[v for (v,) in Vehicle.query.with_entities(Vehicle.id).order_by(Vehicle.id).limit(500)],
+                driver_id=Driver.query.order_by(Driver.id).first().id
+            )
+
+        client = app.test_client()
+        cases = [case for case in CASES if not args.only or fnmatch.fnmatch(case[0], args.only)]
+        results = {}
+        print(f"{'endpoint':<18} {'status':<10} {'p50 ms':>9} {'p95 ms':>9} {'consultas':>9} {'pico KB':>9}")
+        for case in cases:
+            result = run_case(app, client, ctx, case, args.iterations, counter)
+            results[case[0]] = result
+            print(f"{case[0]:<18} {','.join(map(str, result['status'])):<10} {result['p50_ms']:>9.1f} "
+                  f"{result['p95_ms']:>9.1f} {result['queries']:>9} {result['peak_kb']:>9.1f}")
+        event.remove(Engine, 'before_cursor_execute', count_query)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'iterations': args.iterations, 'cases': results}, f, indent=2, sort_keys=True)
+        print(f'referência gravada em {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('FALHA: regressões em relação à referência')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print(f'sem regressões (tolerância {args.tolerance:.0%} no p50)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Benchmark do tempo de inicialização: ``python -m src.bench.import_time``.
+
+Mede, em processos novos, quanto custa importar ``src.main`` e criar a
+aplicação, e falha (código de saída 1) se a mediana passar do orçamento ou se
+dependências pesadas forem carregadas na inicialização.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Módulos da aplicação que só devem ser importados sob demanda (rotas pouco
+# usadas, CLIs e cálculos pesados). O ``requests`` não entra aqui porque o
+# cliente do engineio já o importa quando instalado.
+LAZY_MODULES = [
+    'src.services.planner',
+    'src.services.exports',
+    'src.services.route_geometry',
+    'src.services.simplify',
+    'src.services.gtfs',
+]
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from src.main import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_ms": (created - imported) * 1000,
+    "eager": [m for m in %r if m in sys.modules],
+}))
+'''
+
+
+def run_once():
+    output = subprocess.run(
+        [sys.executable, '-c', _PROBE % (LAZY_MODULES,)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=1500.0,
+                        help='orçamento para a mediana de importação + criação da app')
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    import_ms = statistics.median(r['import_ms'] for r in results)
+    create_ms = statistics.median(r['create_ms'] for r in results)
+    total_ms = import_ms + create_ms
+    eager = sorted({m for r in results for m in r['eager']})
+
+    print(f'importação: {import_ms:.1f} ms  create_app: {create_ms:.1f} ms  total: {total_ms:.1f} ms '
+          f'(mediana de {args.runs}, orçamento {args.budget_ms:.0f} ms)')
+    failed = False
+    if eager:
+        print(f'FALHA: módulos carregados na inicialização: {", ".join(eager)}')
+        failed = True
+    if total_ms > args.budget_ms:
+        print('FALHA: inicialização acima do orçamento')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""Teste de carga do modo de produção: ``python -m src.bench.load --database /tmp/big.db``.
+
+Sobe ``python -m src.server --mode production`` numa cópia do banco gerado
+por ``python -m src.bench.dataset`` e, ao mesmo tempo:
+
+* abre ``--watchers`` conexões WebSocket no namespace ``/tracking`` (todas
+  recebem cada ``location_update``);
+* roda ``--http-workers`` clientes HTTP em laço: linhas e agrupamentos,
+  mais logins (hash de senha) e posições de ônibus, que geram o fan-out,
+  em taxas fixas.
+
+``--stalled`` clientes conectam no /tracking por long-polling e param de
+buscar mensagens (o pior caso de conexão lenta): devem ser desconectados pelas filas de saída limitadas
+(src/services/outbox.py) sem que a memória do servidor acompanhe o atraso.
+
+Depois de ``--duration`` segundos envia SIGTERM e confere o esvaziamento:
+o processo deve sair com código 0 dentro de ``SERVER_SHUTDOWN_GRACE_S`` e
+todos os observadores devem ter sido desconectados. Falha (código 1) se
+algum observador não conectar, se houver erro HTTP ou se o esvaziamento
+não terminar a tempo.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import gevent
+from gevent.event import Event
+import requests
+from simple_websocket import Client, ConnectionClosed
+
+from src import config
+from src.bench.planner import percentile
+
+
+class Watcher:
+    def __init__(self, base_url):
+        self.url = base_url.replace('http', 'ws', 1) + '/socket.io/?EIO=4&transport=websocket'
+        self.connected = False
+        self.connect_ms = None
+        self.received = 0
+        self.latencies = []
+        self.disconnected_at = None
+        self.error = None
+
+    def run(self, sent):
+        start = time.perf_counter()
+        try:
+            ws = Client.connect(self.url)
+            # Sem esperar o '0{...}' de abertura do Engine.IO: o cliente do simple-websocket
+            # às vezes só o entrega junto com o próximo pacote
+            ws.send('40/tracking,')
+            while True:
+                message = ws.receive(timeout=60)
+                if message is None:
+                    raise TimeoutError('sem resposta do servidor')
+                if message.startswith('40/tracking'):
+                    self.connected = True
+                    self.connect_ms = (time.perf_counter() - start) * 1000
+                elif message == '2':
+                    ws.send('3')
+                elif message.startswith('42/tracking,'):
+                    name, payload = json.loads(message[len('42/tracking,'):])
+                    if name == 'location_update':
+                        self.received += 1
+                        sent_at = sent.get(payload.get('bus_id'))
+                        if sent_at is not None:
+                            self.latencies.append((time.time() - sent_at) * 1000)
+                elif message == '1' or message.startswith('41/tracking'):
+                    break
+        except ConnectionClosed:
+            pass
+        except Exception as exc:
+            self.error = repr(exc)
+        self.disconnected_at = time.time()
+
+
+def stalled_client(base_url, held):
+    """Abre uma sessão de long-polling no /tracking e nunca mais busca mensagens.
+
+    Tudo o que o servidor emitir para ela fica na fila do Engine.IO, sem
+    buffers do kernel no meio: é o caso que as filas limitadas evitam.
+    """
+    session = requests.Session()
+    url = base_url + '/socket.io/?EIO=4&transport=polling'
+    opened = session.get(url, timeout=30).text
+    sid = json.loads(opened[opened.index('{'):])['sid']
+    session.post(f'{url}&sid={sid}', data='40/tracking,', timeout=30)
+    held.append(session)
+
+
+def _metric_total(text, name):
+    return sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+               if line.startswith(name + '{') or line.startswith(name + ' '))
+
+
+def _rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def http_worker(base_url, stop, stats, sent, vehicle_ids, fix_interval, login_interval):
+    session = requests.Session()
+    rng = random.Random()
+    # Início espalhado para as posições e logins não saírem todos juntos
+    next_fix = time.time() + rng.uniform(0, fix_interval)
+    next_login = time.time() + rng.uniform(0, login_interval)
+    while not stop.is_set():
+        now = time.time()
+        if now >= next_fix:
+            bus_id = rng.choice(vehicle_ids)
+            kind, method, path = 'update_location', 'POST', '/api/update_location'
+            body = {'bus_id': bus_id, 'latitude': -27.10 + rng.uniform(-0.05, 0.05),
+                    'longitude': -52.62 + rng.uniform(-0.05, 0.05),
+                    'timestamp': datetime.utcnow().isoformat() + 'Z'}
+            sent[bus_id] = now
+            next_fix = now + fix_interval
+        elif now >= next_login:
+            kind, method, path = 'login', 'POST', '/api/login'
+            body = {'username': f'user{rng.randrange(1000):06d}', 'password': 'senha123'}
+            next_login = now + login_interval
+        else:
+            kind, method, path, body = rng.choice((
+                ('routes', 'GET', '/api/routes', None),
+                ('bus_clusters', 'GET', '/api/bus-clusters?bbox=-52.70,-27.15,-52.55,-27.05&zoom=13', None),
+            ))
+        start = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, json=body, timeout=30)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        stats[kind].append(((time.perf_counter() - start) * 1000, ok))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            requests.get(base_url + '/api/routes', timeout=2)
+            return True
+        except requests.RequestException:
+            gevent.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', required=True, help='arquivo SQLite gerado por src.bench.dataset')
+    parser.add_argument('--watchers', type=int, default=2000)
+    parser.add_argument('--http-workers', type=int, default=50)
+    parser.add_argument('--fixes-per-second', type=float, default=5.0,
+                        help='posições enviadas por segundo, somando todos os clientes HTTP')
+    parser.add_argument('--logins-per-second', type=float, default=2.0,
+                        help='logins por segundo (cada um custa um hash de senha)')
+    parser.add_argument('--stalled', type=int, default=50, help='clientes que conectam e param de ler')
+    parser.add_argument('--duration', type=float, default=30.0)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = args.watchers + args.http_workers + 1024
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted if hard == resource.RLIM_INFINITY else min(wanted, hard), hard))
+
+    workdir = tempfile.mkdtemp(prefix='load-')
+    database = os.path.join(workdir, 'load.db')
+    shutil.copyfile(args.database, database)
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # Saída em arquivo: um pipe que ninguém lê enche e trava o servidor nos prints
+    server_log = open(os.path.join(workdir, 'server.log'), 'w+')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'src.server', '--mode', 'production', '--host', '127.0.0.1',
+         '--port', str(port), '--database', database],
+        cwd=root, stdout=server_log, stderr=subprocess.STDOUT, text=True
+    )
+    failures = []
+    try:
+        if not _wait_ready(base_url, process):
+            print('FALHA: o servidor não subiu')
+            return 1
+
+        with sqlite3.connect(database) as conn:
+            vehicle_ids = [row[0] for row in conn.execute('SELECT id FROM vehicle ORDER BY id LIMIT 1000')]
+
+        sent = {}
+        watchers = [Watcher(base_url) for _ in range(args.watchers)]
+        watcher_tasks = []
+        start = time.time()
+        for i, watcher in enumerate(watchers):
+            watcher_tasks.append(gevent.spawn(watcher.run, sent))
+            if i % 100 == 99:
+                gevent.sleep(0.05)
+        while sum(w.connected for w in watchers) < args.watchers and time.time() - start < 60:
+            gevent.sleep(0.2)
+        connected = sum(w.connected for w in watchers)
+        print(f'observadores conectados: {connected}/{args.watchers} em {time.time() - start:.1f} s')
+        held = []
+        gevent.joinall([gevent.spawn(stalled_client, base_url, held) for _ in range(args.stalled)],
+                       timeout=30)
+        rss_start = _rss_mb(process.pid)
+
+        stop = Event()
+        stats = defaultdict(list)
+        fix_interval = args.http_workers / args.fixes_per_second
+        login_interval = args.http_workers / args.logins_per_second
+        workers = [gevent.spawn(http_worker, base_url, stop, stats, sent, vehicle_ids, fix_interval, login_interval)
+                   for _ in range(args.http_workers)]
+        gevent.sleep(args.duration)
+        stop.set()
+        gevent.joinall(workers, timeout=30)
+        gevent.sleep(1)  # últimas entregas
+        rss_end = _rss_mb(process.pid)
+        metrics = requests.get(base_url + '/metrics', timeout=10).text
+
+        print(f"{'requisição':<16} {'total':>7} {'erros':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for kind, samples in sorted(stats.items()):
+            timings = [t for t, _ in samples]
+            errors = sum(1 for _, ok in samples if not ok)
+            if errors:
+                failures.append(f'{kind}: {errors} erros')
+            print(f'{kind:<16} {len(samples):>7} {errors:>6} {percentile(timings, 0.5):>8.1f} '
+                  f'{percentile(timings, 0.95):>8.1f} {percentile(timings, 0.99):>8.1f}')
+        total = sum(len(samples) for samples in stats.values())
+        print(f'vazão HTTP: {total / args.duration:.0f} req/s')
+
+        latencies = [latency for w in watchers for latency in w.latencies]
+        received = sum(w.received for w in watchers)
+        if latencies:
+            print(f'entregas aos observadores: {received} ({received / args.duration:.0f}/s), '
+                  f'latência p50 {percentile(latencies, 0.5):.0f} ms, p95 {percentile(latencies, 0.95):.0f} ms')
+        evicted = _metric_total(metrics, 'socketio_slow_consumer_evictions_total')
+        print(f'clientes travados: {len(held)}; desconectados por atraso: {evicted:.0f}; '
+              f'posições retidas substituídas: {_metric_total(metrics, "socketio_coalesced_total"):.0f}; '
+              f'memória do servidor: {rss_start:.0f} -> {rss_end:.0f} MB')
+        if args.duration > config.SOCKETIO_SLOW_CONSUMER_S + 5 and evicted < len(held):
+            failures.append(f'{len(held) - evicted:.0f} clientes travados não foram desconectados')
+        if connected < args.watchers:
+            errors = [w.error for w in watchers if w.error][:3]
+            failures.append(f'{args.watchers - connected} observadores sem conexão {errors}')
+
+        # Esvaziamento
+        signal_at = time.time()
+        process.send_signal(signal.SIGTERM)
+        try:
+            code = process.wait(timeout=config.SERVER_SHUTDOWN_GRACE_S + 10)
+        except subprocess.TimeoutExpired:
+            code = None
+        elapsed = time.time() - signal_at
+        gevent.joinall(watcher_tasks, timeout=5)
+        closed = sum(1 for w in watchers if w.disconnected_at is not None)
+        print(f'esvaziamento: código {code} em {elapsed:.1f} s; observadores desconectados: {closed}/{len(watchers)}')
+        if code != 0:
+            failures.append(f'servidor saiu com código {code}')
+        if elapsed > config.SERVER_SHUTDOWN_GRACE_S + 2:
+            failures.append(f'esvaziamento levou {elapsed:.1f} s')
+        if closed < connected:
+            failures.append(f'{connected - closed} observadores não foram desconectados')
+        for session in held:
+            session.close()
+    finally:
+        if process.poll() is None:
+            process.kill()
+        server_log.seek(0)
+        print('--- servidor ---')
+        for line in server_log.read().splitlines():
+            if not line.startswith('Client '):
+                print(line)
+        server_log.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print('FALHA:')
+        for line in failures:
+            print(f'  {line}')
+        return 1
+    print('ok')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
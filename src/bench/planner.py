@@ -0,0 +1,64 @@
+"""Benchmark do planejador: ``python -m src.bench.planner --database sqlite:////tmp/g.db``.
+
+Sorteia pares origem-destino entre as paradas com horários e mede a latência
+de ``Planner.plan`` (sem HTTP). Determinístico para a mesma semente.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', help='URI do banco com um feed GTFS importado')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--date', default=None, help='YYYY-MM-DD (padrão: hoje)')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='orçamento para o p95')
+    args = parser.parse_args()
+
+    from src.main import create_app
+    from src.services.planner import PLANNER
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database} if args.database else None)
+    with app.app_context():
+        start = time.perf_counter()
+        table = PLANNER.timetable()
+        print(f'estrutura construída em {(time.perf_counter() - start) * 1000:.0f} ms: {table.size}')
+
+        served = sorted({table.pattern_stops[i] for i in range(len(table.pattern_stops))})
+        if len(served) < 2:
+            print('nenhum horário importado')
+            return 1
+
+        day = date.fromisoformat(args.date) if args.date else date.today()
+        rng = random.Random(args.seed)
+        timings, found = [], 0
+        for _ in range(args.queries):
+            origin, destination = rng.sample(served, 2)
+            departure = rng.randint(6 * 3600, 20 * 3600)
+            start = time.perf_counter()
+            journeys = PLANNER.plan({origin: 0}, {destination: 0}, day, departure)
+            timings.append((time.perf_counter() - start) * 1000)
+            found += bool(journeys)
+
+    p95 = percentile(timings, 0.95)
+    print(f'{args.queries} consultas, {found} com itinerário: '
+          f'p50 {statistics.median(timings):.1f} ms  p95 {p95:.1f} ms  '
+          f'p99 {percentile(timings, 0.99):.1f} ms  máx {max(timings):.1f} ms')
+    if p95 > args.budget_ms:
+        print(f'FALHA: p95 acima de {args.budget_ms:.0f} ms')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
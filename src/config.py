@@ -10,3 +10,118 @@ ROUTE_ORIGIN_LAT = -27.10597
 ROUTE_ORIGIN_LON = -52.61336
 ROUTE_DEST_LAT = -27.07171
 ROUTE_DEST_LON = -52.63635
+
+# Filtro de ingestão de posições (src/services/ingest.py)
+# Intervalo mínimo, pelo relógio do dispositivo, entre duas posições aceitas do mesmo ônibus
+INGEST_MIN_INTERVAL_S = 2.0
+# Deslocamento mínimo para gravar e transmitir uma nova posição
+INGEST_MIN_DISTANCE_M = 10.0
+# Mesmo parado, o ônibus tem a posição renovada a cada intervalo deste
+INGEST_HEARTBEAT_S = 60.0
+# Posições mais antigas que isto (em relação ao servidor) são descartadas
+INGEST_MAX_FIX_AGE_S = 300.0
+# Tolerância para relógios de dispositivo adiantados
+INGEST_MAX_CLOCK_SKEW_S = 30.0
+
+# Gravação das posições recebidas para replay (src/simulator.py). None desativa.
+TRACE_RECORD_PATH = None
+
+# Cercas das paradas (src/services/geofence.py)
+# Lado da célula da grade espacial; deve ser maior que o maior raio de parada
+GEOFENCE_CELL_M = 250.0
+# A partida só é registrada quando o ônibus sai deste múltiplo do raio
+GEOFENCE_EXIT_FACTOR = 1.5
+
+# Versão dos dados de transporte (src/services/transit_version.py)
+# Intervalo mínimo entre as consultas que detectam paradas e feeds alterados por outro processo
+TRANSIT_VERSION_CHECK_S = 5.0
+
+# Versão dos cadastros de veículos e motoristas (src/services/roster_version.py)
+# Intervalo mínimo entre as consultas que detectam alterações feitas por outro processo
+ROSTER_VERSION_CHECK_S = 5.0
+
+# Planejador de viagens (src/services/planner.py)
+PLANNER_MAX_TRANSFERS = 3
+# Distância máxima a pé entre paradas para baldeação
+PLANNER_TRANSFER_RADIUS_M = 400.0
+# Distância máxima a pé da origem/destino até uma parada
+PLANNER_ACCESS_RADIUS_M = 600.0
+PLANNER_WALK_SPEED_MPS = 1.25
+
+# Agrupamento de ônibus no mapa (src/services/clustering.py)
+CLUSTER_MIN_ZOOM = 0
+CLUSTER_MAX_ZOOM = 18
+# Tamanho, em pixels de tela, da célula de agrupamento
+CLUSTER_CELL_PX = 64
+# Ônibus sem posição nova há mais que isto saem do mapa
+CLUSTER_MAX_AGE_S = 600.0
+# Intervalo entre os envios de agrupamentos para quem está no modo agrupado
+CLUSTER_PUSH_INTERVAL_S = 2.0
+
+# Níveis de simplificação dos traçados: (zoom máximo, tolerância em metros).
+# Acima do último zoom é servido o traçado original.
+ROUTE_GEOMETRY_TIERS = [(10, 60.0), (13, 8.0), (15, 2.0)]
+
+# Arquivo frio (src/services/archive.py)
+# Transações e notificações mais antigas que isto saem das tabelas quentes
+ARCHIVE_HOT_DAYS = 180
+
+# Exportações administrativas (src/services/exports.py)
+# Linhas lidas do cursor por vez e tamanho de cada bloco enviado ao cliente
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+# Lotação estimada dos veículos (src/services/occupancy.py)
+# Tempo médio a bordo: constante do decaimento exponencial da carga
+OCCUPANCY_DECAY_S = 1200.0
+# Embarque sem bus_id vai ao último veículo da linha visto há no máximo isto
+OCCUPANCY_VEHICLE_MAX_AGE_S = 300.0
+# Intervalo entre gravações das cargas no banco
+OCCUPANCY_CHECKPOINT_S = 60.0
+
+# Avisos em massa para os inscritos de uma linha (src/services/broadcasts.py)
+# Notificações inseridas por commit durante a entrega
+BROADCAST_CHUNK = 5000
+# Concessão da entrega, renovada a cada lote; vencida, outro processo (ou o reinício) retoma o aviso
+BROADCAST_LEASE_S = 120.0
+
+# Filas de saída por cliente no /tracking (src/services/outbox.py)
+# Pacotes na fila do Engine.IO de um cliente a partir dos quais as mensagens ficam retidas
+SOCKETIO_SEND_QUEUE_MAX = 64
+# Mensagens retidas (já sem as posições repetidas do mesmo ônibus) acima das quais o cliente cai
+SOCKETIO_PENDING_MAX = 500
+# Cliente com mensagens retidas há mais que isto é desconectado
+SOCKETIO_SLOW_CONSUMER_S = 15.0
+SOCKETIO_FLUSH_INTERVAL_S = 0.05
+
+# Estado da frota (src/services/fleet.py)
+# Mudanças guardadas para deltas; clientes mais atrasados recebem o retrato completo
+FLEET_DELTA_LOG = 10000
+# Intervalo entre os deltas enviados à sala 'fleet'
+FLEET_PUSH_INTERVAL_S = 1.0
+
+# Painel do passageiro (src/routes/dashboard.py)
+# Transações enviadas no retrato de /api/dashboard
+DASHBOARD_TRANSACTIONS = 10
+
+# Busca administrativa (src/services/search.py)
+# Registros por tipo além dos quais a varredura de um prefixo para (o total fica truncado)
+SEARCH_MAX_MATCHES = 1000
+SEARCH_PER_PAGE = 20
+SEARCH_MAX_PER_PAGE = 100
+
+# Servidor (src/server.py)
+# 'development': servidor do Werkzeug com depurador e recarga automática.
+# 'production': gevent, com greenlets cooperativos; sem depurador nem recarga.
+SERVER_MODE = 'development'
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 5000
+# Conexões simultâneas (requisições HTTP e WebSockets abertos) no processo
+SERVER_MAX_CONNECTIONS = 10000
+SERVER_BACKLOG = 2048
+# Conexão HTTP ociosa é fechada depois disto esperando a próxima requisição
+SERVER_KEEPALIVE_S = 75.0
+# Threads para trabalho de CPU que bloquearia os greenlets (hash de senha)
+SERVER_THREADPOOL_SIZE = 8
+# Ao desligar: tempo para as requisições e entregas em andamento terminarem
+SERVER_SHUTDOWN_GRACE_S = 20.0
@@ -1,8 +1,13 @@
-from src.main import app
+from src.main import create_app
 from src.models.user import db, User
+from src.migrations import upgrade
 from werkzeug.security import generate_password_hash
 
+app = create_app()
+
 with app.app_context():
+    upgrade(db.engine, log=print)
+
     # Verifica se o usuário admin já existe
     admin_user = User.query.filter_by(username='admin').first()
     
@@ -0,0 +1,21 @@
+"""Extensões compartilhadas, inicializadas por ``create_app``.
+
+Ficam fora de ``main.py`` para que blueprints e handlers possam importá-las
+sem importar a aplicação (o antigo ``from main import socketio`` era circular).
+"""
+from flask_socketio import SocketIO
+
+socketio = SocketIO()
+
+
+def offload(fn, *args):
+    """Executa ``fn`` numa thread do pool do gevent no modo de produção.
+
+    Para trabalho de CPU que libera o GIL, como o hash de senha: rodando no
+    próprio greenlet, ele pararia todos os outros clientes do processo.
+    Nos demais modos a chamada é direta.
+    """
+    if socketio.async_mode == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
@@ -0,0 +1,23 @@
+"""Importa um feed GTFS (zip): ``python -m src.import_gtfs feed.zip [--feed-key CHAVE]``."""
+import argparse
+import time
+
+from src.main import create_app
+from src.migrations import upgrade
+from src.models.user import db
+from src.services.gtfs import import_feed
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('path')
+parser.add_argument('--feed-key', help='identifica a fonte do feed (padrão: agency_name)')
+parser.add_argument('--force', action='store_true', help='reimporta mesmo se a versão não mudou')
+parser.add_argument('--database', help='URI do banco (padrão: src/database/app.db)')
+args = parser.parse_args()
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': args.database} if args.database else None)
+
+with app.app_context():
+    upgrade(db.engine, log=print)
+    start = time.perf_counter()
+    import_feed(args.path, feed_key=args.feed_key, force=args.force, log=print)
+    print(f'Concluído em {time.perf_counter() - start:.1f}s')
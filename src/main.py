@@ -4,40 +4,74 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
-from flask_socketio import SocketIO
 from flask_cors import CORS
 from src.models.user import db
-from src.models.bus_location import BusLocation, Route
-from src.routes.user import user_bp
-from src import config
+from src.extensions import socketio
+from src.services import metrics, profiler
+from src.services.outbox import OutboxManager
 
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+def create_app(config=None):
+    """Cria a aplicação sem efeitos colaterais: nenhuma conexão ao banco,
+    nenhum DDL. O esquema é mantido pelas migrações (python -m src.migrate).
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['ARCHIVE_DIR'] = os.path.join(os.path.dirname(__file__), 'database', 'archive')
+    # 'gevent' só com o monkey patch aplicado antes de qualquer import (src/server.py)
+    app.config['SOCKETIO_ASYNC_MODE'] = 'threading'
+    if config:
+        app.config.update(config)
 
-# Configurar CORS
-CORS(app, supports_credentials=True)
+    # Configurar CORS
+    CORS(app, supports_credentials=True)
 
-# Configurar SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-app.register_blueprint(user_bp, url_prefix='/api')
+    db.init_app(app)
+    metrics.init_app(app)
+    profiler.init_app(app)
 
+    # Configurar SocketIO
+    # Filas de saída limitadas por cliente no /tracking
+    socketio.init_app(app, cors_allowed_origins="*", async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                      client_manager=OutboxManager())
 
+    from src.routes.user import user_bp
+    from src.routes.tracking import tracking_bp
+    from src.routes.metrics import metrics_bp
+    from src.routes.profiling import profiling_bp
+    from src.routes.stops import stops_bp
+    from src.routes.planner import planner_bp
+    from src.routes.exports import exports_bp
+    from src.routes.ridership import ridership_bp
+    from src.routes.subscriptions import subscriptions_bp
+    from src.routes.fleet import fleet_bp
+    from src.routes.search import search_bp
+    from src.routes.dashboard import dashboard_bp
+    # Registra os handlers Socket.IO do namespace /driver
+    import src.routes.driver  # noqa: F401
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(tracking_bp, url_prefix='/api')
+    app.register_blueprint(profiling_bp, url_prefix='/api')
+    app.register_blueprint(stops_bp, url_prefix='/api')
+    app.register_blueprint(planner_bp, url_prefix='/api')
+    app.register_blueprint(exports_bp, url_prefix='/api')
+    app.register_blueprint(ridership_bp, url_prefix='/api')
+    app.register_blueprint(subscriptions_bp, url_prefix='/api')
+    app.register_blueprint(fleet_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
+    app.register_blueprint(dashboard_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
 
-# uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+    app.add_url_rule('/', 'serve', serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve', serve)
+    return app
 
-# Criar as tabelas se não existirem (apenas para desenvolvimento)
-with app.app_context():
-    db.create_all()
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
+    from flask import current_app
+    static_folder_path = current_app.static_folder
     if static_folder_path is None:
             return "Static folder not configured", 404
 
@@ -52,6 +86,6 @@ def serve(path):
 
 
 if __name__ == '__main__':
-    from src.routes.tracking import tracking_bp
-    app.register_blueprint(tracking_bp, url_prefix='/api')
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    # Os dois modos (config.SERVER_MODE) partem de src/server.py, que precisa
+    # aplicar o monkey patch do gevent antes de importar a aplicação
+    os.execv(sys.executable, [sys.executable, os.path.join(os.path.dirname(__file__), 'server.py')] + sys.argv[1:])
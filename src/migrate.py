@@ -0,0 +1,14 @@
+"""Aplica as migrações pendentes do banco: ``python -m src.migrate``."""
+import sys
+
+from src.main import create_app
+from src.models.user import db
+from src.migrations import current_version, latest_version, upgrade
+
+app = create_app()
+
+with app.app_context():
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    applied = upgrade(db.engine, target=target, log=print)
+    if not applied:
+        print(f'Banco já está na versão {current_version(db.engine)} (mais recente: {latest_version()}).')
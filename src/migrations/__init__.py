@@ -0,0 +1,110 @@
+"""Migrações versionadas do esquema do banco.
+
+Cada migração é um módulo com ``VERSION``, ``DESCRIPTION`` e ``upgrade(conn)``.
+As versões aplicadas ficam registradas na tabela ``schema_migrations``. O
+esquema nunca é alterado na importação da aplicação: rode
+``python -m src.migrate`` (ou chame ``upgrade``) antes de subir os workers.
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+from src.migrations import (
+    v0001_baseline,
+    v0002_hot_path_indexes,
+    v0003_reconcile_bus_location,
+    v0004_stops,
+    v0005_gtfs,
+    v0006_route_geometry,
+    v0007_archive,
+    v0008_ridership,
+    v0009_vehicle_occupancy,
+    v0010_line_subscriptions,
+    v0011_broadcast_resume,
+    v0012_data_version,
+)
+
+MIGRATIONS = [
+    v0001_baseline,
+    v0002_hot_path_indexes,
+    v0003_reconcile_bus_location,
+    v0004_stops,
+    v0005_gtfs,
+    v0006_route_geometry,
+    v0007_archive,
+    v0008_ridership,
+    v0009_vehicle_occupancy,
+    v0010_line_subscriptions,
+    v0011_broadcast_resume,
+    v0012_data_version,
+]
+
+_VERSION_TABLE = (
+    'CREATE TABLE IF NOT EXISTS schema_migrations ('
+    'version INTEGER NOT NULL PRIMARY KEY, '
+    'description VARCHAR(200) NOT NULL, '
+    'applied_at DATETIME NOT NULL)'
+)
+
+
+def latest_version():
+    return MIGRATIONS[-1].VERSION
+
+
+def _applied_versions(conn):
+    conn.exec_driver_sql(_VERSION_TABLE)
+    return {row[0] for row in conn.exec_driver_sql('SELECT version FROM schema_migrations')}
+
+
+def current_version(engine):
+    with engine.connect() as conn:
+        has_table = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'"
+        ).first()
+        if not has_table:
+            return 0
+        return conn.exec_driver_sql('SELECT COALESCE(MAX(version), 0) FROM schema_migrations').scalar()
+
+
+def pending(engine):
+    return [m for m in MIGRATIONS if m.VERSION > current_version(engine)]
+
+
+def upgrade(engine, target=None, log=None):
+    """Aplica as migrações pendentes, cada uma em sua própria transação.
+
+    ``BEGIN IMMEDIATE`` pega o lock de escrita do SQLite antes de reler as
+    versões aplicadas, então vários processos podem chamar ``upgrade`` ao
+    mesmo tempo: o primeiro aplica e os demais só encontram tudo pronto.
+    Leitores continuam atendidos durante a migração.
+    """
+    applied = []
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        for migration in MIGRATIONS:
+            if target is not None and migration.VERSION > target:
+                break
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                if migration.VERSION in _applied_versions(conn):
+                    conn.exec_driver_sql('COMMIT')
+                    continue
+                migration.upgrade(conn)
+                conn.execute(
+                    text('INSERT INTO schema_migrations (version, description, applied_at) '
+                         'VALUES (:version, :description, :applied_at)'),
+                    {'version': migration.VERSION,
+                     'description': migration.DESCRIPTION,
+                     'applied_at': datetime.utcnow()}
+                )
+                conn.exec_driver_sql('COMMIT')
+            except Exception:
+                conn.exec_driver_sql('ROLLBACK')
+                raise
+            applied.append(migration.VERSION)
+            if log:
+                log(f'Migração {migration.VERSION:04d} aplicada: {migration.DESCRIPTION}')
+        if applied:
+            # Atualiza as estatísticas usadas pelo planejador de consultas
+            conn.exec_driver_sql('ANALYZE')
+    return applied
@@ -0,0 +1,120 @@
+"""Esquema inicial, idêntico ao que o antigo ``db.create_all()`` gerava."""
+
+VERSION = 1
+DESCRIPTION = 'esquema inicial'
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS user (
+        id INTEGER NOT NULL,
+        username VARCHAR(80) NOT NULL,
+        email VARCHAR(120) NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        role VARCHAR(20),
+        card_balance FLOAT,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (username),
+        UNIQUE (email)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS bus_route (
+        id INTEGER NOT NULL,
+        route_number VARCHAR(20) NOT NULL,
+        route_name VARCHAR(100) NOT NULL,
+        origin VARCHAR(100) NOT NULL,
+        destination VARCHAR(100) NOT NULL,
+        fare FLOAT NOT NULL,
+        active BOOLEAN,
+        PRIMARY KEY (id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS driver (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        email VARCHAR(120) NOT NULL,
+        cpf VARCHAR(14) NOT NULL,
+        cnh VARCHAR(11) NOT NULL,
+        bus_line VARCHAR(100) NOT NULL,
+        code VARCHAR(50) NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (email),
+        UNIQUE (cpf),
+        UNIQUE (cnh),
+        UNIQUE (code)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS vehicle (
+        id INTEGER NOT NULL,
+        plate VARCHAR(10) NOT NULL,
+        model VARCHAR(50) NOT NULL,
+        brand VARCHAR(50) NOT NULL,
+        year INTEGER NOT NULL,
+        capacity INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        created_at DATETIME,
+        bus_line VARCHAR(100),
+        driver_id INTEGER,
+        PRIMARY KEY (id),
+        UNIQUE (plate)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS "transaction" (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        amount FLOAT NOT NULL,
+        transaction_type VARCHAR(20) NOT NULL,
+        description VARCHAR(255),
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS bus_location (
+        id INTEGER NOT NULL,
+        route_id INTEGER NOT NULL,
+        bus_number VARCHAR(20) NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        last_updated DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(route_id) REFERENCES bus_route (id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS notification (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        title VARCHAR(100) NOT NULL,
+        message TEXT NOT NULL,
+        read BOOLEAN,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rating (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        overall_rating INTEGER NOT NULL,
+        punctuality_rating INTEGER,
+        cleanliness_rating INTEGER,
+        comfort_rating INTEGER,
+        service_rating INTEGER,
+        comments TEXT,
+        bus_line VARCHAR(100),
+        trip_date DATE,
+        trip_time TIME,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS route (
+        id INTEGER NOT NULL,
+        route_name VARCHAR(120) NOT NULL,
+        origin_lat FLOAT NOT NULL,
+        origin_lon FLOAT NOT NULL,
+        destination_lat FLOAT NOT NULL,
+        destination_lon FLOAT NOT NULL,
+        polyline TEXT,
+        PRIMARY KEY (id),
+        UNIQUE (route_name)
+    )''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,26 @@
+"""Índices para as consultas mais frequentes.
+
+``user.username``/``user.email`` e os campos únicos de ``driver`` já são
+cobertos pelos índices automáticos das restrições UNIQUE.
+"""
+
+VERSION = 2
+DESCRIPTION = 'índices das consultas quentes'
+
+STATEMENTS = [
+    # Histórico do usuário: filter_by(user_id).order_by(created_at.desc())
+    'CREATE INDEX IF NOT EXISTS ix_transaction_user_id_created_at ON "transaction" (user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_notification_user_id_created_at ON notification (user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_rating_user_id_created_at ON rating (user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_rating_bus_line ON rating (bus_line)',
+    'CREATE INDEX IF NOT EXISTS ix_bus_location_route_id ON bus_location (route_id)',
+    'CREATE INDEX IF NOT EXISTS ix_vehicle_driver_id ON vehicle (driver_id)',
+    # Listagens administrativas ordenadas por data de cadastro
+    'CREATE INDEX IF NOT EXISTS ix_driver_created_at ON driver (created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_vehicle_created_at ON vehicle (created_at)',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
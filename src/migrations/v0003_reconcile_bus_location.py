@@ -0,0 +1,67 @@
+"""Unifica os dois modelos ``BusLocation`` em uma única tabela.
+
+O modelo de rastreamento (``bus_id``/``timestamp``) e o modelo de linhas
+(``route_id``/``bus_number``/``last_updated``) disputavam a mesma tabela via
+``extend_existing``. A tabela é reconstruída com as colunas das duas versões:
+``route_id`` passa a ser opcional e ``bus_id`` identifica o ônibus rastreado.
+Funciona tanto sobre o esquema original quanto sobre bancos em que as colunas
+do modelo de rastreamento chegaram a ser criadas.
+"""
+
+VERSION = 3
+DESCRIPTION = 'unifica o esquema de bus_location'
+
+NEW_TABLE = '''CREATE TABLE bus_location_new (
+    id INTEGER NOT NULL,
+    route_id INTEGER,
+    bus_id INTEGER,
+    bus_number VARCHAR(20) NOT NULL,
+    latitude FLOAT NOT NULL,
+    longitude FLOAT NOT NULL,
+    last_updated DATETIME,
+    PRIMARY KEY (id),
+    UNIQUE (bus_id),
+    FOREIGN KEY(route_id) REFERENCES bus_route (id)
+)'''
+
+# Ônibus cadastrados só com bus_number numérico herdam esse número como bus_id
+# (apenas a primeira linha de cada número, para respeitar o UNIQUE).
+_NUMERIC_BUS_ID = '''CASE
+    WHEN bus_number <> '' AND bus_number NOT GLOB '*[^0-9]*'
+         AND id = (SELECT MIN(b2.id) FROM bus_location b2 WHERE b2.bus_number = bus_location.bus_number)
+    THEN CAST(bus_number AS INTEGER)
+END'''
+
+
+def _columns(conn):
+    return {row[1] for row in conn.exec_driver_sql('PRAGMA table_info(bus_location)')}
+
+
+def upgrade(conn):
+    columns = _columns(conn)
+    if 'bus_id' in columns and 'bus_number' in columns:
+        bus_id = f'COALESCE(bus_id, {_NUMERIC_BUS_ID})'
+    elif 'bus_id' in columns:
+        bus_id = 'bus_id'
+    else:
+        bus_id = _NUMERIC_BUS_ID
+    bus_number = 'bus_number' if 'bus_number' in columns else 'CAST(bus_id AS TEXT)'
+    if 'bus_id' in columns and 'bus_number' in columns:
+        bus_number = 'COALESCE(bus_number, CAST(bus_id AS TEXT))'
+    route_id = 'route_id' if 'route_id' in columns else 'NULL'
+    if 'timestamp' in columns and 'last_updated' in columns:
+        last_updated = 'COALESCE(timestamp, last_updated)'
+    elif 'timestamp' in columns:
+        last_updated = 'timestamp'
+    else:
+        last_updated = 'last_updated'
+
+    conn.exec_driver_sql('DROP TABLE IF EXISTS bus_location_new')
+    conn.exec_driver_sql(NEW_TABLE)
+    conn.exec_driver_sql(
+        'INSERT INTO bus_location_new (id, route_id, bus_id, bus_number, latitude, longitude, last_updated) '
+        f'SELECT id, {route_id}, {bus_id}, {bus_number}, latitude, longitude, {last_updated} FROM bus_location'
+    )
+    conn.exec_driver_sql('DROP TABLE bus_location')
+    conn.exec_driver_sql('ALTER TABLE bus_location_new RENAME TO bus_location')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_bus_location_route_id ON bus_location (route_id)')
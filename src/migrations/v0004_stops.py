@@ -0,0 +1,35 @@
+"""Paradas e registro de chegadas/partidas (tempo de permanência)."""
+
+VERSION = 4
+DESCRIPTION = 'paradas e visitas às paradas'
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS stop (
+        id INTEGER NOT NULL,
+        code VARCHAR(50),
+        name VARCHAR(120) NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        radius_m FLOAT NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (code)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS stop_visit (
+        id INTEGER NOT NULL,
+        stop_id INTEGER NOT NULL,
+        bus_id INTEGER NOT NULL,
+        arrived_at DATETIME NOT NULL,
+        departed_at DATETIME,
+        dwell_seconds FLOAT,
+        PRIMARY KEY (id),
+        FOREIGN KEY(stop_id) REFERENCES stop (id)
+    )''',
+    'CREATE INDEX IF NOT EXISTS ix_stop_visit_stop_id_arrived_at ON stop_visit (stop_id, arrived_at)',
+    'CREATE INDEX IF NOT EXISTS ix_stop_visit_bus_id ON stop_visit (bus_id)',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
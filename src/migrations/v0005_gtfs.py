@@ -0,0 +1,83 @@
+"""Tabelas de horários GTFS e vínculo das paradas com o feed de origem."""
+
+VERSION = 5
+DESCRIPTION = 'tabelas GTFS'
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS gtfs_feed (
+        id INTEGER NOT NULL,
+        feed_key VARCHAR(100) NOT NULL,
+        feed_version VARCHAR(100) NOT NULL,
+        checksum VARCHAR(64) NOT NULL,
+        imported_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (feed_key)
+    )''',
+    'ALTER TABLE stop ADD COLUMN feed_id INTEGER REFERENCES gtfs_feed (id)',
+    'ALTER TABLE stop ADD COLUMN gtfs_id VARCHAR(64)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS ix_stop_feed_id_gtfs_id ON stop (feed_id, gtfs_id)',
+    '''CREATE TABLE IF NOT EXISTS gtfs_route (
+        id INTEGER NOT NULL,
+        feed_id INTEGER NOT NULL,
+        gtfs_id VARCHAR(64) NOT NULL,
+        short_name VARCHAR(50),
+        long_name VARCHAR(200),
+        route_type INTEGER,
+        bus_route_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(feed_id) REFERENCES gtfs_feed (id),
+        FOREIGN KEY(bus_route_id) REFERENCES bus_route (id)
+    )''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS ix_gtfs_route_feed_id_gtfs_id ON gtfs_route (feed_id, gtfs_id)',
+    'CREATE INDEX IF NOT EXISTS ix_gtfs_route_bus_route_id ON gtfs_route (bus_route_id)',
+    '''CREATE TABLE IF NOT EXISTS gtfs_trip (
+        id INTEGER NOT NULL,
+        feed_id INTEGER NOT NULL,
+        gtfs_id VARCHAR(64) NOT NULL,
+        route_id INTEGER NOT NULL,
+        service_id VARCHAR(64) NOT NULL,
+        headsign VARCHAR(200),
+        direction_id INTEGER,
+        shape_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(feed_id) REFERENCES gtfs_feed (id),
+        FOREIGN KEY(route_id) REFERENCES gtfs_route (id),
+        FOREIGN KEY(shape_id) REFERENCES route (id)
+    )''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS ix_gtfs_trip_feed_id_gtfs_id ON gtfs_trip (feed_id, gtfs_id)',
+    'CREATE INDEX IF NOT EXISTS ix_gtfs_trip_route_id ON gtfs_trip (route_id)',
+    # Sem rowid: a chave (trip_id, stop_sequence) já é o agrupamento natural
+    '''CREATE TABLE IF NOT EXISTS gtfs_stop_time (
+        trip_id INTEGER NOT NULL,
+        stop_sequence INTEGER NOT NULL,
+        stop_id INTEGER NOT NULL,
+        arrival_secs INTEGER NOT NULL,
+        departure_secs INTEGER NOT NULL,
+        PRIMARY KEY (trip_id, stop_sequence),
+        FOREIGN KEY(trip_id) REFERENCES gtfs_trip (id),
+        FOREIGN KEY(stop_id) REFERENCES stop (id)
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS ix_gtfs_stop_time_stop_id_departure ON gtfs_stop_time (stop_id, departure_secs)',
+    '''CREATE TABLE IF NOT EXISTS gtfs_calendar (
+        feed_id INTEGER NOT NULL,
+        service_id VARCHAR(64) NOT NULL,
+        weekdays INTEGER NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        PRIMARY KEY (feed_id, service_id),
+        FOREIGN KEY(feed_id) REFERENCES gtfs_feed (id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS gtfs_calendar_date (
+        feed_id INTEGER NOT NULL,
+        service_id VARCHAR(64) NOT NULL,
+        date DATE NOT NULL,
+        exception_type INTEGER NOT NULL,
+        PRIMARY KEY (feed_id, service_id, date),
+        FOREIGN KEY(feed_id) REFERENCES gtfs_feed (id)
+    )''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
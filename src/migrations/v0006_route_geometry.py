@@ -0,0 +1,23 @@
+"""Traçados simplificados por nível de zoom."""
+
+VERSION = 6
+DESCRIPTION = 'traçados simplificados por zoom'
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS route_geometry (
+        route_id INTEGER NOT NULL,
+        tier INTEGER NOT NULL,
+        tolerance_m FLOAT NOT NULL,
+        polyline TEXT NOT NULL,
+        point_count INTEGER NOT NULL,
+        source_etag VARCHAR(64) NOT NULL,
+        etag VARCHAR(64) NOT NULL,
+        PRIMARY KEY (route_id, tier),
+        FOREIGN KEY(route_id) REFERENCES route (id)
+    )''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,32 @@
+"""Catálogo dos segmentos de arquivo de transações e notificações antigas."""
+
+VERSION = 7
+DESCRIPTION = 'catálogo do arquivo frio'
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS archive_segment (
+        id INTEGER NOT NULL,
+        table_name VARCHAR(50) NOT NULL,
+        month VARCHAR(7) NOT NULL,
+        path VARCHAR(255) NOT NULL,
+        row_count INTEGER NOT NULL,
+        min_created_at DATETIME NOT NULL,
+        max_created_at DATETIME NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (path)
+    )''',
+    'CREATE INDEX IF NOT EXISTS ix_archive_segment_table_name_month ON archive_segment (table_name, month)',
+    '''CREATE TABLE IF NOT EXISTS archive_segment_user (
+        user_id INTEGER NOT NULL,
+        segment_id INTEGER NOT NULL,
+        row_count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, segment_id),
+        FOREIGN KEY(segment_id) REFERENCES archive_segment (id)
+    ) WITHOUT ROWID''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
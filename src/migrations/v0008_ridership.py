@@ -0,0 +1,37 @@
+"""Linha estruturada nas transações de uso e contadores horários de embarques.
+
+Transações de uso antigas recebem o ``route_id`` a partir da descrição
+(``'Uso do transporte - Linha <número>'``) e alimentam os contadores. As já
+movidas para o arquivo frio ficam de fora.
+"""
+
+VERSION = 8
+DESCRIPTION = 'contadores horários de embarques por linha'
+
+STATEMENTS = [
+    'ALTER TABLE "transaction" ADD COLUMN route_id INTEGER REFERENCES bus_route (id)',
+    '''UPDATE "transaction" SET route_id = (
+        SELECT MIN(bus_route.id) FROM bus_route
+        WHERE 'Uso do transporte - Linha ' || bus_route.route_number = "transaction".description
+    ) WHERE transaction_type = 'usage' AND route_id IS NULL''',
+    'CREATE INDEX IF NOT EXISTS ix_transaction_route_id_created_at ON "transaction" (route_id, created_at)',
+    '''CREATE TABLE IF NOT EXISTS ridership_hourly (
+        route_id INTEGER NOT NULL,
+        hour DATETIME NOT NULL,
+        taps INTEGER NOT NULL,
+        revenue FLOAT NOT NULL,
+        PRIMARY KEY (route_id, hour),
+        FOREIGN KEY(route_id) REFERENCES bus_route (id)
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS ix_ridership_hourly_hour ON ridership_hourly (hour)',
+    '''INSERT OR IGNORE INTO ridership_hourly (route_id, hour, taps, revenue)
+        SELECT route_id, strftime('%Y-%m-%d %H:00:00.000000', created_at), COUNT(*), -SUM(amount)
+        FROM "transaction"
+        WHERE transaction_type = 'usage' AND route_id IS NOT NULL AND created_at IS NOT NULL
+        GROUP BY route_id, strftime('%Y-%m-%d %H:00:00.000000', created_at)''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,18 @@
+"""Checkpoint da lotação estimada dos veículos."""
+
+VERSION = 9
+DESCRIPTION = 'lotação dos veículos'
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS vehicle_occupancy (
+        bus_id INTEGER NOT NULL,
+        load FLOAT NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (bus_id)
+    )''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,37 @@
+"""Inscrições de passageiros em linhas e avisos enviados aos inscritos."""
+
+VERSION = 10
+DESCRIPTION = 'inscrições em linhas e avisos em massa'
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS line_subscription (
+        user_id INTEGER NOT NULL,
+        route_id INTEGER NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (user_id, route_id),
+        FOREIGN KEY(user_id) REFERENCES user (id),
+        FOREIGN KEY(route_id) REFERENCES bus_route (id)
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS ix_line_subscription_route_id_user_id ON line_subscription (route_id, user_id)',
+    '''CREATE TABLE IF NOT EXISTS broadcast (
+        id INTEGER NOT NULL,
+        route_id INTEGER NOT NULL,
+        title VARCHAR(100) NOT NULL,
+        message TEXT NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        recipients INTEGER NOT NULL,
+        delivered INTEGER NOT NULL,
+        created_by INTEGER,
+        created_at DATETIME,
+        finished_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(route_id) REFERENCES bus_route (id),
+        FOREIGN KEY(created_by) REFERENCES user (id)
+    )''',
+    'CREATE INDEX IF NOT EXISTS ix_broadcast_route_id ON broadcast (route_id)',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,21 @@
+"""Progresso e concessão da entrega de avisos, para retomar entregas interrompidas.
+
+``last_user_id`` é o último inscrito já notificado (a entrega percorre os
+inscritos em ordem de id); ``lease_until`` é renovada a cada lote pelo
+processo que entrega. Avisos ``pending``/``sending`` com a concessão vencida
+são retomados do ponto em que pararam.
+"""
+
+VERSION = 11
+DESCRIPTION = 'retomada da entrega de avisos'
+
+STATEMENTS = [
+    'ALTER TABLE broadcast ADD COLUMN last_user_id INTEGER NOT NULL DEFAULT 0',
+    'ALTER TABLE broadcast ADD COLUMN lease_until DATETIME',
+    'CREATE INDEX IF NOT EXISTS ix_broadcast_status ON broadcast (status)',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
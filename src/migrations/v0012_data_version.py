@@ -0,0 +1,23 @@
+"""Contadores de versão dos cadastros alterados pelas rotas administrativas.
+
+Cada escrita em veículos, motoristas ou usuários soma 1 à linha ``roster``
+na mesma transação; os caches por processo (``FLEET``, ``SEARCH``) comparam o contador para
+perceber alterações feitas por outro worker.
+"""
+
+VERSION = 12
+DESCRIPTION = 'versão dos cadastros'
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS data_version (
+        name VARCHAR(50) NOT NULL,
+        version INTEGER NOT NULL,
+        PRIMARY KEY (name)
+    )''',
+    "INSERT OR IGNORE INTO data_version (name, version) VALUES ('roster', 0)",
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,35 @@
+from src.models.user import db
+from datetime import datetime
+
+class ArchiveSegment(db.Model):
+    __table_args__ = (db.Index('ix_archive_segment_table_name_month', 'table_name', 'month'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False) # 'transaction' ou 'notification'
+    month = db.Column(db.String(7), nullable=False) # 'AAAA-MM'
+    path = db.Column(db.String(255), nullable=False, unique=True) # Relativo ao ARCHIVE_DIR
+    row_count = db.Column(db.Integer, nullable=False)
+    min_created_at = db.Column(db.DateTime, nullable=False)
+    max_created_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ArchiveSegment {self.table_name} {self.month}: {self.path}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'table_name': self.table_name,
+            'month': self.month,
+            'path': self.path,
+            'row_count': self.row_count,
+            'min_created_at': self.min_created_at.isoformat(),
+            'max_created_at': self.max_created_at.isoformat(),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class ArchiveSegmentUser(db.Model):
+    # Quais segmentos têm linhas de cada usuário: a leitura do histórico só abre esses
+    user_id = db.Column(db.Integer, primary_key=True)
+    segment_id = db.Column(db.Integer, db.ForeignKey('archive_segment.id'), primary_key=True)
+    row_count = db.Column(db.Integer, nullable=False)
@@ -1,28 +1,6 @@
-from src.models.user import db
-from datetime import datetime
-
-class BusLocation(db.Model):
-    __table_args__ = {'extend_existing': True}
-    __tablename__ = 'bus_location'
-    id = db.Column(db.Integer, primary_key=True)
-    bus_id = db.Column(db.Integer, unique=True, nullable=False) # ID do ônibus sendo rastreado
-    latitude = db.Column(db.Float, nullable=False)
-    longitude = db.Column(db.Float, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-    def to_dict(self):
-        return {
-            'bus_id': self.bus_id,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'timestamp': self.timestamp.isoformat()
-        }
-
-    def __repr__(self):
-        return f"<BusLocation bus_id={self.bus_id} lat={self.latitude} lon={self.longitude}>"
+from src.models.user import db, BusLocation
 
 class Route(db.Model):
-    __table_args__ = {'extend_existing': True}
     __tablename__ = 'route'
     id = db.Column(db.Integer, primary_key=True)
     route_name = db.Column(db.String(120), unique=True, nullable=False)
@@ -43,3 +21,16 @@ class Route(db.Model):
 
     def __repr__(self):
         return f"<Route name={self.route_name}>"
+
+class RouteGeometry(db.Model):
+    __tablename__ = 'route_geometry'
+    route_id = db.Column(db.Integer, db.ForeignKey('route.id'), primary_key=True)
+    tier = db.Column(db.Integer, primary_key=True) # 0 = mais simplificado
+    tolerance_m = db.Column(db.Float, nullable=False)
+    polyline = db.Column(db.Text, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False)
+    source_etag = db.Column(db.String(64), nullable=False) # Hash do polyline original usado
+    etag = db.Column(db.String(64), nullable=False)
+
+    def __repr__(self):
+        return f"<RouteGeometry route={self.route_id} tier={self.tier}>"
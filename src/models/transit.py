@@ -0,0 +1,132 @@
+from src.models.user import db
+from datetime import datetime
+
+class Stop(db.Model):
+    __table_args__ = (db.Index('ix_stop_feed_id_gtfs_id', 'feed_id', 'gtfs_id', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(50), unique=True)
+    feed_id = db.Column(db.Integer, db.ForeignKey('gtfs_feed.id')) # Parada importada de um feed GTFS
+    gtfs_id = db.Column(db.String(64))
+    name = db.Column(db.String(120), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    radius_m = db.Column(db.Float, default=30.0, nullable=False) # Raio da cerca de chegada
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Stop {self.code or self.id}: {self.name}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'code': self.code,
+            'feed_id': self.feed_id,
+            'gtfs_id': self.gtfs_id,
+            'name': self.name,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'radius_m': self.radius_m,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class StopVisit(db.Model):
+    __table_args__ = (db.Index('ix_stop_visit_stop_id_arrived_at', 'stop_id', 'arrived_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    stop_id = db.Column(db.Integer, db.ForeignKey('stop.id'), nullable=False)
+    bus_id = db.Column(db.Integer, nullable=False, index=True)
+    arrived_at = db.Column(db.DateTime, nullable=False)
+    departed_at = db.Column(db.DateTime)
+    dwell_seconds = db.Column(db.Float)
+
+    def __repr__(self):
+        return f'<StopVisit bus={self.bus_id} stop={self.stop_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'stop_id': self.stop_id,
+            'bus_id': self.bus_id,
+            'arrived_at': self.arrived_at.isoformat() if self.arrived_at else None,
+            'departed_at': self.departed_at.isoformat() if self.departed_at else None,
+            'dwell_seconds': self.dwell_seconds
+        }
+
+class GtfsFeed(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    feed_key = db.Column(db.String(100), unique=True, nullable=False) # Identifica a fonte (ex.: agência)
+    feed_version = db.Column(db.String(100), nullable=False)
+    checksum = db.Column(db.String(64), nullable=False)
+    imported_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<GtfsFeed {self.feed_key} {self.feed_version}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'feed_key': self.feed_key,
+            'feed_version': self.feed_version,
+            'checksum': self.checksum,
+            'imported_at': self.imported_at.isoformat() if self.imported_at else None
+        }
+
+class GtfsRoute(db.Model):
+    __table_args__ = (db.Index('ix_gtfs_route_feed_id_gtfs_id', 'feed_id', 'gtfs_id', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    feed_id = db.Column(db.Integer, db.ForeignKey('gtfs_feed.id'), nullable=False)
+    gtfs_id = db.Column(db.String(64), nullable=False)
+    short_name = db.Column(db.String(50))
+    long_name = db.Column(db.String(200))
+    route_type = db.Column(db.Integer)
+    bus_route_id = db.Column(db.Integer, db.ForeignKey('bus_route.id'), index=True) # Linha equivalente em bus_route
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'feed_id': self.feed_id,
+            'gtfs_id': self.gtfs_id,
+            'short_name': self.short_name,
+            'long_name': self.long_name,
+            'route_type': self.route_type,
+            'bus_route_id': self.bus_route_id
+        }
+
+class GtfsTrip(db.Model):
+    __table_args__ = (db.Index('ix_gtfs_trip_feed_id_gtfs_id', 'feed_id', 'gtfs_id', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    feed_id = db.Column(db.Integer, db.ForeignKey('gtfs_feed.id'), nullable=False)
+    gtfs_id = db.Column(db.String(64), nullable=False)
+    route_id = db.Column(db.Integer, db.ForeignKey('gtfs_route.id'), nullable=False, index=True)
+    service_id = db.Column(db.String(64), nullable=False)
+    headsign = db.Column(db.String(200))
+    direction_id = db.Column(db.Integer)
+    shape_id = db.Column(db.Integer, db.ForeignKey('route.id')) # Traçado em route.polyline
+
+class GtfsStopTime(db.Model):
+    __table_args__ = (
+        db.Index('ix_gtfs_stop_time_stop_id_departure', 'stop_id', 'departure_secs'),
+        {'sqlite_with_rowid': False},
+    )
+
+    trip_id = db.Column(db.Integer, db.ForeignKey('gtfs_trip.id'), primary_key=True)
+    stop_sequence = db.Column(db.Integer, primary_key=True)
+    stop_id = db.Column(db.Integer, db.ForeignKey('stop.id'), nullable=False)
+    arrival_secs = db.Column(db.Integer, nullable=False) # Segundos desde o início do dia de serviço (pode passar de 24h)
+    departure_secs = db.Column(db.Integer, nullable=False)
+
+class GtfsCalendar(db.Model):
+    feed_id = db.Column(db.Integer, db.ForeignKey('gtfs_feed.id'), primary_key=True)
+    service_id = db.Column(db.String(64), primary_key=True)
+    weekdays = db.Column(db.Integer, nullable=False) # Bit 0 = segunda ... bit 6 = domingo
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+
+class GtfsCalendarDate(db.Model):
+    feed_id = db.Column(db.Integer, db.ForeignKey('gtfs_feed.id'), primary_key=True)
+    service_id = db.Column(db.String(64), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    exception_type = db.Column(db.Integer, nullable=False) # 1 = adiciona, 2 = remove
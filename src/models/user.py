@@ -26,11 +26,17 @@ class User(db.Model):
         }
 
 class Transaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_transaction_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_transaction_route_id_created_at', 'route_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     transaction_type = db.Column(db.String(20), nullable=False)  # 'recharge' or 'usage'
     description = db.Column(db.String(255))
+    route_id = db.Column(db.Integer, db.ForeignKey('bus_route.id')) # Linha usada, só em 'usage'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref=db.backref('transactions', lazy=True))
@@ -45,6 +51,7 @@ class Transaction(db.Model):
             'amount': self.amount,
             'transaction_type': self.transaction_type,
             'description': self.description,
+            'route_id': self.route_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -73,7 +80,8 @@ class BusRoute(db.Model):
 
 class BusLocation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    route_id = db.Column(db.Integer, db.ForeignKey('bus_route.id'), nullable=False)
+    route_id = db.Column(db.Integer, db.ForeignKey('bus_route.id'), index=True)
+    bus_id = db.Column(db.Integer, unique=True) # ID do ônibus sendo rastreado
     bus_number = db.Column(db.String(20), nullable=False)
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
@@ -88,15 +96,19 @@ class BusLocation(db.Model):
         return {
             'id': self.id,
             'route_id': self.route_id,
+            'bus_id': self.bus_id,
             'bus_number': self.bus_number,
             'latitude': self.latitude,
             'longitude': self.longitude,
             'last_updated': self.last_updated.isoformat() if self.last_updated else None,
+            'timestamp': self.last_updated.isoformat() if self.last_updated else None,
             'route': self.route.to_dict() if self.route else None
         }
 
 
 class Notification(db.Model):
+    __table_args__ = (db.Index('ix_notification_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(100), nullable=False)
@@ -119,6 +131,65 @@ class Notification(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class RidershipHourly(db.Model):
+    # Embarques por linha e hora (UTC), atualizados junto com cada transação de uso
+    route_id = db.Column(db.Integer, db.ForeignKey('bus_route.id'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True, index=True)
+    taps = db.Column(db.Integer, nullable=False)
+    revenue = db.Column(db.Float, nullable=False)
+
+    def to_dict(self):
+        return {
+            'route_id': self.route_id,
+            'hour': self.hour.isoformat(),
+            'taps': self.taps,
+            'revenue': self.revenue
+        }
+
+class LineSubscription(db.Model):
+    # Passageiros inscritos em uma linha recebem os avisos enviados a ela
+    __table_args__ = (db.Index('ix_line_subscription_route_id_user_id', 'route_id', 'user_id'),)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    route_id = db.Column(db.Integer, db.ForeignKey('bus_route.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'route_id': self.route_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class Broadcast(db.Model):
+    # Aviso enviado a todos os inscritos de uma linha; a entrega roda em segundo plano
+    id = db.Column(db.Integer, primary_key=True)
+    route_id = db.Column(db.Integer, db.ForeignKey('bus_route.id'), nullable=False, index=True)
+    title = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False, index=True) # 'pending', 'sending', 'done', 'failed'
+    recipients = db.Column(db.Integer, default=0, nullable=False)
+    delivered = db.Column(db.Integer, default=0, nullable=False)
+    last_user_id = db.Column(db.Integer, default=0, nullable=False) # Último inscrito já notificado
+    lease_until = db.Column(db.DateTime) # Concessão do processo que está entregando
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'route_id': self.route_id,
+            'title': self.title,
+            'message': self.message,
+            'status': self.status,
+            'recipients': self.recipients,
+            'delivered': self.delivered,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
 class Driver(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -127,7 +198,7 @@ class Driver(db.Model):
     cnh = db.Column(db.String(11), unique=True, nullable=False)
     bus_line = db.Column(db.String(100), nullable=False)
     code = db.Column(db.String(50), unique=True, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f'<Driver {self.name}>'
@@ -145,6 +216,8 @@ class Driver(db.Model):
         }
 
 class Rating(db.Model):
+    __table_args__ = (db.Index('ix_rating_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     overall_rating = db.Column(db.Integer, nullable=False)
@@ -153,7 +226,7 @@ class Rating(db.Model):
     comfort_rating = db.Column(db.Integer, default=0)
     service_rating = db.Column(db.Integer, default=0)
     comments = db.Column(db.Text)
-    bus_line = db.Column(db.String(100))
+    bus_line = db.Column(db.String(100), index=True)
     trip_date = db.Column(db.Date)
     trip_time = db.Column(db.Time)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -189,8 +262,8 @@ class Vehicle(db.Model):
     capacity = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(20), default='ativo', nullable=False) # 'ativo', 'inativo', 'manutencao'
     bus_line = db.Column(db.String(100))
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     driver = db.relationship('Driver', backref=db.backref('vehicles', lazy=True))
 
@@ -211,3 +284,14 @@ class Vehicle(db.Model):
             'driver_name': self.driver.name if self.driver else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+
+class VehicleOccupancy(db.Model):
+    # Último checkpoint da lotação estimada (src/services/occupancy.py)
+    bus_id = db.Column(db.Integer, primary_key=True)
+    load = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+class DataVersion(db.Model):
+    # Contador de alterações de um cadastro (src/services/roster_version.py)
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
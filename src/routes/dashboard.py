@@ -0,0 +1,91 @@
+from flask import Blueprint, jsonify, session
+from flask_socketio import join_room
+from src import config
+from src.extensions import socketio
+from src.models.archive import ArchiveSegment, ArchiveSegmentUser
+from src.models.user import db, LineSubscription, Notification, Transaction, User
+from src.services.archive import history
+from src.services.pushes import NAMESPACE, user_room
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+PROFILE_COLUMNS = ('id', 'username', 'email', 'role', 'card_balance', 'created_at')
+TRANSACTION_COLUMNS = ('id', 'user_id', 'amount', 'transaction_type', 'description', 'route_id', 'created_at')
+
+def _snapshot_query(user_id):
+    # Uma única consulta (um único retrato do banco): o usuário, a contagem de
+    # não lidas, a notificação mais recente, se há transações no arquivo frio
+    # e as últimas transações, uma por linha (ou nenhuma: LEFT JOIN)
+    latest = (
+        db.select(*(getattr(Transaction, column) for column in TRANSACTION_COLUMNS))
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        .limit(config.DASHBOARD_TRANSACTIONS)
+        .subquery()
+    )
+    unread = (
+        db.select(db.func.count())
+        .where(Notification.user_id == user_id, Notification.read.is_(False))
+        .scalar_subquery()
+    )
+    latest_notification = (
+        db.select(db.func.max(Notification.id))
+        .where(Notification.user_id == user_id)
+        .scalar_subquery()
+    )
+    archived = db.exists(
+        db.select(ArchiveSegmentUser.segment_id)
+        .join(ArchiveSegment, ArchiveSegment.id == ArchiveSegmentUser.segment_id)
+        .where(ArchiveSegmentUser.user_id == user_id, ArchiveSegment.table_name == 'transaction')
+    )
+    return (
+        db.select(*(getattr(User, column) for column in PROFILE_COLUMNS), unread.label('unread'),
+                  latest_notification.label('latest_notification'), archived.label('archived'),
+                  *(latest.c[column].label(f'tx_{column}') for column in TRANSACTION_COLUMNS))
+        .select_from(User)
+        .outerjoin(latest, db.true())
+        .where(User.id == user_id)
+        .order_by(latest.c.created_at.desc(), latest.c.id.desc())
+    )
+
+@dashboard_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """Perfil, saldo, últimas transações e notificações não lidas num só pedido."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    rows = db.session.execute(_snapshot_query(session['user_id'])).all()
+    if not rows:
+        return jsonify({'error': 'Usuário não encontrado'}), 404
+
+    first = rows[0]
+    profile = {column: getattr(first, column) for column in PROFILE_COLUMNS}
+    profile['created_at'] = profile['created_at'].isoformat() if profile['created_at'] else None
+    transactions = []
+    for row in rows:
+        if row.tx_id is None:
+            break
+        transaction = {column: getattr(row, f'tx_{column}') for column in TRANSACTION_COLUMNS}
+        transaction['created_at'] = transaction['created_at'].isoformat() if transaction['created_at'] else None
+        transactions.append(transaction)
+    if len(transactions) < config.DASHBOARD_TRANSACTIONS and first.archived:
+        # Poucas linhas quentes: o restante da página está no arquivo frio
+        transactions = history('transaction', profile['id'], limit=config.DASHBOARD_TRANSACTIONS)
+
+    return jsonify({
+        'profile': profile,
+        'balance': profile['card_balance'],
+        'transactions': transactions,
+        'unread_notifications': first.unread,
+        'latest_notification_id': first.latest_notification
+    }), 200
+
+@socketio.on('connect', namespace=NAMESPACE)
+def handle_user_connect():
+    """Painel do passageiro: saldo e notificações dele, avisos das linhas em que está inscrito."""
+    if 'user_id' not in session:
+        return False
+    join_room(user_room(session['user_id']))
+    for (route_id,) in LineSubscription.query.with_entities(
+            LineSubscription.route_id).filter_by(user_id=session['user_id']):
+        join_room(f'route:{route_id}')
@@ -0,0 +1,87 @@
+"""Namespace Socket.IO ``/driver`` para os dispositivos dos motoristas.
+
+O dispositivo se autentica uma vez na conexão com o código do motorista
+(``io('/driver', {auth: {code, bus_id}})``) e então envia quadros binários
+no evento ``fixes`` (ver ``src/services/frames.py``). As posições seguem pelo
+mesmo pipeline de ``/api/update_location``.
+"""
+from datetime import datetime, timezone
+
+from flask import request
+from flask_socketio import ConnectionRefusedError, disconnect
+
+from src.extensions import socketio
+from src.models.user import Driver, Vehicle
+from src.services.frames import FrameError, decode_fixes
+from src.services.ingest import ACCEPTED, INGEST_FIXES, Fix, ingest_fixes
+from src.services.metrics import SOCKETIO_CONNECTIONS
+
+# sid da conexão -> bus_id (id do veículo) autenticado
+_connections = {}
+
+
+def _resolve_bus(auth):
+    code = (auth or {}).get('code') or request.args.get('code')
+    if not code:
+        raise ConnectionRefusedError('Código do motorista é obrigatório')
+
+    driver = Driver.query.filter_by(code=code).first()
+    if not driver:
+        raise ConnectionRefusedError('Código do motorista inválido')
+
+    vehicle_ids = [v.id for v in Vehicle.query.with_entities(Vehicle.id).filter_by(driver_id=driver.id)]
+    requested = (auth or {}).get('bus_id')
+    if requested is not None:
+        try:
+            requested = int(requested)
+        except (TypeError, ValueError):
+            raise ConnectionRefusedError('bus_id inválido')
+        if requested not in vehicle_ids:
+            raise ConnectionRefusedError('Veículo não vinculado a este motorista')
+        return requested
+    if len(vehicle_ids) != 1:
+        raise ConnectionRefusedError('Informe o bus_id: o motorista não tem exatamente um veículo vinculado')
+    return vehicle_ids[0]
+
+
+@socketio.on('connect', namespace='/driver')
+def handle_driver_connect(auth=None):
+    _connections[request.sid] = _resolve_bus(auth)
+    SOCKETIO_CONNECTIONS.inc(namespace='/driver')
+    return True
+
+
+@socketio.on('disconnect', namespace='/driver')
+def handle_driver_disconnect(*args):
+    if _connections.pop(request.sid, None) is not None:
+        SOCKETIO_CONNECTIONS.dec(namespace='/driver')
+
+
+@socketio.on('fixes', namespace='/driver')
+def handle_fixes(frame):
+    bus_id = _connections.get(request.sid)
+    if bus_id is None:
+        disconnect()
+        return {'error': 'não autenticado'}
+
+    try:
+        decoded, invalid = decode_fixes(frame)
+    except FrameError as e:
+        INGEST_FIXES.inc(result='invalid')
+        return {'error': str(e)}
+
+    fixes = [
+        Fix(bus_id, lat, lon, datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None))
+        for epoch, lat, lon in decoded
+    ]
+    results = ingest_fixes(fixes)
+
+    # Resposta mínima: total aceito e contagem por motivo de descarte
+    dropped = {}
+    if invalid:
+        INGEST_FIXES.inc(invalid, result='invalid')
+        dropped['invalid'] = invalid
+    for result, _ in results:
+        if result != ACCEPTED:
+            dropped[result] = dropped.get(result, 0) + 1
+    return {'accepted': sum(result == ACCEPTED for result, _ in results), 'dropped': dropped}
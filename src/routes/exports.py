@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from src.routes.user import admin_required
+
+exports_bp = Blueprint('exports', __name__)
+
+@exports_bp.route('/admin/exports/<dataset>', methods=['GET'])
+@admin_required
+def export_dataset(dataset):
+    from src.services.exports import DATASETS, FORMATS, stream_export
+    if dataset not in DATASETS:
+        return jsonify({'error': f"Exportação desconhecida. Use: {', '.join(DATASETS)}"}), 404
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': 'format deve ser csv ou jsonl'}), 400
+
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError:
+        return jsonify({'error': 'since e until devem ser datas ISO (YYYY-MM-DD)'}), 400
+
+    line = request.args.get('line')
+    if line is not None and DATASETS[dataset][2] is None:
+        return jsonify({'error': f'{dataset} não tem filtro por linha'}), 400
+    if line is not None and DATASETS[dataset][2] == 'route_id':
+        try:
+            line = int(line)
+        except ValueError:
+            return jsonify({'error': 'line deve ser o id da linha'}), 400
+
+    compress = request.args.get('gzip') in ('1', 'true')
+    filename = f"{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}" + ('.gz' if compress else '')
+
+    response = Response(
+        stream_with_context(stream_export(dataset, fmt, since, until, line, compress)),
+        mimetype='application/gzip' if compress else FORMATS[fmt]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Proxies não devem segurar a resposta até o fim
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
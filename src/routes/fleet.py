@@ -0,0 +1,54 @@
+from flask import Blueprint, current_app, jsonify, request
+from flask_socketio import join_room, leave_room
+from src import config
+from src.extensions import socketio
+from src.routes.user import admin_required, is_admin
+from src.services.fleet import FLEET
+from src.services.profiler import profiled
+
+fleet_bp = Blueprint('fleet', __name__)
+
+@fleet_bp.route('/admin/fleet', methods=['GET'])
+@admin_required
+def get_fleet():
+    """Retrato da frota; com ``since=<versão>``, só o que mudou desde então."""
+    since = request.args.get('since', type=int)
+    if since is not None:
+        delta = FLEET.delta(since)
+        if delta is not None:
+            return jsonify(delta), 200
+    return jsonify(FLEET.snapshot()), 200
+
+_push_task = None
+
+def _push_deltas(app):
+    # Um único delta por intervalo para toda a sala, por mais posições que cheguem
+    with app.app_context():
+        pushed = FLEET.version
+    while True:
+        socketio.sleep(config.FLEET_PUSH_INTERVAL_S)
+        if FLEET.version == pushed:
+            continue
+        with app.app_context(), profiled('fleet_push'):
+            delta = FLEET.delta(pushed)
+            if delta is None:
+                delta = FLEET.snapshot()
+            pushed = delta['version']
+            socketio.emit('fleet_delta', delta, namespace='/tracking', to='fleet')
+
+@socketio.on('fleet', namespace='/tracking')
+def handle_fleet_subscribe():
+    """Administrador entra na sala 'fleet': recebe o retrato agora e 'fleet_delta' depois."""
+    global _push_task
+    if not is_admin():
+        return {'error': 'Acesso negado: Requer privilégios de administrador'}
+    join_room('fleet')
+    snapshot = FLEET.snapshot()
+    if _push_task is None:
+        _push_task = socketio.start_background_task(_push_deltas, current_app._get_current_object())
+    return snapshot
+
+@socketio.on('fleet_unsubscribe', namespace='/tracking')
+def handle_fleet_unsubscribe():
+    leave_room('fleet')
+    return {'unsubscribed': 'fleet'}
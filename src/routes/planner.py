@@ -0,0 +1,53 @@
+import time
+
+from flask import Blueprint, jsonify, request
+
+planner_bp = Blueprint('planner', __name__)
+
+def _endpoint(prefix):
+    """Paradas de acesso de uma ponta da viagem: {índice: segundos a pé}."""
+    from src.services.planner import PLANNER
+    table = PLANNER.timetable()
+    stop_id = request.args.get(f'{prefix}_stop', type=int)
+    if stop_id is not None:
+        index = table.stop_index.get(stop_id)
+        return {index: 0} if index is not None else None
+
+    lat = request.args.get(f'{prefix}_lat', type=float)
+    lon = request.args.get(f'{prefix}_lon', type=float)
+    if lat is None or lon is None:
+        return None
+    return PLANNER.access_stops(lat, lon)
+
+@planner_bp.route('/plan', methods=['GET'])
+def plan_journey():
+    # Importado sob demanda: o planejador (e seus horários) só existe para quem o usa
+    from src.services.planner import PLANNER, parse_day_and_time
+    from src.services.transit_version import TRANSIT_VERSION
+    start = time.perf_counter()
+    # Paradas ou feed alterados por outro processo descartam a tabela antes do plano
+    TRANSIT_VERSION.check(max_age=0)
+
+    try:
+        day, departure_secs = parse_day_and_time(request.args.get('date'), request.args.get('time'))
+    except ValueError:
+        return jsonify({'error': 'Formato inválido. Use date=YYYY-MM-DD e time=HH:MM'}), 400
+
+    max_transfers = request.args.get('max_transfers', type=int)
+    if max_transfers is not None and not 0 <= max_transfers <= 6:
+        return jsonify({'error': 'max_transfers deve estar entre 0 e 6'}), 400
+
+    origins = _endpoint('from')
+    destinations = _endpoint('to')
+    if origins is None or destinations is None:
+        return jsonify({'error': 'Informe from_stop/to_stop ou from_lat, from_lon, to_lat e to_lon'}), 400
+    if not origins or not destinations:
+        return jsonify({'error': 'Nenhuma parada próxima da origem ou do destino'}), 404
+
+    itineraries = PLANNER.plan(origins, destinations, day, departure_secs, max_transfers)
+
+    return jsonify({
+        'date': day.isoformat(),
+        'itineraries': itineraries,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
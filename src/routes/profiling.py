@@ -0,0 +1,74 @@
+import math
+from flask import Blueprint, Response, jsonify, request
+from src.routes.user import admin_required
+from src.services.profiler import PROFILER
+
+profiling_bp = Blueprint('profiling', __name__)
+
+@profiling_bp.route('/admin/profiler', methods=['GET'])
+@admin_required
+def profiler_status():
+    return jsonify(PROFILER.status()), 200
+
+@profiling_bp.route('/admin/profiler', methods=['POST'])
+@admin_required
+def configure_profiler():
+    data = request.json or {}
+
+    # Tudo é validado antes de aplicar: um campo inválido não deixa a configuração pela metade
+    enabled = data.get('enabled')
+    if enabled is not None and not isinstance(enabled, bool):
+        return jsonify({'error': 'enabled deve ser true ou false'}), 400
+
+    sample_rate = _number(data.get('sample_rate'))
+    if sample_rate is False or (sample_rate is not None and not 0 <= sample_rate <= 1):
+        return jsonify({'error': 'sample_rate deve ser um número entre 0 e 1'}), 400
+
+    endpoints = data.get('endpoints')
+    if endpoints is not None and (not isinstance(endpoints, list)
+                                  or not all(isinstance(name, str) for name in endpoints)):
+        return jsonify({'error': 'endpoints deve ser uma lista de nomes de endpoint'}), 400
+
+    interval = _number(data.get('interval'))
+    if interval is False or (interval is not None and interval <= 0):
+        return jsonify({'error': 'interval deve ser um número positivo (segundos)'}), 400
+
+    max_stacks = _number(data.get('max_stacks'))
+    if max_stacks is False or (max_stacks is not None and (max_stacks < 1 or max_stacks != int(max_stacks))):
+        return jsonify({'error': 'max_stacks deve ser um inteiro positivo'}), 400
+
+    PROFILER.configure(
+        enabled=enabled,
+        sample_rate=sample_rate,
+        endpoints=endpoints,
+        interval=interval,
+        max_stacks=int(max_stacks) if max_stacks is not None else None
+    )
+    return jsonify(PROFILER.status()), 200
+
+def _number(value):
+    """Número finito, None se ausente ou False se inválido (NaN, infinito, texto)."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return False
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return False
+    return number if math.isfinite(number) else False
+
+@profiling_bp.route('/admin/profiler/stacks', methods=['GET'])
+@admin_required
+def download_profile():
+    return Response(
+        PROFILER.dump(),
+        mimetype='text/plain',
+        headers={'Content-Disposition': 'attachment; filename=profile.collapsed'}
+    )
+
+@profiling_bp.route('/admin/profiler/stacks', methods=['DELETE'])
+@admin_required
+def reset_profile():
+    PROFILER.reset()
+    return jsonify({'message': 'Amostras descartadas'}), 200
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, jsonify, request
+from src.routes.user import admin_required
+from src.services.ridership import GROUPS, ridership
+
+ridership_bp = Blueprint('ridership', __name__)
+
+@ridership_bp.route('/admin/ridership', methods=['GET'])
+@admin_required
+def get_ridership():
+    try:
+        until = request.args.get('until')
+        until = datetime.fromisoformat(until) if until else datetime.utcnow()
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else until - timedelta(days=7)
+    except ValueError:
+        return jsonify({'error': 'since e until devem ser datas ISO (YYYY-MM-DD ou YYYY-MM-DDTHH:MM)'}), 400
+    if since >= until:
+        return jsonify({'error': 'since deve ser anterior a until'}), 400
+
+    group = request.args.get('group', 'hour')
+    if group not in GROUPS:
+        return jsonify({'error': f"group deve ser um de: {', '.join(GROUPS)}"}), 400
+
+    route_ids = request.args.getlist('route_id', type=int)
+    series = ridership(since, until, route_ids, group)
+
+    return jsonify({
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'group': group,
+        'series': series,
+        'total_taps': sum(item['taps'] for item in series),
+        'total_revenue': round(sum(item['revenue'] for item in series), 2)
+    }), 200
@@ -0,0 +1,19 @@
+from flask import Blueprint, jsonify, request
+from src import config
+from src.routes.user import admin_required
+from src.services.search import KINDS, SEARCH
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/admin/search', methods=['GET'])
+@admin_required
+def admin_search():
+    """Busca por prefixo: ``q``, ``kind`` (driver, vehicle ou user; vários separados por vírgula), ``page``, ``per_page``."""
+    kinds = tuple(kind for kind in request.args.get('kind', '').split(',') if kind) or KINDS
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown:
+        return jsonify({'error': f'Tipo inválido: {", ".join(unknown)}. Use: {", ".join(KINDS)}'}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', config.SEARCH_PER_PAGE, type=int), 1),
+                   config.SEARCH_MAX_PER_PAGE)
+    return jsonify(SEARCH.search(request.args.get('q', ''), kinds, page, per_page)), 200
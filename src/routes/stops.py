@@ -0,0 +1,71 @@
+from flask import Blueprint, jsonify, request
+from src.models.user import db
+from src.models.transit import GtfsStopTime, Stop, StopVisit
+from src.routes.user import admin_required
+from src.services.geofence import GEOFENCE
+
+stops_bp = Blueprint('stops', __name__)
+
+@stops_bp.route('/stops', methods=['GET'])
+def list_stops():
+    stops = Stop.query.order_by(Stop.name).all()
+    return jsonify([stop.to_dict() for stop in stops])
+
+@stops_bp.route('/stops/<int:stop_id>/visits', methods=['GET'])
+def list_stop_visits(stop_id):
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    visits = (StopVisit.query.filter_by(stop_id=stop_id)
+              .order_by(StopVisit.arrived_at.desc()).limit(limit).all())
+    return jsonify([visit.to_dict() for visit in visits])
+
+@stops_bp.route('/admin/stops', methods=['POST'])
+@admin_required
+def add_stop():
+    data = request.json or {}
+
+    if not data.get('name') or 'latitude' not in data or 'longitude' not in data:
+        return jsonify({'error': 'Nome, latitude e longitude são obrigatórios'}), 400
+
+    try:
+        latitude = float(data['latitude'])
+        longitude = float(data['longitude'])
+        radius_m = float(data.get('radius_m', 30.0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Latitude, longitude e raio devem ser numéricos'}), 400
+
+    if radius_m <= 0:
+        return jsonify({'error': 'O raio deve ser maior que zero'}), 400
+
+    if data.get('code') and Stop.query.filter_by(code=data['code']).first():
+        return jsonify({'error': 'Código de parada já cadastrado'}), 400
+
+    stop = Stop(
+        code=data.get('code'),
+        name=data['name'],
+        latitude=latitude,
+        longitude=longitude,
+        radius_m=radius_m
+    )
+    db.session.add(stop)
+    db.session.commit()
+    GEOFENCE.invalidate()
+
+    return jsonify({
+        'message': 'Parada cadastrada com sucesso',
+        'stop': stop.to_dict()
+    }), 201
+
+@stops_bp.route('/admin/stops/<int:stop_id>', methods=['DELETE'])
+@admin_required
+def delete_stop(stop_id):
+    stop = Stop.query.get(stop_id)
+    if not stop:
+        return jsonify({'error': 'Parada não encontrada'}), 404
+
+    StopVisit.query.filter_by(stop_id=stop_id).delete()
+    GtfsStopTime.query.filter_by(stop_id=stop_id).delete()
+    db.session.delete(stop)
+    db.session.commit()
+    GEOFENCE.invalidate()
+
+    return jsonify({'message': 'Parada excluída com sucesso'}), 200
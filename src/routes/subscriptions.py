@@ -0,0 +1,86 @@
+from flask import Blueprint, jsonify, request, session
+from src.models.user import db, BusRoute, Broadcast, LineSubscription
+from src.extensions import socketio
+from src.routes.user import admin_required
+from src.services.broadcasts import start_broadcast
+from src.services.pushes import NAMESPACE as USER_NAMESPACE, user_room
+
+subscriptions_bp = Blueprint('subscriptions', __name__)
+
+@subscriptions_bp.route('/subscriptions', methods=['GET'])
+def list_subscriptions():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    routes = (
+        db.session.query(BusRoute)
+        .join(LineSubscription, LineSubscription.route_id == BusRoute.id)
+        .filter(LineSubscription.user_id == session['user_id'])
+        .order_by(BusRoute.route_number)
+        .all()
+    )
+    return jsonify([route.to_dict() for route in routes]), 200
+
+@subscriptions_bp.route('/subscriptions/<int:route_id>', methods=['PUT'])
+def subscribe_line(route_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    if not BusRoute.query.get(route_id):
+        return jsonify({'error': 'Linha não encontrada'}), 404
+
+    if not LineSubscription.query.get((session['user_id'], route_id)):
+        db.session.add(LineSubscription(user_id=session['user_id'], route_id=route_id))
+        db.session.commit()
+    # Conexões já abertas entram na sala agora; as novas, ao conectar
+    _enter_route_room(session['user_id'], route_id)
+    return jsonify({'subscribed': route_id}), 200
+
+@subscriptions_bp.route('/subscriptions/<int:route_id>', methods=['DELETE'])
+def unsubscribe_line(route_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    LineSubscription.query.filter_by(user_id=session['user_id'], route_id=route_id).delete()
+    db.session.commit()
+    _leave_route_room(session['user_id'], route_id)
+    return jsonify({'unsubscribed': route_id}), 200
+
+def _user_sids(user_id):
+    """Conexões abertas do usuário no /tracking e no /user, achadas pela sala ``user:<id>``.
+
+    Só alcança as conexões deste processo (o Socket.IO não lista as de outros
+    servidores); nos demais, a conexão acerta as salas ao reconectar.
+    """
+    for namespace in ('/tracking', USER_NAMESPACE):
+        for sid, _ in list(socketio.server.manager.get_participants(namespace, user_room(user_id))):
+            yield namespace, sid
+
+def _enter_route_room(user_id, route_id):
+    """Põe na sala da linha as conexões abertas do usuário (inverso de ``_leave_route_room``)."""
+    for namespace, sid in _user_sids(user_id):
+        socketio.server.enter_room(sid, f'route:{route_id}', namespace=namespace)
+
+def _leave_route_room(user_id, route_id):
+    """Tira da sala da linha as conexões abertas do usuário no /tracking e no /user."""
+    for namespace, sid in _user_sids(user_id):
+        socketio.server.leave_room(sid, f'route:{route_id}', namespace=namespace)
+
+@subscriptions_bp.route('/admin/broadcasts', methods=['POST'])
+@admin_required
+def create_broadcast():
+    data = request.json or {}
+    if not data.get('route_id') or not data.get('title') or not data.get('message'):
+        return jsonify({'error': 'Campos obrigatórios: route_id, title e message'}), 400
+    if not BusRoute.query.get(data['route_id']):
+        return jsonify({'error': 'Linha não encontrada'}), 404
+
+    broadcast = start_broadcast(data['route_id'], data['title'], data['message'], session.get('user_id'))
+    return jsonify(broadcast.to_dict()), 202
+
+@subscriptions_bp.route('/admin/broadcasts/<int:broadcast_id>', methods=['GET'])
+@admin_required
+def get_broadcast(broadcast_id):
+    broadcast = Broadcast.query.get(broadcast_id)
+    if not broadcast:
+        return jsonify({'error': 'Aviso não encontrado'}), 404
+    return jsonify(broadcast.to_dict()), 200
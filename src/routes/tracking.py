@@ -1,9 +1,17 @@
-from flask import Blueprint, request, jsonify
-from src.models.user import db
-from src.models.bus_location import BusLocation, Route
+from datetime import timezone
+from flask import Blueprint, current_app, request, jsonify, session
+from flask_socketio import join_room, leave_room
+from src.models.user import db, LineSubscription
+from src.models.bus_location import Route
 from src.config import GOOGLE_API_KEY, ROUTE_ORIGIN_LAT, ROUTE_ORIGIN_LON, ROUTE_DEST_LAT, ROUTE_DEST_LON
-import requests
-from main import socketio
+from src.extensions import socketio
+from src.services.metrics import SOCKETIO_CONNECTIONS
+from src.services.frames import valid_fix
+from src.services.ingest import ACCEPTED, INGEST_FIXES, Fix, ingest_fix, parse_timestamp
+from src.services.clustering import CLUSTERS, parse_bbox
+from src.services.profiler import profiled
+from src.services.pushes import user_room
+from src import config
 
 tracking_bp = Blueprint("tracking", __name__)
 
@@ -13,37 +21,67 @@ def update_location():
     if not data or 'bus_id' not in data or 'latitude' not in data or 'longitude' not in data:
         return jsonify({"error": "Invalid data"}), 400
 
-    bus_location = BusLocation.query.filter_by(bus_id=data['bus_id']).first()
-    if not bus_location:
-        bus_location = BusLocation(
-            bus_id=data['bus_id'],
-            latitude=data['latitude'],
-            longitude=data['longitude']
+    try:
+        fix = Fix(
+            bus_id=int(data['bus_id']),
+            latitude=float(data['latitude']),
+            longitude=float(data['longitude']),
+            timestamp=parse_timestamp(data.get('timestamp'))
         )
-        db.session.add(bus_location)
-    else:
-        bus_location.latitude = data['latitude']
-        bus_location.longitude = data['longitude']
+    except (TypeError, ValueError):
+        INGEST_FIXES.inc(result='invalid')
+        return jsonify({"error": "Invalid data"}), 400
+    # Mesma validação do caminho binário (/driver): NaN, infinito ou fora de ±90/±180
+    epoch = fix.timestamp.replace(tzinfo=timezone.utc).timestamp()
+    if not valid_fix(epoch, fix.latitude, fix.longitude):
+        INGEST_FIXES.inc(result='invalid')
+        return jsonify({"error": "Invalid data"}), 400
 
-    db.session.commit()
+    result, location = ingest_fix(fix)
+    if result != ACCEPTED:
+        # Posição descartada pelo filtro: nada foi gravado nem transmitido
+        return jsonify({"success": True, "accepted": False, "reason": result}), 200
 
-    # Emitir a atualização da localização para os clientes conectados
-    socketio.emit('location_update', bus_location.to_dict(), namespace='/tracking')
+    return jsonify({"success": True, "accepted": True, "data": location}), 200
 
-    return jsonify({"success": True, "data": bus_location.to_dict()}), 200
+@tracking_bp.route("/bus-clusters", methods=["GET"])
+def get_bus_clusters():
+    try:
+        bbox = parse_bbox(request.args.get('bbox', ''))
+        zoom = int(request.args.get('zoom', ''))
+    except ValueError:
+        return jsonify({"error": "Informe bbox=min_lon,min_lat,max_lon,max_lat e zoom"}), 400
+
+    # Cada agrupamento é [lat, lon, quantidade, bus_id (só quando há um ônibus)]
+    return jsonify({"zoom": zoom, "clusters": CLUSTERS.query(bbox, zoom)}), 200
+
+def _geometry_response(route_data, zoom, cached):
+    # Traçado simplificado para o zoom, com ETag forte para revalidação barata
+    from src.services.route_geometry import geometry_for
+    polyline, etag = geometry_for(route_data, zoom)
+    response = jsonify({"polyline": polyline, "cached": cached, "zoom": zoom})
+    # O corpo também traz 'cached': a tag muda com ele para o 304 não servir o corpo errado
+    response.set_etag(f"{etag}-{int(cached)}")
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response.make_conditional(request)
 
 @tracking_bp.route("/route/<int:bus_id>", methods=["GET"])
 def get_route(bus_id):
+    zoom = request.args.get('zoom', type=int)
+
     # 1. Tenta buscar a rota no banco de dados (para evitar chamadas repetidas à API do Google)
     # Por simplicidade, vamos usar um ID de rota fixo para o exemplo
     route_name = f"Linha_{bus_id}"
     route_data = Route.query.filter_by(route_name=route_name).first()
 
     if route_data and route_data.polyline:
-        return jsonify({"polyline": route_data.polyline, "cached": True}), 200
+        return _geometry_response(route_data, zoom, cached=True)
 
     # 2. Se não estiver no cache, busca na Google Directions API
     try:
+        # Importado sob demanda: só o caminho sem cache precisa do cliente HTTP
+        import requests
+
         # Use as coordenadas de exemplo do config.py
         origin = f"{ROUTE_ORIGIN_LAT},{ROUTE_ORIGIN_LON}"
         destination = f"{ROUTE_DEST_LAT},{ROUTE_DEST_LON}"
@@ -56,7 +94,7 @@ def get_route(bus_id):
             "key": GOOGLE_API_KEY
         }
         
-        response = requests.get(url, params=params)
+        response = requests.get(url, params=params, timeout=10)
         data = response.json()
         
         if data['status'] == 'OK' and data['routes']:
@@ -75,39 +113,111 @@ def get_route(bus_id):
                 db.session.add(route_data)
             else:
                 route_data.polyline = polyline
+            db.session.flush()
+            # Os níveis simplificados são gerados junto com o traçado, não na leitura
+            from src.services.route_geometry import build_tiers
+            build_tiers(route_data.id, polyline)
             
             db.session.commit()
             
-            return jsonify({"polyline": polyline, "cached": False}), 200
+            return _geometry_response(route_data, zoom, cached=False)
         else:
             return jsonify({"error": "Erro ao buscar rota na Google API", "details": data.get('error_message', data.get('status'))}), 500
 
     except Exception as e:
         return jsonify({"error": f"Erro interno ao processar rota: {str(e)}"}), 500
 
-    bus_location = BusLocation.query.filter_by(bus_id=data['bus_id']).first()
-    if not bus_location:
-        bus_location = BusLocation(
-            bus_id=data['bus_id'],
-            latitude=data['latitude'],
-            longitude=data['longitude']
-        )
-        db.session.add(bus_location)
-    else:
-        bus_location.latitude = data['latitude']
-        bus_location.longitude = data['longitude']
-
-    db.session.commit()
-
-    # Emitir a atualização da localização para os clientes conectados
-    socketio.emit('location_update', bus_location.to_dict(), namespace='/tracking')
-
-    return jsonify({"success": True, "data": bus_location.to_dict()}), 200
-
 @socketio.on('connect', namespace='/tracking')
 def handle_connect():
+    SOCKETIO_CONNECTIONS.inc(namespace='/tracking')
+    join_room('positions')
+    # Passageiro logado recebe ao vivo os avisos das linhas em que está inscrito;
+    # a sala do usuário permite tirá-lo da sala da linha ao cancelar a inscrição
+    if 'user_id' in session:
+        join_room(user_room(session['user_id']))
+        for (route_id,) in LineSubscription.query.with_entities(
+                LineSubscription.route_id).filter_by(user_id=session['user_id']):
+            join_room(f'route:{route_id}')
     print('Client connected')
 
 @socketio.on('disconnect', namespace='/tracking')
 def handle_disconnect():
+    SOCKETIO_CONNECTIONS.dec(namespace='/tracking')
+    _viewports.pop(request.sid, None)
     print('Client disconnected')
+
+def _room(data):
+    """Sala de interesse do cliente: uma parada, uma linha ou um ônibus."""
+    for key, prefix in (('stop_id', 'stop'), ('route_id', 'route'), ('bus_id', 'bus')):
+        if isinstance(data, dict) and data.get(key) is not None:
+            try:
+                return f'{prefix}:{int(data[key])}'
+            except (TypeError, ValueError):
+                return None
+    return None
+
+@socketio.on('subscribe', namespace='/tracking')
+def handle_subscribe(data):
+    room = _room(data)
+    if not room:
+        return {'error': 'Informe stop_id, route_id ou bus_id'}
+    if room.startswith('route:'):
+        # A sala da linha recebe os avisos enviados aos inscritos: só entra quem é um deles
+        route_id = int(room.split(':')[1])
+        if 'user_id' not in session or not LineSubscription.query.get((session['user_id'], route_id)):
+            return {'error': 'Inscreva-se na linha para receber os avisos dela'}
+    join_room(room)
+    return {'subscribed': room}
+
+@socketio.on('unsubscribe', namespace='/tracking')
+def handle_unsubscribe(data):
+    room = _room(data)
+    if not room:
+        return {'error': 'Informe stop_id, route_id ou bus_id'}
+    leave_room(room)
+    return {'unsubscribed': room}
+
+# sid -> (bbox, zoom) dos clientes no modo agrupado
+_viewports = {}
+_push_task = None
+
+def _push_clusters(app):
+    """Envia periodicamente os agrupamentos a cada cliente no modo agrupado.
+
+    Clientes com o mesmo viewport (arredondado às células) compartilham o
+    mesmo cálculo; nada é enviado se nenhuma posição mudou.
+    """
+    last_version = None
+    while True:
+        socketio.sleep(config.CLUSTER_PUSH_INTERVAL_S)
+        if not _viewports or CLUSTERS.version == last_version:
+            continue
+        last_version = CLUSTERS.version
+        with app.app_context(), profiled('cluster_push'):
+            computed = {}
+            for sid, (bbox, zoom) in list(_viewports.items()):
+                key = CLUSTERS.view_key(bbox, zoom)
+                if key not in computed:
+                    computed[key] = {'zoom': zoom, 'clusters': CLUSTERS.query(bbox, zoom)}
+                socketio.emit('clusters', computed[key], namespace='/tracking', to=sid)
+
+@socketio.on('viewport', namespace='/tracking')
+def handle_viewport(data):
+    """Ativa o modo agrupado (``{bbox, zoom}``) ou volta às posições individuais (``null``)."""
+    global _push_task
+    if not data:
+        _viewports.pop(request.sid, None)
+        join_room('positions')
+        return {'mode': 'positions'}
+
+    try:
+        bbox = parse_bbox(data.get('bbox', ''))
+        zoom = int(data['zoom'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return {'error': 'Informe bbox=min_lon,min_lat,max_lon,max_lat e zoom'}
+
+    _viewports[request.sid] = (bbox, zoom)
+    leave_room('positions')
+    if _push_task is None:
+        _push_task = socketio.start_background_task(_push_clusters, current_app._get_current_object())
+    return {'mode': 'clusters', 'zoom': zoom, 'clusters': CLUSTERS.query(bbox, zoom)}
@@ -3,6 +3,14 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from src.models.user import User, Transaction, BusRoute, BusLocation, Rating, Notification, Driver, db
 from datetime import datetime
+from src.services.archive import history, is_archived
+from src.services.ridership import record_tap
+from src.services.occupancy import OCCUPANCY
+from src.services.fleet import FLEET
+from src.services.roster_version import ROSTER_VERSION
+from src.services.search import SEARCH, first_conflict
+from src.services.pushes import push_balance, push_notification
+from src.extensions import offload
 
 user_bp = Blueprint('user', __name__)
 
@@ -28,21 +36,23 @@ def create_notification(user_id, title, message):
     )
     db.session.add(notification)
     db.session.commit()
+    push_notification(notification)
 
 # Rotas de autenticação
 @user_bp.route('/register', methods=['POST'])
 def register():
     data = request.json
     
-    # Verificar se usuário já existe
-    if User.query.filter_by(username=data['username']).first():
+    # Verificar se usuário já existe (nome e email numa só consulta)
+    conflict = first_conflict(User, {'username': data['username'], 'email': data['email']})
+    if conflict == 'username':
         return jsonify({'error': 'Usuário já existe'}), 400
     
-    if User.query.filter_by(email=data['email']).first():
+    if conflict == 'email':
         return jsonify({'error': 'Email já cadastrado'}), 400
     
     # Criar novo usuário
-    hashed_password = generate_password_hash(data['password'])
+    hashed_password = offload(generate_password_hash, data['password'])
     user = User(
         username=data['username'], 
         email=data['email'],
@@ -51,7 +61,9 @@ def register():
     )
     
     db.session.add(user)
+    ROSTER_VERSION.bump()
     db.session.commit()
+    SEARCH.refresh_user(user.id)
     
     return jsonify({
         'message': 'Usuário criado com sucesso',
@@ -63,7 +75,7 @@ def login():
     data = request.json
     user = User.query.filter_by(username=data['username']).first()
     
-    if user and check_password_hash(user.password, data['password']):
+    if user and offload(check_password_hash, user.password, data['password']):
         session['user_id'] = user.id
         return jsonify({
             'message': 'Login realizado com sucesso',
@@ -103,14 +115,12 @@ def update_profile():
     if not data.get('username') or not data.get('email'):
         return jsonify({'error': 'Nome de usuário e e-mail são obrigatórios'}), 400
     
-    # Verificar se o novo username já existe (exceto para o usuário atual)
-    existing_user = User.query.filter_by(username=data['username']).first()
-    if existing_user and existing_user.id != user.id:
+    # Verificar se o novo username ou email já existe (exceto para o usuário atual)
+    conflict = first_conflict(User, {'username': data['username'], 'email': data['email']}, exclude_id=user.id)
+    if conflict == 'username':
         return jsonify({'error': 'Nome de usuário já existe'}), 400
     
-    # Verificar se o novo email já existe (exceto para o usuário atual)
-    existing_email = User.query.filter_by(email=data['email']).first()
-    if existing_email and existing_email.id != user.id:
+    if conflict == 'email':
         return jsonify({'error': 'E-mail já cadastrado'}), 400
     
     # Atualizar dados
@@ -119,10 +129,12 @@ def update_profile():
     
     # Atualizar senha se fornecida
     if data.get('password'):
-        user.password = generate_password_hash(data['password'])
+        user.password = offload(generate_password_hash, data['password'])
     
     try:
+        ROSTER_VERSION.bump()
         db.session.commit()
+        SEARCH.refresh_user(user.id)
         return jsonify({
             'message': 'Perfil atualizado com sucesso',
             'username': user.username,
@@ -210,6 +222,7 @@ def recharge_card():
         
         db.session.add(transaction)
         db.session.commit()
+        push_balance(user)
         
         # Criar notificação de recarga
         create_notification(
@@ -230,21 +243,55 @@ def recharge_card():
             'payment_info': payment_info
         }), 202
 
+def _history_params():
+    # Filtros opcionais dos históricos; None se algum for inválido
+    try:
+        limit = request.args.get('limit', type=int)
+        since = request.args.get('since')
+        until = request.args.get('until')
+        return {
+            'limit': limit if limit and limit > 0 else None,
+            'since': datetime.fromisoformat(since) if since else None,
+            'until': datetime.fromisoformat(until) if until else None,
+        }
+    except ValueError:
+        return None
+
 @user_bp.route('/notifications', methods=['GET'])
 def get_notifications():
     if 'user_id' not in session:
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
-    notifications = Notification.query.filter_by(user_id=session['user_id']).order_by(Notification.created_at.desc()).all()
-    return jsonify([notification.to_dict() for notification in notifications])
+    params = _history_params()
+    if params is None:
+        return jsonify({'error': 'Parâmetros inválidos: since e until devem ser datas ISO'}), 400
+    return jsonify(history('notification', session['user_id'], **params))
+
+@user_bp.route('/notifications/<int:notification_id>/read', methods=['PUT'])
+def mark_notification_read(notification_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    notification = Notification.query.filter_by(id=notification_id, user_id=session['user_id']).first()
+    if notification is None:
+        # O arquivo frio é somente leitura: o cliente guarda a marcação só localmente
+        if is_archived('notification', session['user_id'], notification_id):
+            return jsonify({'error': 'Notificação arquivada não pode ser marcada como lida', 'archived': True}), 409
+        return jsonify({'error': 'Notificação não encontrada'}), 404
+
+    notification.read = True
+    db.session.commit()
+    return jsonify(notification.to_dict()), 200
 
 @user_bp.route('/transactions', methods=['GET'])
 def get_transactions():
     if 'user_id' not in session:
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
-    transactions = Transaction.query.filter_by(user_id=session['user_id']).order_by(Transaction.created_at.desc()).all()
-    return jsonify([transaction.to_dict() for transaction in transactions])
+    params = _history_params()
+    if params is None:
+        return jsonify({'error': 'Parâmetros inválidos: since e until devem ser datas ISO'}), 400
+    return jsonify(history('transaction', session['user_id'], **params))
 
 # Rotas de ônibus e rotas
 @user_bp.route('/routes', methods=['GET'])
@@ -264,6 +311,16 @@ def use_transport():
     
     data = request.json
     route_id = data.get('route_id')
+
+    # Veículo informado pelo validador: precisa ser um id de veículo cadastrado
+    bus_id = data.get('bus_id')
+    if bus_id is not None:
+        try:
+            bus_id = int(bus_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'bus_id deve ser o id de um veículo'}), 400
+        if not OCCUPANCY.known(bus_id):
+            return jsonify({'error': 'Veículo não encontrado'}), 400
     
     user = User.query.get(session['user_id'])
     route = BusRoute.query.get(route_id)
@@ -277,16 +334,24 @@ def use_transport():
     # Debitar saldo
     user.card_balance -= route.fare
     
-    # Registrar transação
+    # Registrar transação e o embarque no contador horário da linha, na mesma transação
+    now = datetime.utcnow()
     transaction = Transaction(
         user_id=user.id,
         amount=-route.fare,
         transaction_type='usage',
-        description=f'Uso do transporte - Linha {route.route_number}'
+        description=f'Uso do transporte - Linha {route.route_number}',
+        route_id=route.id,
+        created_at=now
     )
     
     db.session.add(transaction)
+    record_tap(route.id, route.fare, now)
     db.session.commit()
+    push_balance(user)
+
+    # Lotação em memória: o validador pode informar o veículo; senão, vai ao que serve a linha
+    bus_id = OCCUPANCY.tap(route.id, bus_id)
     
     # Verificar e criar notificação de saldo baixo
     if user.card_balance < 5.0:
@@ -299,11 +364,20 @@ def use_transport():
     return jsonify({
         'message': 'Transporte utilizado com sucesso',
         'new_balance': user.card_balance,
-        'transaction': transaction.to_dict()
+        'transaction': transaction.to_dict(),
+        'bus_id': bus_id
     }), 200
 
 # Rotas administrativas (para popular dados de exemplo)
 # Rotas de Motoristas
+# Campos únicos do motorista, na ordem em que os conflitos são informados
+DRIVER_UNIQUE_ERRORS = {
+    'email': 'Email já cadastrado',
+    'cpf': 'CPF já cadastrado',
+    'cnh': 'CNH já cadastrada',
+    'code': 'Código já cadastrado',
+}
+
 @user_bp.route('/admin/drivers', methods=['GET'])
 @admin_required
 def list_drivers():
@@ -319,17 +393,10 @@ def add_driver():
     if not all(field in data for field in required_fields):
         return jsonify({'error': 'Todos os campos são obrigatórios: nome, email, cpf, cnh, linha do ônibus e código'}), 400
 
-    if Driver.query.filter_by(email=data['email']).first():
-        return jsonify({'error': 'Email já cadastrado'}), 400
-    
-    if Driver.query.filter_by(cpf=data['cpf']).first():
-        return jsonify({'error': 'CPF já cadastrado'}), 400
-    
-    if Driver.query.filter_by(cnh=data['cnh']).first():
-        return jsonify({'error': 'CNH já cadastrada'}), 400
-    
-    if Driver.query.filter_by(code=data['code']).first():
-        return jsonify({'error': 'Código já cadastrado'}), 400
+    # Validação de unicidade para email, cpf, cnh e code, numa só consulta
+    conflict = first_conflict(Driver, {field: data[field] for field in DRIVER_UNIQUE_ERRORS})
+    if conflict:
+        return jsonify({'error': DRIVER_UNIQUE_ERRORS[conflict]}), 400
     
     driver = Driver(
         name=data['name'],
@@ -341,7 +408,10 @@ def add_driver():
     )
     
     db.session.add(driver)
+    ROSTER_VERSION.bump()
     db.session.commit()
+    FLEET.refresh_driver(driver.id)
+    SEARCH.refresh_driver(driver.id)
     
     return jsonify({
         'message': 'Motorista cadastrado com sucesso',
@@ -361,18 +431,10 @@ def edit_driver(driver_id):
     if not all(field in data for field in required_fields):
         return jsonify({'error': 'Todos os campos são obrigatórios: nome, email, cpf, cnh, linha do ônibus e código'}), 400
 
-    # Validação de unicidade para email, cpf, cnh e code
-    if Driver.query.filter(Driver.email == data['email'], Driver.id != driver_id).first():
-        return jsonify({'error': 'Email já cadastrado por outro motorista'}), 400
-    
-    if Driver.query.filter(Driver.cpf == data['cpf'], Driver.id != driver_id).first():
-        return jsonify({'error': 'CPF já cadastrado por outro motorista'}), 400
-    
-    if Driver.query.filter(Driver.cnh == data['cnh'], Driver.id != driver_id).first():
-        return jsonify({'error': 'CNH já cadastrada por outro motorista'}), 400
-    
-    if Driver.query.filter(Driver.code == data['code'], Driver.id != driver_id).first():
-        return jsonify({'error': 'Código já cadastrado por outro motorista'}), 400
+    # Validação de unicidade para email, cpf, cnh e code, numa só consulta
+    conflict = first_conflict(Driver, {field: data[field] for field in DRIVER_UNIQUE_ERRORS}, exclude_id=driver_id)
+    if conflict:
+        return jsonify({'error': DRIVER_UNIQUE_ERRORS[conflict] + ' por outro motorista'}), 400
 
     driver.name = data['name']
     driver.email = data['email']
@@ -381,7 +443,10 @@ def edit_driver(driver_id):
     driver.bus_line = data['bus_line']
     driver.code = data['code']
 
+    ROSTER_VERSION.bump()
     db.session.commit()
+    FLEET.refresh_driver(driver.id)
+    SEARCH.refresh_driver(driver.id)
     
     return jsonify({
         'message': 'Motorista atualizado com sucesso',
@@ -404,7 +469,10 @@ def delete_driver(driver_id):
         return jsonify({'error': 'Motorista não encontrado'}), 404
     
     db.session.delete(driver)
+    ROSTER_VERSION.bump()
     db.session.commit()
+    FLEET.refresh_driver(driver_id)
+    SEARCH.remove('driver', driver_id)
     
     return jsonify({'message': 'Motorista excluído com sucesso'}), 200
 
@@ -439,7 +507,10 @@ def populate_routes():
     for location in locations:
         db.session.add(location)
     
+    ROSTER_VERSION.bump()
     db.session.commit()
+    OCCUPANCY.invalidate()
+    FLEET.invalidate()
     
     return jsonify({'message': 'Rotas e localizações criadas com sucesso'}), 201
 
@@ -493,7 +564,7 @@ def reset_password():
         return jsonify({'error': 'Usuário não encontrado'}), 404
     
     # Atualizar senha
-    user.password = generate_password_hash(new_password)
+    user.password = offload(generate_password_hash, new_password)
     
     try:
         db.session.commit()
@@ -621,7 +692,8 @@ from src.models.user import Vehicle
 @user_bp.route('/admin/vehicles', methods=['GET'])
 @admin_required
 def list_vehicles():
-    vehicles = Vehicle.query.order_by(Vehicle.created_at.desc()).all()
+    # Motorista carregado na mesma consulta (to_dict usa driver.name)
+    vehicles = Vehicle.query.options(db.joinedload(Vehicle.driver)).order_by(Vehicle.created_at.desc()).all()
     return jsonify([vehicle.to_dict() for vehicle in vehicles]), 200
 
 @user_bp.route('/admin/vehicles', methods=['POST'])
@@ -657,7 +729,11 @@ def add_vehicle():
     )
     
     db.session.add(vehicle)
+    ROSTER_VERSION.bump()
     db.session.commit()
+    OCCUPANCY.invalidate()
+    FLEET.refresh_vehicle(vehicle.id)
+    SEARCH.refresh_vehicle(vehicle.id)
     
     return jsonify({
         'message': 'Veículo cadastrado com sucesso',
@@ -699,7 +775,11 @@ def edit_vehicle(vehicle_id):
     vehicle.bus_line = data.get('bus_line')
     vehicle.driver_id = data.get('driver_id')
 
+    ROSTER_VERSION.bump()
     db.session.commit()
+    OCCUPANCY.invalidate()
+    FLEET.refresh_vehicle(vehicle.id)
+    SEARCH.refresh_vehicle(vehicle.id)
     
     return jsonify({
         'message': 'Veículo atualizado com sucesso',
@@ -722,6 +802,10 @@ def delete_vehicle(vehicle_id):
         return jsonify({'error': 'Veículo não encontrado'}), 404
     
     db.session.delete(vehicle)
+    ROSTER_VERSION.bump()
     db.session.commit()
+    OCCUPANCY.invalidate()
+    FLEET.remove_vehicle(vehicle_id)
+    SEARCH.remove('vehicle', vehicle_id)
     
     return jsonify({'message': 'Veículo excluído com sucesso'}), 200
@@ -0,0 +1,178 @@
+"""Servidor da aplicação: ``python -m src.server`` (ou ``python src/main.py``).
+
+O modo vem de ``config.SERVER_MODE`` (ou ``--mode``):
+
+* ``development``: servidor do Werkzeug com depurador e recarga automática;
+* ``production``: gevent. Cada conexão é um greenlet e a biblioteca padrão
+  recebe o monkey patch antes de qualquer outro import, então esperas de
+  rede (Socket.IO, ``requests``) cedem a vez aos outros clientes. Trabalho
+  de CPU (hash de senha) vai para o pool de threads via ``offload``.
+
+No modo de produção, SIGTERM ou SIGINT esvaziam o processo: o socket de
+escuta é fechado, os clientes Socket.IO são desconectados (reconectam em
+outro nó), as requisições e entregas de avisos em andamento têm
+``SERVER_SHUTDOWN_GRACE_S`` para terminar e as escritas pendentes
+(lotação dos veículos, trilha de posições) são gravadas antes de sair.
+"""
+import argparse
+import os
+import sys
+# Mesmo ajuste de src/main.py: permite rodar como ``python src/server.py``
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import config
+
+parser = argparse.ArgumentParser(description='Servidor da aplicação.')
+parser.add_argument('--mode', choices=('development', 'production'), default=config.SERVER_MODE)
+parser.add_argument('--host', default=config.SERVER_HOST)
+parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+parser.add_argument('--database', help='arquivo SQLite no lugar de src/database/app.db')
+parser.add_argument('--replay', action='store_true',
+                    help='desliga o intervalo mínimo por ônibus da ingestão (replay acelerado do simulador)')
+args = parser.parse_args() if __name__ == '__main__' else parser.parse_args([])
+
+if args.mode == 'production':
+    from gevent import monkey
+    monkey.patch_all()
+
+import logging
+import resource
+import signal
+import time
+
+from src.extensions import socketio
+from src.main import create_app
+from src.models.user import db
+
+logger = logging.getLogger('src.server')
+
+
+def _app():
+    overrides = {'SOCKETIO_ASYNC_MODE': 'gevent' if args.mode == 'production' else 'threading'}
+    if args.database:
+        overrides['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath(args.database)}'
+    app = create_app(overrides)
+    if args.replay:
+        # No replay acelerado os horários chegam comprimidos pela velocidade
+        from src.services.ingest import INGEST_FILTER
+        INGEST_FILTER.min_interval_s = 0.0
+    from src.migrations import upgrade
+    with app.app_context():
+        upgrade(db.engine, log=print)
+    return app
+
+
+def _raise_file_limit(wanted):
+    # Cada conexão aberta é um descritor de arquivo
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    if soft != resource.RLIM_INFINITY and soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def flush_pending(app):
+    """Grava o que ainda está só em memória."""
+    from src.services import traces
+    from src.services.occupancy import OCCUPANCY
+
+    with app.app_context():
+        try:
+            OCCUPANCY.checkpoint()
+        except Exception:
+            db.session.rollback()
+            logger.exception('Falha ao gravar a lotação dos veículos')
+        if traces._recorder is not None:
+            traces._recorder.close()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def run_production(app):
+    import gevent
+    from gevent import pywsgi
+    from gevent.event import Event
+    from gevent.pool import Pool
+
+    from src.services.broadcasts import active as active_broadcasts
+
+    idle = set()
+    draining = []
+
+    class Handler(pywsgi.WSGIHandler):
+        def read_requestline(self):
+            # Entre duas requisições a conexão fica ociosa: limitada pelo keep-alive
+            # e encerrada de imediato ao esvaziar o processo
+            if draining:
+                return ''
+            current = gevent.getcurrent()
+            idle.add(current)
+            try:
+                with gevent.Timeout(config.SERVER_KEEPALIVE_S, False):
+                    return super().read_requestline()
+                return ''
+            finally:
+                idle.discard(current)
+
+        def handle_one_request(self):
+            result = super().handle_one_request()
+            if result is True and draining:
+                return None
+            return result
+
+    _raise_file_limit(config.SERVER_MAX_CONNECTIONS + 1024)
+    gevent.get_hub().threadpool.maxsize = config.SERVER_THREADPOOL_SIZE
+    pool = Pool(config.SERVER_MAX_CONNECTIONS)
+    server = pywsgi.WSGIServer(
+        (args.host, args.port), app, spawn=pool, handler_class=Handler,
+        backlog=config.SERVER_BACKLOG, log=None, error_log=logger
+    )
+    stopped = Event()
+
+    def drain(signum):
+        if draining:
+            return
+        draining.append(signum)
+        started = time.monotonic()
+        deadline = started + config.SERVER_SHUTDOWN_GRACE_S
+        print(f'Sinal {signum}: esvaziando ({len(pool)} conexões abertas)', flush=True)
+        server.close()
+        # Clientes Socket.IO seguram uma conexão cada; desconectados, reconectam em outro nó.
+        # Sem esperar a fila de cada um: um cliente de long-polling que não volta travaria o resto
+        eio = socketio.server.eio
+        for client in list(eio.sockets.values()):
+            client.close(wait=False, reason=eio.reason.SERVER_DISCONNECT)
+        socketio.server.shutdown()
+        gevent.killall(list(idle), block=False)
+        while (len(pool) or active_broadcasts()) and time.monotonic() < deadline:
+            gevent.sleep(0.05)
+        remaining = len(pool)
+        pool.kill(block=True, timeout=1)
+        flush_pending(app)
+        print(f'Encerrado em {time.monotonic() - started:.1f} s '
+              f'({remaining} conexões interrompidas, avisos pendentes: {sorted(active_broadcasts())})', flush=True)
+        stopped.set()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        gevent.signal_handler(signum, lambda signum=signum: gevent.spawn(drain, signum))
+
+    server.start()
+    print(f'Servidor (gevent) em http://{args.host}:{args.port} '
+          f'- até {config.SERVER_MAX_CONNECTIONS} conexões', flush=True)
+    stopped.wait()
+
+
+def main():
+    app = _app()
+    # Avisos cuja entrega foi interrompida por um reinício continuam de onde pararam
+    from src.services.broadcasts import resume_interrupted
+    resume_interrupted(app)
+    if args.mode == 'production':
+        run_production(app)
+    else:
+        socketio.run(app, host=args.host, port=args.port, debug=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
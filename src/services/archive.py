@@ -0,0 +1,343 @@
+"""Arquivo frio de transações e notificações.
+
+Linhas mais antigas que o corte saem das tabelas quentes para segmentos
+imutáveis em ``ARCHIVE_DIR/<tabela>/<AAAA-MM>/``, um por mês a cada
+execução. Formato do segmento::
+
+    cabeçalho  b'ASEG' + versão (uint16) + tamanho do índice (uint32)
+    índice     JSON comprimido: colunas e, por usuário, [offset, tamanho, linhas]
+    blocos     um por usuário: JSON comprimido ``{coluna: [valores]}``,
+               linhas do mais recente para o mais antigo
+
+O catálogo (``archive_segment`` e ``archive_segment_user``) é gravado na
+mesma transação que apaga as linhas quentes, então um segmento só passa a
+valer junto com a remoção; arquivos órfãos de uma execução interrompida
+são ignorados. O mês é lido do banco em lotes, já na ordem do segmento, e
+os blocos vão para o disco à medida que cada usuário termina: em memória
+ficam só o índice e as linhas de um usuário.
+
+``history`` junta as duas fontes e só abre os segmentos que contêm o
+usuário e o intervalo pedidos. Linhas arquivadas saem com
+``archived: True``: são somente leitura (uma notificação arquivada não pode
+mais ser marcada como lida).
+"""
+import json
+import os
+import shutil
+import struct
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+
+from flask import current_app
+from sqlalchemy import func
+
+from src import config
+from src.models.user import db, Transaction, Notification
+from src.models.archive import ArchiveSegment, ArchiveSegmentUser
+
+MAGIC = b'ASEG'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+
+# Colunas arquivadas, na forma em que ``to_dict`` as devolve
+TABLES = {
+    'transaction': (Transaction, ('id', 'user_id', 'amount', 'transaction_type', 'description', 'route_id', 'created_at')),
+    'notification': (Notification, ('id', 'user_id', 'title', 'message', 'read', 'created_at')),
+}
+
+# Linhas lidas do banco por vez ao arquivar um mês
+READ_BATCH = 5000
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def _month_bounds(month):
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def _row_dict(columns, values):
+    row = dict(zip(columns, values))
+    if isinstance(row['created_at'], datetime):
+        row['created_at'] = row['created_at'].isoformat()
+    return row
+
+
+def write_segment(path, table_name, month, columns, rows):
+    """Grava ``rows`` (dicts); retorna ``{user_id: linhas}``.
+
+    As linhas devem vir agrupadas por usuário e, dentro de cada usuário, da
+    mais recente para a mais antiga. Cada bloco vai para um arquivo auxiliar
+    assim que o usuário termina; o índice, que precede os blocos, é escrito
+    no fim.
+    """
+    index = {}
+    counts = {}
+    offset = 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    blocks_path = path + '.blocks'
+    tmp_path = path + '.tmp'
+    try:
+        with open(blocks_path, 'w+b') as blocks:
+            for user_id, user_rows in groupby(rows, key=itemgetter('user_id')):
+                if user_id in counts:
+                    raise ArchiveError('linhas do segmento devem vir agrupadas por usuário')
+                user_rows = list(user_rows)
+                block = zlib.compress(json.dumps(
+                    {column: [row[column] for row in user_rows] for column in columns},
+                    separators=(',', ':')
+                ).encode('utf-8'))
+                blocks.write(block)
+                index[str(user_id)] = [offset, len(block), len(user_rows)]
+                counts[user_id] = len(user_rows)
+                offset += len(block)
+
+            header = zlib.compress(json.dumps(
+                {'table': table_name, 'month': month, 'columns': list(columns), 'users': index},
+                separators=(',', ':')
+            ).encode('utf-8'))
+            blocks.seek(0)
+            with open(tmp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, len(header)))
+                f.write(header)
+                shutil.copyfileobj(blocks, f)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        for leftover in (blocks_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return counts
+
+
+@lru_cache(maxsize=256)
+def _read_index(path):
+    # Segmentos são imutáveis: o índice pode ficar em cache pelo caminho
+    with open(path, 'rb') as f:
+        magic, version, header_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ArchiveError(f'Segmento inválido: {path}')
+        index = json.loads(zlib.decompress(f.read(header_size)))
+    return index, HEADER.size + header_size
+
+
+def _block_rows(index, block):
+    # Colunas criadas depois da gravação do segmento saem como None
+    columns = index['columns']
+    missing = [column for column in TABLES[index['table']][1] if column not in block]
+    for values in zip(*(block[column] for column in columns)):
+        row = dict(zip(columns, values))
+        for column in missing:
+            row[column] = None
+        yield row
+
+
+def read_user_rows(path, user_id):
+    """Linhas de um usuário no segmento, da mais recente para a mais antiga."""
+    index, data_start = _read_index(path)
+    entry = index['users'].get(str(user_id))
+    if entry is None:
+        return []
+    offset, size, _ = entry
+    with open(path, 'rb') as f:
+        f.seek(data_start + offset)
+        block = json.loads(zlib.decompress(f.read(size)))
+    return list(_block_rows(index, block))
+
+
+def read_segment_rows(path):
+    """Todas as linhas do segmento, um bloco de usuário por vez."""
+    index, data_start = _read_index(path)
+    with open(path, 'rb') as f:
+        for offset, size, _ in index['users'].values():
+            f.seek(data_start + offset)
+            yield from _block_rows(index, json.loads(zlib.decompress(f.read(size))))
+
+
+def iter_archived(table_name, since=None, until=None):
+    """Linhas arquivadas de todos os usuários no intervalo, segmento a segmento."""
+    segments = ArchiveSegment.query.filter_by(table_name=table_name)
+    if since:
+        segments = segments.filter(ArchiveSegment.max_created_at >= since)
+    if until:
+        segments = segments.filter(ArchiveSegment.min_created_at < until)
+    paths = [segment.path for segment in segments.order_by(ArchiveSegment.month, ArchiveSegment.id)]
+
+    archive_dir = current_app.config['ARCHIVE_DIR']
+    since_key = since.isoformat() if since else None
+    until_key = until.isoformat() if until else None
+    for path in paths:
+        for row in read_segment_rows(os.path.join(archive_dir, path)):
+            if since_key and row['created_at'] < since_key:
+                continue
+            if until_key and row['created_at'] >= until_key:
+                continue
+            yield row
+
+
+def _archive_month(table_name, month, cutoff, archive_dir):
+    model, columns = TABLES[table_name]
+    start, end = _month_bounds(month)
+    end = min(end, cutoff)
+    in_month = (model.created_at >= start, model.created_at < end)
+    first_id, max_id = db.session.execute(
+        db.select(func.min(model.id), func.max(model.id)).where(*in_month)
+    ).one()
+    if first_id is None:
+        return 0
+
+    # Na ordem do segmento (usuário; mais recente primeiro), em lotes do cursor
+    result = db.session.execute(
+        db.select(*(getattr(model, column) for column in columns))
+        .where(*in_month, model.id <= max_id)
+        .order_by(model.user_id, model.created_at.desc(), model.id.desc())
+        .execution_options(yield_per=READ_BATCH)
+    )
+    stats = {'rows': 0, 'min': None, 'max': None}
+
+    def rows():
+        for values in result:
+            row = _row_dict(columns, values)
+            created = row['created_at']
+            stats['rows'] += 1
+            stats['min'] = created if stats['min'] is None else min(stats['min'], created)
+            stats['max'] = created if stats['max'] is None else max(stats['max'], created)
+            yield row
+
+    relative = os.path.join(table_name, month, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{first_id}.seg")
+    path = os.path.join(archive_dir, relative)
+    users = write_segment(path, table_name, month, columns, rows())
+    if not stats['rows']:
+        os.remove(path)
+        return 0
+
+    try:
+        segment = ArchiveSegment(
+            table_name=table_name,
+            month=month,
+            path=relative,
+            row_count=stats['rows'],
+            min_created_at=datetime.fromisoformat(stats['min']),
+            max_created_at=datetime.fromisoformat(stats['max'])
+        )
+        db.session.add(segment)
+        db.session.flush()
+        db.session.add_all(
+            ArchiveSegmentUser(user_id=user_id, segment_id=segment.id, row_count=count)
+            for user_id, count in users.items()
+        )
+        # As mesmas linhas lidas: o intervalo é passado e os ids só crescem
+        deleted = db.session.execute(db.delete(model).where(*in_month, model.id <= max_id)).rowcount
+        if deleted != stats['rows']:
+            raise ArchiveError(f'{table_name} {month}: {stats["rows"]} linhas gravadas, {deleted} removidas')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(path)
+        raise
+    return stats['rows']
+
+
+def archive(cutoff=None, tables=None, log=None):
+    """Move para o arquivo frio as linhas anteriores a ``cutoff``.
+
+    Retorna ``{tabela: linhas arquivadas}``.
+    """
+    if cutoff is None:
+        cutoff = datetime.utcnow() - timedelta(days=config.ARCHIVE_HOT_DAYS)
+    archive_dir = current_app.config['ARCHIVE_DIR']
+    archived = {}
+    for table_name in tables or TABLES:
+        model, _ = TABLES[table_name]
+        months = [m for (m,) in db.session.execute(
+            db.select(func.strftime('%Y-%m', model.created_at).label('month'))
+            .where(model.created_at < cutoff)
+            .group_by('month')
+            .order_by('month')
+        )]
+        archived[table_name] = 0
+        for month in months:
+            count = _archive_month(table_name, month, cutoff, archive_dir)
+            archived[table_name] += count
+            if log and count:
+                log(f'{table_name} {month}: {count} linhas arquivadas')
+    return archived
+
+
+def is_archived(table_name, user_id, row_id):
+    """A linha ``row_id`` do usuário está no arquivo (abre só os segmentos dele)."""
+    segments = (
+        db.session.query(ArchiveSegment.path)
+        .join(ArchiveSegmentUser, ArchiveSegmentUser.segment_id == ArchiveSegment.id)
+        .filter(ArchiveSegmentUser.user_id == user_id, ArchiveSegment.table_name == table_name)
+    )
+    archive_dir = current_app.config['ARCHIVE_DIR']
+    return any(row['id'] == row_id
+               for (path,) in segments
+               for row in read_user_rows(os.path.join(archive_dir, path), user_id))
+
+
+def _recency(row):
+    return row['created_at'] or '', row['id']
+
+
+def history(table_name, user_id, limit=None, since=None, until=None):
+    """Histórico do usuário (dicts de ``to_dict``), do mais recente ao mais antigo.
+
+    Junta as linhas quentes com as arquivadas; se as quentes bastarem para
+    ``limit``, nenhum segmento é aberto.
+    """
+    model, _ = TABLES[table_name]
+    query = model.query.filter_by(user_id=user_id)
+    if since:
+        query = query.filter(model.created_at >= since)
+    if until:
+        query = query.filter(model.created_at < until)
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if limit:
+        query = query.limit(limit)
+    rows = [row.to_dict() for row in query]
+    if limit and len(rows) >= limit:
+        return rows
+
+    segments = (
+        db.session.query(ArchiveSegment.path, ArchiveSegment.max_created_at)
+        .join(ArchiveSegmentUser, ArchiveSegmentUser.segment_id == ArchiveSegment.id)
+        .filter(ArchiveSegmentUser.user_id == user_id, ArchiveSegment.table_name == table_name)
+    )
+    if since:
+        segments = segments.filter(ArchiveSegment.max_created_at >= since)
+    if until:
+        segments = segments.filter(ArchiveSegment.min_created_at < until)
+    segments = segments.order_by(ArchiveSegment.max_created_at.desc())
+
+    archive_dir = current_app.config['ARCHIVE_DIR']
+    since_key = since.isoformat() if since else None
+    until_key = until.isoformat() if until else None
+    for path, max_created_at in segments:
+        # Segmentos vêm do mais novo para o mais antigo: se o próximo é todo
+        # mais antigo que a linha de corte do limite, nenhum outro entra
+        if limit and len(rows) >= limit:
+            rows.sort(key=_recency, reverse=True)
+            del rows[limit:]
+            # Datas ausentes contam como as mais antigas, como em _recency
+            newest = max_created_at.isoformat() if max_created_at else ''
+            if newest < (rows[-1]['created_at'] or ''):
+                break
+        for row in read_user_rows(os.path.join(archive_dir, path), user_id):
+            if since_key and row['created_at'] < since_key:
+                continue
+            if until_key and row['created_at'] >= until_key:
+                continue
+            row['archived'] = True
+            rows.append(row)
+
+    rows.sort(key=_recency, reverse=True)
+    return rows[:limit] if limit else rows
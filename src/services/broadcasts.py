@@ -0,0 +1,168 @@
+"""Avisos em massa para os inscritos de uma linha.
+
+O pedido do administrador só grava o ``Broadcast`` e agenda a entrega. Em
+segundo plano, a cópia ao vivo sai com um ``emit`` para a sala ``route:<id>``
+de cada namespace (onde estão os clientes conectados dos inscritos), e as
+notificações persistentes são inseridas em lotes de ``BROADCAST_CHUNK``,
+percorrendo ``line_subscription`` pelo índice (route_id, user_id), com um
+commit por lote para não segurar a escrita do banco.
+
+Cada lote grava o último inscrito notificado e renova a concessão
+(``lease_until``) do processo que entrega. Um processo que morre no meio
+deixa o aviso em ``sending`` com a concessão vencendo; ``resume_interrupted``
+(chamado ao subir o servidor) retoma esses avisos a partir do último
+inscrito, sem repetir notificações nem a cópia ao vivo. A tomada do aviso
+é um UPDATE condicional, então dois processos nunca entregam o mesmo.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from src import config
+from src.extensions import socketio
+from src.models.user import db, Broadcast, LineSubscription, Notification
+from src.services.profiler import profiled
+from src.services.pushes import NAMESPACE as USER_NAMESPACE
+
+# Avisos com entrega em andamento neste processo (esperados ao desligar o servidor)
+_active = set()
+
+
+def start_broadcast(route_id, title, message, created_by=None):
+    broadcast = Broadcast(
+        route_id=route_id,
+        title=title,
+        message=message,
+        recipients=LineSubscription.query.filter_by(route_id=route_id).count(),
+        created_by=created_by
+    )
+    db.session.add(broadcast)
+    db.session.commit()
+    socketio.start_background_task(_deliver, current_app._get_current_object(), broadcast.id)
+    return broadcast
+
+
+def resume_interrupted(app):
+    """Agenda a entrega dos avisos interrompidos (concessão vencida); retorna os ids.
+
+    Avisos cuja concessão ainda vale (o processo anterior acabou de cair, ou
+    outro processo está entregando) são verificados de novo quando ela vencer.
+    """
+    with app.app_context():
+        rows = db.session.execute(
+            db.select(Broadcast.id, Broadcast.lease_until).where(Broadcast.status.in_(('pending', 'sending')))
+        ).all()
+        db.session.remove()
+    now = datetime.utcnow()
+    expired = [broadcast_id for broadcast_id, lease_until in rows if lease_until is None or lease_until < now]
+    for broadcast_id in expired:
+        socketio.start_background_task(_deliver, app, broadcast_id, True)
+    leased = [lease_until for _, lease_until in rows if lease_until is not None and lease_until >= now]
+    if leased:
+        socketio.start_background_task(_resume_later, app, (max(leased) - now).total_seconds() + 1)
+    return expired
+
+
+def _resume_later(app, delay_s):
+    socketio.sleep(delay_s)
+    resume_interrupted(app)
+
+
+def _lease_expired():
+    return db.or_(Broadcast.lease_until.is_(None), Broadcast.lease_until < datetime.utcnow())
+
+
+def _lease():
+    return datetime.utcnow() + timedelta(seconds=config.BROADCAST_LEASE_S)
+
+
+def _claim(broadcast_id, resume):
+    """Toma o aviso para este processo: o novo, se ainda pendente; o interrompido, se a concessão venceu."""
+    condition = [Broadcast.id == broadcast_id]
+    if resume:
+        condition += [Broadcast.status.in_(('pending', 'sending')), _lease_expired()]
+    else:
+        condition.append(Broadcast.status == 'pending')
+    claimed = db.session.execute(
+        db.update(Broadcast).where(*condition).values(status='sending', lease_until=_lease())
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def _deliver(app, broadcast_id, resume=False):
+    _active.add(broadcast_id)
+    with app.app_context(), profiled('broadcast_delivery'):
+        try:
+            deliver(broadcast_id, resume)
+        except Exception:
+            db.session.rollback()
+            Broadcast.query.filter_by(id=broadcast_id).update({'status': 'failed'})
+            db.session.commit()
+            app.logger.exception('Falha na entrega do aviso %s', broadcast_id)
+        finally:
+            _active.discard(broadcast_id)
+
+
+def active():
+    return set(_active)
+
+
+def deliver(broadcast_id, resume=False):
+    """Entrega o aviso; retorna quantos inscritos foram notificados nesta chamada.
+
+    Com ``resume``, continua de ``last_user_id``. Não faz nada (retorna 0)
+    se outro processo já está entregando o aviso.
+    """
+    if not _claim(broadcast_id, resume):
+        return 0
+    broadcast = Broadcast.query.get(broadcast_id)
+
+    created_at = datetime.utcnow()
+    live = {
+        'broadcast_id': broadcast.id,
+        'route_id': broadcast.route_id,
+        'title': broadcast.title,
+        'message': broadcast.message,
+        'created_at': created_at.isoformat()
+    }
+    # Mapa (/tracking) e painel do passageiro (/user) entram nas mesmas salas de linha.
+    # Retomada depois do primeiro lote: a cópia ao vivo já saiu.
+    if broadcast.last_user_id == 0:
+        socketio.emit('notification', live, namespace='/tracking', to=f'route:{broadcast.route_id}')
+        socketio.emit('notification', live, namespace=USER_NAMESPACE, to=f'route:{broadcast.route_id}')
+
+    last_user_id = broadcast.last_user_id
+    delivered = broadcast.delivered
+    sent = 0
+    while True:
+        user_ids = db.session.scalars(
+            db.select(LineSubscription.user_id)
+            .where(LineSubscription.route_id == broadcast.route_id, LineSubscription.user_id > last_user_id)
+            .order_by(LineSubscription.user_id)
+            .limit(config.BROADCAST_CHUNK)
+        ).all()
+        if not user_ids:
+            break
+        db.session.execute(db.insert(Notification), [
+            {'user_id': user_id, 'title': broadcast.title, 'message': broadcast.message,
+             'read': False, 'created_at': created_at}
+            for user_id in user_ids
+        ])
+        delivered += len(user_ids)
+        sent += len(user_ids)
+        last_user_id = user_ids[-1]
+        # Progresso e concessão na mesma transação das notificações do lote
+        broadcast.delivered = delivered
+        broadcast.last_user_id = last_user_id
+        broadcast.lease_until = _lease()
+        db.session.commit()
+        # Cede a vez aos pedidos entre um lote e outro
+        socketio.sleep(0)
+
+    broadcast.status = 'done'
+    broadcast.recipients = max(broadcast.recipients, delivered)
+    broadcast.finished_at = datetime.utcnow()
+    broadcast.lease_until = None
+    db.session.commit()
+    return sent
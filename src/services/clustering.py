@@ -0,0 +1,185 @@
+"""Agrupamento das posições ao vivo por nível de zoom.
+
+Para cada zoom mantemos uma grade de células de ``CLUSTER_CELL_PX`` pixels
+(na projeção Web Mercator) com contagem e soma das coordenadas dos ônibus
+dentro dela. Mover um ônibus custa uma atualização por nível de zoom,
+independente do tamanho da frota, e a consulta de uma área visível devolve
+no máximo uma entrada por célula, ou seja, limitada pela resolução da tela.
+"""
+import math
+import threading
+import time
+
+from src import config
+from src.models.user import BusLocation
+
+TILE_SIZE = 256
+MAX_LATITUDE = 85.05112878
+
+
+def _pixel(lat, lon, zoom):
+    lat = min(max(lat, -MAX_LATITUDE), MAX_LATITUDE)
+    scale = TILE_SIZE * (1 << zoom)
+    x = (lon + 180.0) / 360.0 * scale
+    sin_lat = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+class _Cell:
+    __slots__ = ('count', 'sum_lat', 'sum_lon', 'members')
+
+    def __init__(self):
+        self.count = 0
+        self.sum_lat = 0.0
+        self.sum_lon = 0.0
+        self.members = set()
+
+
+class ClusterIndex:
+    def __init__(self, min_zoom=None, max_zoom=None, cell_px=None, max_age_s=None):
+        self.min_zoom = config.CLUSTER_MIN_ZOOM if min_zoom is None else min_zoom
+        self.max_zoom = config.CLUSTER_MAX_ZOOM if max_zoom is None else max_zoom
+        self.cell_px = cell_px or config.CLUSTER_CELL_PX
+        self.max_age_s = config.CLUSTER_MAX_AGE_S if max_age_s is None else max_age_s
+        self.version = 0
+        self._levels = {zoom: {} for zoom in range(self.min_zoom, self.max_zoom + 1)}
+        # bus_id -> (lat, lon, instante da última posição, células por zoom)
+        self._buses = {}
+        self._loaded = False
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+
+    def _cell_key(self, lat, lon, zoom):
+        x, y = _pixel(lat, lon, zoom)
+        return int(x // self.cell_px), int(y // self.cell_px)
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        rows = BusLocation.query.with_entities(
+            BusLocation.bus_id, BusLocation.id, BusLocation.latitude, BusLocation.longitude).all()
+        with self._lock:
+            if self._loaded:
+                return
+            for bus_id, row_id, lat, lon in rows:
+                # Ônibus cadastrados sem bus_id entram pelo id da linha, com sinal negativo
+                bus_id = bus_id if bus_id is not None else -row_id
+                if bus_id not in self._buses:
+                    self._update(bus_id, lat, lon, time.time())
+            self._loaded = True
+
+    def update(self, bus_id, lat, lon):
+        with self._lock:
+            self._update(bus_id, lat, lon, time.time())
+
+    def _update(self, bus_id, lat, lon, seen_at):
+        previous = self._buses.get(bus_id)
+        keys = []
+        for zoom, level in self._levels.items():
+            key = self._cell_key(lat, lon, zoom)
+            keys.append(key)
+            if previous is not None:
+                old_key = previous[3][zoom - self.min_zoom]
+                old = level[old_key]
+                old.sum_lat -= previous[0]
+                old.sum_lon -= previous[1]
+                if old_key != key:
+                    old.count -= 1
+                    old.members.discard(bus_id)
+                    if old.count == 0:
+                        del level[old_key]
+                else:
+                    old.sum_lat += lat
+                    old.sum_lon += lon
+                    continue
+            cell = level.get(key)
+            if cell is None:
+                cell = level[key] = _Cell()
+            cell.count += 1
+            cell.sum_lat += lat
+            cell.sum_lon += lon
+            cell.members.add(bus_id)
+        self._buses[bus_id] = (lat, lon, seen_at, keys)
+        self.version += 1
+
+    def remove(self, bus_id):
+        with self._lock:
+            self._remove(bus_id)
+
+    def _remove(self, bus_id):
+        previous = self._buses.pop(bus_id, None)
+        if previous is None:
+            return
+        for zoom, level in self._levels.items():
+            key = previous[3][zoom - self.min_zoom]
+            cell = level[key]
+            cell.count -= 1
+            cell.sum_lat -= previous[0]
+            cell.sum_lon -= previous[1]
+            cell.members.discard(bus_id)
+            if cell.count == 0:
+                del level[key]
+        self.version += 1
+
+    def prune(self, now=None):
+        """Remove ônibus sem posição recente (no máximo a cada 30s)."""
+        now = now or time.time()
+        if now - self._last_prune < 30:
+            return
+        with self._lock:
+            self._last_prune = now
+            cutoff = now - self.max_age_s
+            for bus_id in [b for b, state in self._buses.items() if state[2] < cutoff]:
+                self._remove(bus_id)
+
+    def query(self, bbox, zoom):
+        """Agrupamentos dentro de ``bbox`` (min_lon, min_lat, max_lon, max_lat).
+
+        Retorna ``[lat, lon, quantidade, bus_id ou None]``; ``bus_id`` só vem
+        preenchido para células com um único ônibus.
+        """
+        self.ensure_loaded()
+        self.prune()
+        zoom = min(max(int(zoom), self.min_zoom), self.max_zoom)
+        min_lon, min_lat, max_lon, max_lat = bbox
+        x0, y0 = self._cell_key(max_lat, min_lon, zoom)
+        x1, y1 = self._cell_key(min_lat, max_lon, zoom)
+        level = self._levels[zoom]
+        clusters = []
+        with self._lock:
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(level):
+                keys = ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+                cells = ((key, level.get(key)) for key in keys)
+            else:
+                cells = ((key, cell) for key, cell in level.items()
+                         if x0 <= key[0] <= x1 and y0 <= key[1] <= y1)
+            for _, cell in cells:
+                if cell is None:
+                    continue
+                clusters.append([
+                    round(cell.sum_lat / cell.count, 6),
+                    round(cell.sum_lon / cell.count, 6),
+                    cell.count,
+                    next(iter(cell.members)) if cell.count == 1 else None,
+                ])
+        return clusters
+
+    def view_key(self, bbox, zoom):
+        """Chave do viewport arredondado às células, para compartilhar resultados."""
+        zoom = min(max(int(zoom), self.min_zoom), self.max_zoom)
+        min_lon, min_lat, max_lon, max_lat = bbox
+        return (zoom, self._cell_key(max_lat, min_lon, zoom), self._cell_key(min_lat, max_lon, zoom))
+
+
+def parse_bbox(value):
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox deve ter 4 valores')
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError('bbox invertido')
+    return min_lon, min_lat, max_lon, max_lat
+
+
+CLUSTERS = ClusterIndex()
@@ -0,0 +1,126 @@
+"""Exportações administrativas em CSV ou JSONL, transmitidas linha a linha.
+
+As linhas saem de um cursor do servidor (``yield_per``) e são codificadas
+em blocos de até ``EXPORT_FLUSH_BYTES``; nada além de um bloco fica em
+memória, seja qual for o tamanho da exportação. O cabeçalho do CSV sai
+antes da consulta e a primeira linha do JSONL sai sozinha, então o
+primeiro byte é imediato; com gzip, cada bloco é fechado com
+``Z_SYNC_FLUSH`` para não ficar retido no compressor. Transações incluem
+as linhas já movidas para o arquivo frio.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time
+
+from src import config
+from src.models.user import db, Transaction, Rating, Driver, Vehicle
+from src.services.archive import iter_archived
+
+# dataset: (modelo, colunas, coluna de linha de ônibus, tabela no arquivo frio)
+DATASETS = {
+    'transactions': (
+        Transaction,
+        ('id', 'user_id', 'amount', 'transaction_type', 'description', 'route_id', 'created_at'),
+        'route_id',
+        'transaction'
+    ),
+    'ratings': (
+        Rating,
+        ('id', 'user_id', 'overall_rating', 'punctuality_rating', 'cleanliness_rating', 'comfort_rating',
+         'service_rating', 'comments', 'bus_line', 'trip_date', 'trip_time', 'created_at'),
+        'bus_line',
+        None
+    ),
+    'drivers': (
+        Driver,
+        ('id', 'name', 'email', 'cpf', 'cnh', 'bus_line', 'code', 'created_at'),
+        'bus_line',
+        None
+    ),
+    'vehicles': (
+        Vehicle,
+        ('id', 'plate', 'model', 'brand', 'year', 'capacity', 'status', 'bus_line', 'driver_id', 'created_at'),
+        'bus_line',
+        None
+    ),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def _rows(dataset, since=None, until=None, line=None):
+    model, columns, line_column, archive_table = DATASETS[dataset]
+    if archive_table:
+        for row in iter_archived(archive_table, since, until):
+            if line is not None and row[line_column] != line:
+                continue
+            yield tuple(row[column] for column in columns)
+
+    query = db.select(*(getattr(model, column) for column in columns))
+    if since:
+        query = query.where(model.created_at >= since)
+    if until:
+        query = query.where(model.created_at < until)
+    if line is not None:
+        query = query.where(getattr(model, line_column) == line)
+    result = db.session.execute(
+        query.order_by(model.id).execution_options(yield_per=config.EXPORT_CHUNK_ROWS)
+    )
+    for values in result:
+        yield tuple(_plain(value) for value in values)
+
+
+def _encode(dataset, fmt, rows):
+    _, columns, _, _ = DATASETS[dataset]
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        # Cabeçalho sai antes da primeira linha ser lida do banco
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= config.EXPORT_FLUSH_BYTES:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+    else:
+        first = True
+        for row in rows:
+            buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            buffer.write('\n')
+            # A primeira linha sai sozinha, como o cabeçalho do CSV
+            if first or buffer.tell() >= config.EXPORT_FLUSH_BYTES:
+                first = False
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # Sync flush: o bloco chega inteiro ao cliente em vez de esperar o compressor
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def stream_export(dataset, fmt='csv', since=None, until=None, line=None, compress=False):
+    """Gerador de bytes da exportação; ``compress`` produz um arquivo gzip."""
+    chunks = _encode(dataset, fmt, _rows(dataset, since, until, line))
+    return _gzip(chunks) if compress else chunks
@@ -0,0 +1,195 @@
+"""Estado da frota: veículo, motorista, linha, status e última posição.
+
+Montado uma vez com uma única consulta (veículos com motorista e posição)
+e mantido em memória: as rotas administrativas chamam ``refresh_vehicle``,
+``remove_vehicle``, ``refresh_driver`` ou ``invalidate`` depois de cada
+commit, e a ingestão chama ``position`` a cada posição transmitida. Cada
+embarque (``OCCUPANCY.tap``) também gera uma versão do veículo, para que a
+carga chegue nos deltas; o decaimento da carga entre embarques não gera.
+Feeds importados em outro processo chegam pelo ``TRANSIT_VERSION``, e
+veículos e motoristas alterados por outro worker pelo ``ROSTER_VERSION``.
+
+Cada mudança recebe uma versão. O cliente pede o retrato completo uma vez
+e depois só as diferenças desde a versão que já tem (``delta``), por HTTP
+ou pela sala ``fleet`` do Socket.IO.
+"""
+import threading
+from collections import deque
+
+from src import config
+from src.models.user import db, BusLocation, BusRoute, Driver, Vehicle
+from src.services.occupancy import OCCUPANCY, route_number
+from src.services.roster_version import ROSTER_VERSION
+from src.services.transit_version import TRANSIT_VERSION
+
+FIELDS = (
+    'vehicle_id', 'plate', 'brand', 'model', 'year', 'capacity', 'status', 'bus_line',
+    'route_id', 'route_number', 'driver_id', 'driver_name',
+    'latitude', 'longitude', 'last_fix', 'load'
+)
+
+
+class FleetState:
+    def __init__(self, log_size):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._vehicles = {}   # vehicle_id -> dict com os campos de FIELDS (exceto 'load')
+        self._drivers = {}    # driver_id -> {'id', 'name', 'bus_line', 'code'}
+        self._routes = {}     # route_id -> {'id', 'route_number', 'route_name'}
+        self._route_ids = {}  # route_number -> route_id
+        self.version = 0
+        self._log = deque(maxlen=log_size)  # (versão, vehicle_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def _query(self):
+        return (
+            db.session.query(Vehicle, Driver, BusLocation)
+            .outerjoin(Driver, Driver.id == Vehicle.driver_id)
+            .outerjoin(BusLocation, BusLocation.bus_id == Vehicle.id)
+        )
+
+    def _entry(self, vehicle, driver, location):
+        route_id = location.route_id if location and location.route_id else \
+            self._route_ids.get(route_number(vehicle.bus_line))
+        route = self._routes.get(route_id)
+        return {
+            'vehicle_id': vehicle.id,
+            'plate': vehicle.plate,
+            'brand': vehicle.brand,
+            'model': vehicle.model,
+            'year': vehicle.year,
+            'capacity': vehicle.capacity,
+            'status': vehicle.status,
+            'bus_line': vehicle.bus_line,
+            'route_id': route_id,
+            'route_number': route['route_number'] if route else None,
+            'driver_id': vehicle.driver_id,
+            'driver_name': driver.name if driver else None,
+            'latitude': location.latitude if location else None,
+            'longitude': location.longitude if location else None,
+            'last_fix': location.last_updated.isoformat() if location and location.last_updated else None
+        }
+
+    def _touch(self, vehicle_id):
+        self.version += 1
+        self._log.append((self.version, vehicle_id))
+
+    def ensure_loaded(self):
+        TRANSIT_VERSION.check()
+        ROSTER_VERSION.check()
+        if self._loaded:
+            return
+        routes = BusRoute.query.with_entities(BusRoute.id, BusRoute.route_number, BusRoute.route_name).all()
+        drivers = Driver.query.with_entities(Driver.id, Driver.name, Driver.bus_line, Driver.code).all()
+        rows = self._query().all()
+        with self._lock:
+            if self._loaded:
+                return
+            self._routes = {r.id: {'id': r.id, 'route_number': r.route_number, 'route_name': r.route_name}
+                            for r in routes}
+            self._route_ids = {r.route_number: r.id for r in routes}
+            self._drivers = {d.id: {'id': d.id, 'name': d.name, 'bus_line': d.bus_line, 'code': d.code}
+                             for d in drivers}
+            self._vehicles = {vehicle.id: self._entry(vehicle, driver, location)
+                              for vehicle, driver, location in rows}
+            # Versões antigas deixam de valer: quem pedir um delta recebe o retrato completo
+            self._log.clear()
+            self.version += 1
+            self._loaded = True
+
+    def refresh_vehicle(self, vehicle_id):
+        if not self._loaded:
+            return
+        row = self._query().filter(Vehicle.id == vehicle_id).first()
+        with self._lock:
+            if row is None:
+                self._vehicles.pop(vehicle_id, None)
+            else:
+                self._vehicles[vehicle_id] = self._entry(*row)
+            self._touch(vehicle_id)
+
+    def remove_vehicle(self, vehicle_id):
+        with self._lock:
+            if self._vehicles.pop(vehicle_id, None) is not None:
+                self._touch(vehicle_id)
+
+    def refresh_driver(self, driver_id):
+        if not self._loaded:
+            return
+        driver = Driver.query.get(driver_id)
+        rows = self._query().filter(Vehicle.driver_id == driver_id).all()
+        with self._lock:
+            if driver is None:
+                self._drivers.pop(driver_id, None)
+            else:
+                self._drivers[driver_id] = {'id': driver.id, 'name': driver.name,
+                                            'bus_line': driver.bus_line, 'code': driver.code}
+            for vehicle, driver_row, location in rows:
+                self._vehicles[vehicle.id] = self._entry(vehicle, driver_row, location)
+                self._touch(vehicle.id)
+
+    def position(self, bus_id, latitude, longitude, timestamp, route_id=None):
+        """Atualiza a última posição; ônibus sem veículo cadastrado são ignorados."""
+        with self._lock:
+            entry = self._vehicles.get(bus_id)
+            if entry is None:
+                return
+            entry['latitude'] = latitude
+            entry['longitude'] = longitude
+            entry['last_fix'] = timestamp
+            if route_id and route_id != entry['route_id'] and route_id in self._routes:
+                entry['route_id'] = route_id
+                entry['route_number'] = self._routes[route_id]['route_number']
+            self._touch(bus_id)
+
+    def load_changed(self, bus_id):
+        with self._lock:
+            if bus_id in self._vehicles:
+                self._touch(bus_id)
+
+    def _row(self, entry):
+        load = OCCUPANCY.occupancy(entry['vehicle_id'])['load']
+        return [entry[field] for field in FIELDS[:-1]] + [load]
+
+    def snapshot(self):
+        self.ensure_loaded()
+        with self._lock:
+            return {
+                'version': self.version,
+                'full': True,
+                'fields': FIELDS,
+                'vehicles': [self._row(entry) for entry in self._vehicles.values()],
+                'drivers': list(self._drivers.values()),
+                'routes': list(self._routes.values())
+            }
+
+    def delta(self, since):
+        """Mudanças depois da versão ``since``; None se ela já saiu do log (peça o retrato)."""
+        self.ensure_loaded()
+        with self._lock:
+            if since != self.version and (
+                    since > self.version or not self._log or since < self._log[0][0] - 1):
+                return None
+            changed = set()
+            for version, vehicle_id in reversed(self._log):
+                if version <= since:
+                    break
+                changed.add(vehicle_id)
+            upserts = [self._row(self._vehicles[v]) for v in changed if v in self._vehicles]
+            removed = [v for v in changed if v not in self._vehicles]
+            return {
+                'version': self.version,
+                'full': False,
+                'fields': FIELDS,
+                'upserts': upserts,
+                'removed': removed
+            }
+
+
+FLEET = FleetState(config.FLEET_DELTA_LOG)
+OCCUPANCY.subscribe(FLEET.load_changed)
+TRANSIT_VERSION.subscribe(FLEET.invalidate)
+ROSTER_VERSION.subscribe(FLEET.invalidate)
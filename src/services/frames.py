@@ -0,0 +1,88 @@
+"""Codificação compacta de posições enviadas pelos dispositivos dos motoristas.
+
+Quadro binário (little-endian)::
+
+    cabeçalho  <BBH   magic 0xB5, versão 1, quantidade de posições
+    posição    <dii   epoch em segundos (float64), lat * 1e7, lon * 1e7
+
+São 4 bytes de cabeçalho e 16 bytes por posição. Também é aceito um quadro
+msgpack com uma lista de ``[epoch, lat, lon]``, se o pacote ``msgpack``
+estiver instalado.
+
+Posições com epoch não finito ou fora do intervalo de ``datetime``, ou com
+coordenadas fora de ±90/±180, são descartadas na decodificação e contadas
+à parte (``invalid``); o resto do quadro segue normalmente.
+"""
+import math
+import struct
+
+MAGIC = 0xB5
+VERSION = 1
+HEADER = struct.Struct('<BBH')
+FIX = struct.Struct('<dii')
+SCALE = 10_000_000
+MAX_FIXES_PER_FRAME = 1024
+# Epochs aceitos: de 1970 até o fim do ano 9999 (limite de datetime)
+MAX_EPOCH = 253402300799
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_fixes(fixes):
+    """``fixes``: iterável de ``(epoch, lat, lon)``."""
+    fixes = list(fixes)
+    if len(fixes) > MAX_FIXES_PER_FRAME:
+        raise FrameError(f'no máximo {MAX_FIXES_PER_FRAME} posições por quadro')
+    parts = [HEADER.pack(MAGIC, VERSION, len(fixes))]
+    for epoch, lat, lon in fixes:
+        parts.append(FIX.pack(float(epoch), round(lat * SCALE), round(lon * SCALE)))
+    return b''.join(parts)
+
+
+def _decode_binary(frame):
+    magic, version, count = HEADER.unpack_from(frame, 0)
+    if magic != MAGIC or version != VERSION:
+        raise FrameError('cabeçalho de quadro inválido')
+    if count > MAX_FIXES_PER_FRAME or len(frame) != HEADER.size + count * FIX.size:
+        raise FrameError('tamanho de quadro inválido')
+    return [(epoch, lat / SCALE, lon / SCALE)
+            for epoch, lat, lon in FIX.iter_unpack(memoryview(frame)[HEADER.size:])]
+
+
+def _decode_msgpack(frame):
+    try:
+        import msgpack
+    except ImportError:
+        raise FrameError('quadros msgpack exigem o pacote msgpack')
+    try:
+        fixes = msgpack.unpackb(frame)
+    except Exception:
+        raise FrameError('quadro msgpack inválido')
+    if not isinstance(fixes, list) or len(fixes) > MAX_FIXES_PER_FRAME:
+        raise FrameError('quadro msgpack deve ser uma lista de [epoch, lat, lon]')
+    try:
+        return [(float(epoch), float(lat), float(lon)) for epoch, lat, lon in fixes]
+    except (TypeError, ValueError):
+        raise FrameError('quadro msgpack deve ser uma lista de [epoch, lat, lon]')
+
+
+def valid_fix(epoch, lat, lon):
+    return (math.isfinite(epoch) and 0 <= epoch <= MAX_EPOCH
+            and -90 <= lat <= 90 and -180 <= lon <= 180)
+
+
+def decode_fixes(frame):
+    """Retorna ``(posições, inválidas)``: a lista de ``(epoch, lat, lon)``
+    válidas de um quadro binário ou msgpack e quantas foram descartadas.
+    """
+    if not isinstance(frame, (bytes, bytearray, memoryview)) or len(frame) < 1:
+        raise FrameError('quadro deve ser binário')
+    frame = bytes(frame)
+    if frame[0] == MAGIC and len(frame) >= HEADER.size:
+        decoded = _decode_binary(frame)
+    else:
+        decoded = _decode_msgpack(frame)
+    fixes = [fix for fix in decoded if valid_fix(*fix)]
+    return fixes, len(decoded) - len(fixes)
@@ -0,0 +1,98 @@
+"""Funções geométricas básicas sobre coordenadas WGS84."""
+import math
+from bisect import bisect_right
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Distância em metros entre dois pontos."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def decode_polyline(encoded, precision=5):
+    """Decodifica um encoded polyline do Google em lista de (lat, lon)."""
+    points = []
+    index = lat = lon = 0
+    factor = 10 ** precision
+    length = len(encoded)
+    while index < length:
+        for axis in (0, 1):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if axis == 0:
+                lat += delta
+            else:
+                lon += delta
+        points.append((lat / factor, lon / factor))
+    return points
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_polyline(points, precision=5):
+    """Codifica uma lista de (lat, lon) no formato encoded polyline do Google."""
+    factor = 10 ** precision
+    parts = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        lat_i = int(round(lat * factor))
+        lon_i = int(round(lon * factor))
+        parts.append(_encode_value(lat_i - prev_lat))
+        parts.append(_encode_value(lon_i - prev_lon))
+        prev_lat, prev_lon = lat_i, lon_i
+    return ''.join(parts)
+
+
+def densify(points, step_m):
+    """Insere pontos intermediários para que nenhum trecho passe de ``step_m``."""
+    if not points:
+        return []
+    result = [points[0]]
+    for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+        pieces = max(1, int(math.ceil(haversine_m(lat1, lon1, lat2, lon2) / step_m)))
+        for i in range(1, pieces + 1):
+            t = i / pieces
+            result.append((lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t))
+    return result
+
+
+class PolylineWalker:
+    """Posição ao longo de uma linha a partir da distância percorrida."""
+
+    def __init__(self, points):
+        if len(points) < 2:
+            raise ValueError('a linha precisa de pelo menos dois pontos')
+        self.points = points
+        self.cumulative = [0.0]
+        for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+            self.cumulative.append(self.cumulative[-1] + haversine_m(lat1, lon1, lat2, lon2))
+        self.length = self.cumulative[-1]
+
+    def position(self, distance_m):
+        distance_m = min(max(distance_m, 0.0), self.length)
+        i = min(bisect_right(self.cumulative, distance_m), len(self.points) - 1)
+        start, end = self.cumulative[i - 1], self.cumulative[i]
+        t = 0.0 if end == start else (distance_m - start) / (end - start)
+        (lat1, lon1), (lat2, lon2) = self.points[i - 1], self.points[i]
+        return lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t
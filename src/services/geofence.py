@@ -0,0 +1,187 @@
+"""Detecção de chegada e partida dos ônibus nas paradas.
+
+As paradas ficam numa grade espacial em memória (dicionário célula ->
+paradas). Cada posição aceita é comparada só com as paradas da sua célula e
+das oito vizinhas, então o custo por posição não cresce com o número total de
+paradas. A saída usa um raio maior que a entrada (histerese) para que o ruído
+do GPS na borda da cerca não gere chegadas e partidas repetidas.
+
+As visitas são gravadas em ``stop_visit`` na mesma transação da posição; os
+eventos são emitidos no namespace ``/tracking`` para a sala ``stop:<id>``.
+As chegadas ainda não gravadas ficam em ``session.info`` da sessão que as
+adicionou, para que o flush ou o rollback de uma requisição não mexa nas de
+outra.
+
+A grade é descartada por ``invalidate`` (rotas de paradas, neste processo)
+e quando ``TRANSIT_VERSION`` percebe paradas ou feeds alterados por outro
+processo; a verificação é feita antes de cada posição, no máximo a cada
+``TRANSIT_VERSION_CHECK_S`` segundos.
+"""
+import math
+import threading
+
+from src import config
+from src.models.user import db
+from src.models.transit import Stop, StopVisit
+from src.services.geo import haversine_m
+from src.services.metrics import REGISTRY
+from src.services.transit_version import TRANSIT_VERSION
+
+METERS_PER_DEGREE = 111320.0
+# Chave, em session.info, das chegadas ainda não gravadas da sessão
+PENDING_KEY = 'geofence_pending'
+
+GEOFENCE_EVENTS = REGISTRY.counter(
+    'geofence_events_total', 'Chegadas e partidas detectadas nas paradas.', ('event',))
+
+
+class _StopFence:
+    __slots__ = ('id', 'name', 'latitude', 'longitude', 'radius_m')
+
+    def __init__(self, stop):
+        self.id = stop.id
+        self.name = stop.name
+        self.latitude = stop.latitude
+        self.longitude = stop.longitude
+        self.radius_m = stop.radius_m or 30.0
+
+
+class _BusState:
+    __slots__ = ('stop', 'arrived_at', 'visit')
+
+    def __init__(self, stop, arrived_at, visit):
+        self.stop = stop
+        self.arrived_at = arrived_at
+        # StopVisit ainda não gravado, ou o id depois do flush
+        self.visit = visit
+
+
+class GeofenceEngine:
+    def __init__(self, cell_m=None, exit_factor=None):
+        self.cell_m = cell_m or config.GEOFENCE_CELL_M
+        self.exit_factor = exit_factor or config.GEOFENCE_EXIT_FACTOR
+        self._grid = None
+        self._cell_lat = self._cell_lon = None
+        self._buses = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Descarta a grade; será reconstruída na próxima posição."""
+        with self._lock:
+            self._grid = None
+
+    def load(self, stops):
+        fences = [_StopFence(stop) for stop in stops]
+        cell_m = max([self.cell_m] + [f.radius_m * self.exit_factor for f in fences])
+        ref_lat = sum(f.latitude for f in fences) / len(fences) if fences else 0.0
+        cell_lat = cell_m / METERS_PER_DEGREE
+        cell_lon = cell_m / (METERS_PER_DEGREE * max(math.cos(math.radians(ref_lat)), 0.01))
+        grid = {}
+        for fence in fences:
+            key = (int(math.floor(fence.latitude / cell_lat)), int(math.floor(fence.longitude / cell_lon)))
+            grid.setdefault(key, []).append(fence)
+        with self._lock:
+            self._grid = grid
+            self._cell_lat, self._cell_lon = cell_lat, cell_lon
+
+    def _ensure_loaded(self):
+        TRANSIT_VERSION.check()
+        if self._grid is None:
+            self.load(Stop.query.all())
+
+    def nearby(self, lat, lon):
+        grid = self._grid
+        row = int(math.floor(lat / self._cell_lat))
+        col = int(math.floor(lon / self._cell_lon))
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                yield from grid.get((row + dr, col + dc), ())
+
+    def _closest_inside(self, lat, lon, current):
+        best, best_distance = None, None
+        still_inside_current = False
+        for fence in self.nearby(lat, lon):
+            distance = haversine_m(lat, lon, fence.latitude, fence.longitude)
+            if current is not None and fence.id == current.id and distance <= fence.radius_m * self.exit_factor:
+                still_inside_current = True
+            if distance <= fence.radius_m and (best_distance is None or distance < best_distance):
+                best, best_distance = fence, distance
+        return best, still_inside_current
+
+    def process(self, fix):
+        """Atualiza o estado do ônibus com uma posição aceita.
+
+        Adiciona/atualiza ``StopVisit`` na sessão (sem commit) e retorna os
+        eventos ``(nome, dados, sala)`` a emitir depois do commit.
+        """
+        self._ensure_loaded()
+        if not self._grid:
+            return []
+
+        state = self._buses.get(fix.bus_id)
+        current = state.stop if state else None
+        inside, still_inside_current = self._closest_inside(fix.latitude, fix.longitude, current)
+        if still_inside_current and (inside is None or inside.id == current.id):
+            return []
+
+        events = []
+        if state is not None:
+            events.append(self._depart(fix, state))
+            self._buses.pop(fix.bus_id, None)
+        if inside is not None:
+            events.append(self._arrive(fix, inside))
+        return events
+
+    def _arrive(self, fix, fence):
+        visit = StopVisit(stop_id=fence.id, bus_id=fix.bus_id, arrived_at=fix.timestamp)
+        db.session.add(visit)
+        state = _BusState(fence, fix.timestamp, visit)
+        self._buses[fix.bus_id] = state
+        db.session.info.setdefault(PENDING_KEY, []).append(state)
+        GEOFENCE_EVENTS.inc(event='arrival')
+        return ('stop_arrival', {
+            'stop_id': fence.id,
+            'stop_name': fence.name,
+            'bus_id': fix.bus_id,
+            'arrived_at': fix.timestamp.isoformat()
+        }, f'stop:{fence.id}')
+
+    def _depart(self, fix, state):
+        dwell = max((fix.timestamp - state.arrived_at).total_seconds(), 0.0)
+        if isinstance(state.visit, StopVisit):
+            # Chegada e partida no mesmo lote: o objeto ainda não foi gravado
+            state.visit.departed_at = fix.timestamp
+            state.visit.dwell_seconds = dwell
+        else:
+            StopVisit.query.filter_by(id=state.visit).update(
+                {'departed_at': fix.timestamp, 'dwell_seconds': dwell}, synchronize_session=False)
+        GEOFENCE_EVENTS.inc(event='departure')
+        return ('stop_departure', {
+            'stop_id': state.stop.id,
+            'stop_name': state.stop.name,
+            'bus_id': fix.bus_id,
+            'departed_at': fix.timestamp.isoformat(),
+            'dwell_seconds': dwell
+        }, f'stop:{state.stop.id}')
+
+    def after_flush(self):
+        """Troca os ``StopVisit`` recém-gravados pelo id, para que a partida
+        possa ser registrada depois sem recarregar o objeto."""
+        for state in db.session.info.pop(PENDING_KEY, ()):
+            if isinstance(state.visit, StopVisit):
+                state.visit = state.visit.id
+
+    def rollback(self):
+        """Esquece as chegadas desta sessão que não chegaram a ser gravadas."""
+        pending = db.session.info.pop(PENDING_KEY, ())
+        if not pending:
+            return
+        forget = {id(state) for state in pending}
+        with self._lock:
+            for bus_id, current in list(self._buses.items()):
+                if id(current) in forget:
+                    del self._buses[bus_id]
+
+
+GEOFENCE = GeofenceEngine()
+TRANSIT_VERSION.subscribe(GEOFENCE.invalidate)
@@ -0,0 +1,345 @@
+"""Importação em streaming de feeds GTFS.
+
+Os arquivos são lidos direto do zip, linha a linha, e gravados em lotes com
+``executemany``; nada é extraído para o disco e nenhum arquivo é carregado
+inteiro. Em memória ficam só os mapas de ids (paradas, linhas e viagens) e a
+tabela temporária dos pontos de traçado fica no próprio SQLite.
+
+Reimportar o mesmo feed (mesmo ``feed_key``) com a mesma versão não faz
+nada. Com versão nova, as paradas são atualizadas no lugar (mantendo o id e
+o histórico de visitas), as que saíram do feed são removidas com as suas
+visitas, e linhas, viagens, horários, calendários e traçados do feed são
+substituídos. Os níveis simplificados de cada traçado (``route_geometry``)
+são gerados na própria importação.
+
+A importação costuma rodar fora do servidor; os caches dos workers (grade
+das cercas, tabela do planejador) percebem o feed novo pelo
+``TRANSIT_VERSION`` (``src/services/transit_version.py``).
+"""
+import csv
+import hashlib
+import io
+import os
+import zipfile
+from datetime import datetime
+
+from sqlalchemy import insert, text
+
+from src.models.user import db, BusRoute
+from src.models.bus_location import Route, RouteGeometry
+from src.models.transit import (
+    GtfsCalendar, GtfsCalendarDate, GtfsFeed, GtfsRoute, GtfsStopTime, GtfsTrip, Stop, StopVisit,
+)
+from src.services.geo import encode_polyline
+from src.services.route_geometry import build_tiers
+
+CHUNK_SIZE = 10000
+
+
+class GtfsError(ValueError):
+    pass
+
+
+def _checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _rows(archive, name, required=True):
+    if name not in archive.namelist():
+        if required:
+            raise GtfsError(f'{name} ausente no feed')
+        return
+    with archive.open(name) as raw:
+        # utf-8-sig remove o BOM que muitos feeds trazem
+        reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+        for row in reader:
+            yield {k.strip(): (v.strip() if v is not None else '') for k, v in row.items() if k}
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_gtfs_time(value):
+    """'HH:MM:SS' (horas podem passar de 24) em segundos."""
+    hours, minutes, seconds = value.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y%m%d').date()
+
+
+def _feed_identity(archive, path, feed_key):
+    version = None
+    for row in _rows(archive, 'feed_info.txt', required=False):
+        version = row.get('feed_version') or None
+        break
+    if not feed_key:
+        for row in _rows(archive, 'agency.txt', required=False):
+            feed_key = row.get('agency_name') or None
+            break
+    return feed_key or os.path.splitext(os.path.basename(path))[0], version
+
+
+class GtfsImporter:
+    def __init__(self, path, feed_key=None, log=None):
+        self.path = path
+        self.feed_key = feed_key
+        self.log = log or (lambda message: None)
+        self.stats = {}
+
+    def run(self, force=False):
+        """Importa o feed; retorna o ``GtfsFeed`` ou None se já estava atualizado."""
+        checksum = _checksum(self.path)
+        with zipfile.ZipFile(self.path) as archive:
+            feed_key, version = _feed_identity(archive, self.path, self.feed_key)
+            version = version or checksum[:16]
+            feed = GtfsFeed.query.filter_by(feed_key=feed_key).first()
+            if feed and feed.feed_version == version and feed.checksum == checksum and not force:
+                self.log(f'Feed {feed_key} já está na versão {version}; nada a fazer.')
+                return None
+
+            if feed is None:
+                feed = GtfsFeed(feed_key=feed_key, feed_version=version, checksum=checksum)
+                db.session.add(feed)
+                db.session.flush()
+            else:
+                self._clear_schedule(feed.id)
+                feed.feed_version = version
+                feed.checksum = checksum
+                feed.imported_at = datetime.utcnow()
+
+            try:
+                stop_ids = self._import_stops(archive, feed.id)
+                route_ids = self._import_routes(archive, feed.id)
+                shape_ids = self._import_shapes(archive, feed.id)
+                trip_ids = self._import_trips(archive, feed.id, route_ids, shape_ids)
+                del route_ids, shape_ids
+                self._import_stop_times(archive, trip_ids, stop_ids)
+                self._import_calendars(archive, feed.id)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        self.log(f'Feed {feed_key} versão {version} importado: '
+                 + ', '.join(f'{k}={v}' for k, v in self.stats.items()))
+        return feed
+
+    def _clear_schedule(self, feed_id):
+        params = {'feed_id': feed_id}
+        db.session.execute(text(
+            'DELETE FROM gtfs_stop_time WHERE trip_id IN (SELECT id FROM gtfs_trip WHERE feed_id = :feed_id)'
+        ), params)
+        shape_ids = [row[0] for row in db.session.execute(text(
+            'SELECT DISTINCT shape_id FROM gtfs_trip WHERE feed_id = :feed_id AND shape_id IS NOT NULL'
+        ), params)]
+        db.session.execute(text('DELETE FROM gtfs_trip WHERE feed_id = :feed_id'), params)
+        for chunk in _chunks(shape_ids, 500):
+            # O SQLite não aplica a chave estrangeira: os níveis dos traçados saem antes
+            RouteGeometry.query.filter(RouteGeometry.route_id.in_(chunk)).delete(synchronize_session=False)
+            Route.query.filter(Route.id.in_(chunk)).delete(synchronize_session=False)
+        for table in ('gtfs_route', 'gtfs_calendar', 'gtfs_calendar_date'):
+            db.session.execute(text(f'DELETE FROM {table} WHERE feed_id = :feed_id'), params)
+
+    def _import_stops(self, archive, feed_id):
+        existing = dict(db.session.query(Stop.gtfs_id, Stop.id).filter(Stop.feed_id == feed_id))
+        seen = set()
+        count = 0
+        for chunk in _chunks(_rows(archive, 'stops.txt')):
+            new_rows, updates = [], []
+            for row in chunk:
+                # Só pontos de embarque (location_type vazio ou 0)
+                if row.get('location_type') not in (None, '', '0'):
+                    continue
+                values = {
+                    'name': row.get('stop_name') or row['stop_id'],
+                    'latitude': float(row['stop_lat']),
+                    'longitude': float(row['stop_lon']),
+                }
+                seen.add(row['stop_id'])
+                if row['stop_id'] in existing:
+                    values['id'] = existing[row['stop_id']]
+                    updates.append(values)
+                else:
+                    values.update(feed_id=feed_id, gtfs_id=row['stop_id'], radius_m=30.0,
+                                  created_at=datetime.utcnow())
+                    new_rows.append(values)
+            if new_rows:
+                db.session.execute(insert(Stop), new_rows)
+            if updates:
+                db.session.execute(
+                    text('UPDATE stop SET name = :name, latitude = :latitude, longitude = :longitude WHERE id = :id'),
+                    updates
+                )
+            count += len(new_rows) + len(updates)
+        self.stats['stops'] = count
+        # Paradas que saíram do feed; os horários do feed antigo já foram apagados
+        removed = [stop_id for gtfs_id, stop_id in existing.items() if gtfs_id not in seen]
+        for chunk in _chunks(removed, 500):
+            StopVisit.query.filter(StopVisit.stop_id.in_(chunk)).delete(synchronize_session=False)
+            Stop.query.filter(Stop.id.in_(chunk)).delete(synchronize_session=False)
+        self.stats['stops_removed'] = len(removed)
+        return dict(db.session.query(Stop.gtfs_id, Stop.id).filter(Stop.feed_id == feed_id))
+
+    def _import_routes(self, archive, feed_id):
+        bus_routes = dict(db.session.query(BusRoute.route_number, BusRoute.id))
+        count = 0
+        for chunk in _chunks(_rows(archive, 'routes.txt')):
+            db.session.execute(insert(GtfsRoute), [{
+                'feed_id': feed_id,
+                'gtfs_id': row['route_id'],
+                'short_name': row.get('route_short_name') or None,
+                'long_name': row.get('route_long_name') or None,
+                'route_type': int(row['route_type']) if row.get('route_type') else None,
+                'bus_route_id': bus_routes.get(row.get('route_short_name')),
+            } for row in chunk])
+            count += len(chunk)
+        self.stats['routes'] = count
+        return dict(db.session.query(GtfsRoute.gtfs_id, GtfsRoute.id).filter(GtfsRoute.feed_id == feed_id))
+
+    def _import_shapes(self, archive, feed_id):
+        """Grava cada traçado como encoded polyline em ``route``; retorna shape_id -> route.id."""
+        if 'shapes.txt' not in archive.namelist():
+            return {}
+        db.session.execute(text(
+            'CREATE TEMP TABLE IF NOT EXISTS gtfs_shape_point_tmp '
+            '(shape_id TEXT NOT NULL, seq INTEGER NOT NULL, lat FLOAT NOT NULL, lon FLOAT NOT NULL)'
+        ))
+        db.session.execute(text('DELETE FROM gtfs_shape_point_tmp'))
+        points = 0
+        for chunk in _chunks(_rows(archive, 'shapes.txt')):
+            db.session.execute(
+                text('INSERT INTO gtfs_shape_point_tmp (shape_id, seq, lat, lon) VALUES (:shape_id, :seq, :lat, :lon)'),
+                [{'shape_id': row['shape_id'], 'seq': int(row['shape_pt_sequence']),
+                  'lat': float(row['shape_pt_lat']), 'lon': float(row['shape_pt_lon'])} for row in chunk]
+            )
+            points += len(chunk)
+
+        def shapes():
+            # Percorre os pontos já ordenados, montando um traçado de cada vez
+            result = db.session.execute(text(
+                'SELECT shape_id, lat, lon FROM gtfs_shape_point_tmp ORDER BY shape_id, seq'
+            )).yield_per(CHUNK_SIZE)
+            current, coords = None, []
+            for shape_id, lat, lon in result:
+                if shape_id != current and coords:
+                    yield current, coords
+                    coords = []
+                current = shape_id
+                coords.append((lat, lon))
+            if coords:
+                yield current, coords
+
+        def route_rows():
+            for shape_id, coords in shapes():
+                yield {
+                    'route_name': f'gtfs:{feed_id}:{shape_id}',
+                    'origin_lat': coords[0][0], 'origin_lon': coords[0][1],
+                    'destination_lat': coords[-1][0], 'destination_lon': coords[-1][1],
+                    'polyline': encode_polyline(coords),
+                }
+
+        count = 0
+        for chunk in _chunks(route_rows(), 1000):
+            db.session.execute(insert(Route), chunk)
+            count += len(chunk)
+        db.session.execute(text('DROP TABLE gtfs_shape_point_tmp'))
+        self.stats['shapes'] = count
+        self.stats['shape_points'] = points
+        prefix = f'gtfs:{feed_id}:'
+        route_ids = {name[len(prefix):]: route_id for name, route_id in
+                     db.session.query(Route.route_name, Route.id).filter(Route.route_name.startswith(prefix))}
+        # Níveis simplificados de cada traçado, na mesma transação da importação
+        for chunk in _chunks(sorted(route_ids.values()), 500):
+            for route_id, polyline in db.session.query(Route.id, Route.polyline).filter(Route.id.in_(chunk)):
+                build_tiers(route_id, polyline)
+        return route_ids
+
+    def _import_trips(self, archive, feed_id, route_ids, shape_ids):
+        count = 0
+        for chunk in _chunks(_rows(archive, 'trips.txt')):
+            rows = []
+            for row in chunk:
+                route_id = route_ids.get(row['route_id'])
+                if route_id is None:
+                    continue
+                rows.append({
+                    'feed_id': feed_id,
+                    'gtfs_id': row['trip_id'],
+                    'route_id': route_id,
+                    'service_id': row['service_id'],
+                    'headsign': row.get('trip_headsign') or None,
+                    'direction_id': int(row['direction_id']) if row.get('direction_id') else None,
+                    'shape_id': shape_ids.get(row.get('shape_id')),
+                })
+            if rows:
+                db.session.execute(insert(GtfsTrip), rows)
+            count += len(rows)
+        self.stats['trips'] = count
+        return dict(db.session.query(GtfsTrip.gtfs_id, GtfsTrip.id).filter(GtfsTrip.feed_id == feed_id))
+
+    def _import_stop_times(self, archive, trip_ids, stop_ids):
+        count = skipped = 0
+        for chunk in _chunks(_rows(archive, 'stop_times.txt')):
+            rows = []
+            for row in chunk:
+                trip_id = trip_ids.get(row['trip_id'])
+                stop_id = stop_ids.get(row['stop_id'])
+                arrival = row.get('arrival_time') or row.get('departure_time')
+                departure = row.get('departure_time') or arrival
+                if trip_id is None or stop_id is None or not arrival:
+                    # Horários interpolados (em branco) ou referências desconhecidas
+                    skipped += 1
+                    continue
+                rows.append({
+                    'trip_id': trip_id,
+                    'stop_sequence': int(row['stop_sequence']),
+                    'stop_id': stop_id,
+                    'arrival_secs': parse_gtfs_time(arrival),
+                    'departure_secs': parse_gtfs_time(departure),
+                })
+            if rows:
+                db.session.execute(insert(GtfsStopTime), rows)
+            count += len(rows)
+        self.stats['stop_times'] = count
+        if skipped:
+            self.stats['stop_times_skipped'] = skipped
+
+    def _import_calendars(self, archive, feed_id):
+        days = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+        count = 0
+        for chunk in _chunks(_rows(archive, 'calendar.txt', required=False)):
+            db.session.execute(insert(GtfsCalendar), [{
+                'feed_id': feed_id,
+                'service_id': row['service_id'],
+                'weekdays': sum(1 << i for i, day in enumerate(days) if row.get(day) == '1'),
+                'start_date': _parse_date(row['start_date']),
+                'end_date': _parse_date(row['end_date']),
+            } for row in chunk])
+            count += len(chunk)
+        for chunk in _chunks(_rows(archive, 'calendar_dates.txt', required=False)):
+            db.session.execute(insert(GtfsCalendarDate), [{
+                'feed_id': feed_id,
+                'service_id': row['service_id'],
+                'date': _parse_date(row['date']),
+                'exception_type': int(row['exception_type']),
+            } for row in chunk])
+            count += len(chunk)
+        self.stats['calendar_entries'] = count
+
+
+def import_feed(path, feed_key=None, force=False, log=None):
+    return GtfsImporter(path, feed_key, log).run(force=force)
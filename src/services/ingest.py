@@ -0,0 +1,235 @@
+"""Pipeline de ingestão das posições enviadas pelos ônibus.
+
+Toda posição (HTTP ou Socket.IO) passa por ``IngestFilter`` antes de ser
+gravada e transmitida. O filtro usa o horário do dispositivo e descarta:
+
+- ``future``: horário adiantado além da tolerância de relógio;
+- ``stale``: posição antiga demais para ainda ser útil;
+- ``out_of_order``: não é mais nova que a última aceita do mesmo ônibus;
+- ``rate_limited``: chegou antes do intervalo mínimo por ônibus;
+- ``stationary``: o ônibus não se moveu o suficiente (exceto no heartbeat).
+
+Posições com coordenadas não finitas ou fora de ±90/±180 nem chegam ao
+filtro: são recusadas na entrada (``frames.valid_fix``) e contadas como
+``invalid``.
+
+Posições aceitas também alimentam a detecção de chegada/partida nas paradas
+(``src/services/geofence.py``).
+
+O estado do filtro é por processo; a gravação ainda compara com
+``last_updated`` no banco, então posições fora de ordem entregues a workers
+diferentes também são descartadas.
+"""
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from src import config
+from src.extensions import socketio
+from src.models.user import db, BusLocation
+from src.services.clustering import CLUSTERS
+from src.services.occupancy import OCCUPANCY
+from src.services.fleet import FLEET
+from src.services.geo import haversine_m
+from src.services.geofence import GEOFENCE
+from src.services import traces
+from src.services.metrics import REGISTRY
+
+Fix = namedtuple('Fix', ['bus_id', 'latitude', 'longitude', 'timestamp'])
+
+INGEST_FIXES = REGISTRY.counter(
+    'ingest_fixes_total', 'Posições recebidas, por resultado (accepted ou motivo do descarte).',
+    ('result',))
+
+ACCEPTED = 'accepted'
+
+logger = logging.getLogger(__name__)
+
+
+def parse_timestamp(value, now=None):
+    """Converte o horário do dispositivo (epoch em segundos ou ISO 8601) em
+    datetime UTC sem fuso, como o resto do banco. Sem horário, usa o do servidor.
+    Epochs fora do intervalo representável (NaN, infinito, 1e20) dão ValueError.
+    """
+    if value is None or value == '':
+        return now or datetime.utcnow()
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError) as exc:
+            raise ValueError(f'horário fora do intervalo: {value!r}') from exc
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class IngestFilter:
+    def __init__(self, min_interval_s=None, min_distance_m=None, heartbeat_s=None,
+                 max_fix_age_s=None, max_clock_skew_s=None):
+        self.min_interval_s = config.INGEST_MIN_INTERVAL_S if min_interval_s is None else min_interval_s
+        self.min_distance_m = config.INGEST_MIN_DISTANCE_M if min_distance_m is None else min_distance_m
+        self.heartbeat_s = config.INGEST_HEARTBEAT_S if heartbeat_s is None else heartbeat_s
+        self.max_fix_age_s = config.INGEST_MAX_FIX_AGE_S if max_fix_age_s is None else max_fix_age_s
+        self.max_clock_skew_s = config.INGEST_MAX_CLOCK_SKEW_S if max_clock_skew_s is None else max_clock_skew_s
+        # bus_id -> última posição aceita (Fix)
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def check(self, fix, now=None, pending=None):
+        """Retorna ``ACCEPTED`` ou o motivo do descarte.
+
+        A posição aceita vai para ``pending`` (bus_id -> Fix), que vale como
+        última posição para o resto do lote; ela só passa a valer para os
+        próximos lotes com ``remember``, depois do commit. Sem ``pending``,
+        é memorizada na hora.
+        """
+        now = now or datetime.utcnow()
+        age = (now - fix.timestamp).total_seconds()
+        if age < -self.max_clock_skew_s:
+            return 'future'
+        if age > self.max_fix_age_s:
+            return 'stale'
+
+        with self._lock:
+            last = (pending or {}).get(fix.bus_id) or self._last.get(fix.bus_id)
+            if last is not None:
+                elapsed = (fix.timestamp - last.timestamp).total_seconds()
+                if elapsed <= 0:
+                    return 'out_of_order'
+                if elapsed < self.min_interval_s:
+                    return 'rate_limited'
+                if elapsed < self.heartbeat_s:
+                    moved = haversine_m(last.latitude, last.longitude, fix.latitude, fix.longitude)
+                    if moved < self.min_distance_m:
+                        return 'stationary'
+            if pending is None:
+                self._last[fix.bus_id] = fix
+            else:
+                pending[fix.bus_id] = fix
+        return ACCEPTED
+
+    def remember(self, fixes):
+        with self._lock:
+            for fix in fixes:
+                self._last[fix.bus_id] = fix
+
+    def forget(self, bus_id):
+        with self._lock:
+            self._last.pop(bus_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._last.clear()
+
+
+INGEST_FILTER = IngestFilter()
+
+
+def _persist(fix):
+    """Grava a posição se for mais nova que a do banco; retorna a linha ou None."""
+    bus_location = BusLocation.query.filter_by(bus_id=fix.bus_id).first()
+    if not bus_location:
+        bus_location = BusLocation(
+            bus_id=fix.bus_id,
+            bus_number=str(fix.bus_id),
+            latitude=fix.latitude,
+            longitude=fix.longitude,
+            last_updated=fix.timestamp
+        )
+        db.session.add(bus_location)
+    elif bus_location.last_updated and bus_location.last_updated >= fix.timestamp:
+        return None
+    else:
+        bus_location.latitude = fix.latitude
+        bus_location.longitude = fix.longitude
+        bus_location.last_updated = fix.timestamp
+    return bus_location
+
+
+def broadcast_location(location):
+    CLUSTERS.update(location['bus_id'], location['latitude'], location['longitude'])
+    OCCUPANCY.seen(location['bus_id'], location.get('route_id'))
+    FLEET.position(location['bus_id'], location['latitude'], location['longitude'],
+                   location['timestamp'], location.get('route_id'))
+    location['occupancy'] = OCCUPANCY.occupancy(location['bus_id'])
+    # Clientes no modo agrupado saem da sala 'positions' e recebem só 'clusters'
+    socketio.emit('location_update', location, namespace='/tracking', to='positions')
+
+
+def _record(fixes):
+    writer = traces.recorder(config.TRACE_RECORD_PATH)
+    writer.write_many(
+        (fix.bus_id, fix.timestamp.replace(tzinfo=timezone.utc).timestamp(), fix.latitude, fix.longitude)
+        for fix in fixes
+    )
+
+
+def ingest_fixes(fixes, now=None):
+    """Filtra, grava (um único commit) e transmite um lote de posições.
+
+    Retorna uma lista ``(resultado, dados)`` na ordem recebida, onde
+    ``dados`` é o ``to_dict()`` da posição aceita ou None. Do lote, só a
+    posição mais recente de cada ônibus é transmitida. ``now`` permite ao
+    simulador usar um relógio virtual.
+    """
+    if config.TRACE_RECORD_PATH:
+        try:
+            _record(fixes)
+        except Exception:
+            # A gravação da trilha é auxiliar: uma falha nela não derruba a ingestão
+            logger.exception('Falha ao gravar a trilha de posições')
+    now = now or datetime.utcnow()
+    results = []
+    accepted = []
+    events = []
+    pending = {}
+    for fix in fixes:
+        previous = pending.get(fix.bus_id)
+        result = INGEST_FILTER.check(fix, now, pending)
+        if result == ACCEPTED:
+            bus_location = _persist(fix)
+            if bus_location is None:
+                result = 'out_of_order'
+                if previous is None:
+                    del pending[fix.bus_id]
+                else:
+                    pending[fix.bus_id] = previous
+            else:
+                accepted.append((len(results), fix, bus_location))
+                events.extend(GEOFENCE.process(fix))
+        INGEST_FIXES.inc(result=result)
+        results.append([result, None])
+
+    if accepted:
+        try:
+            db.session.flush()
+            GEOFENCE.after_flush()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            GEOFENCE.rollback()
+            raise
+        # Só depois do commit: uma posição que falhou ao gravar não bloqueia as próximas
+        INGEST_FILTER.remember(pending.values())
+        latest = {}
+        for index, fix, bus_location in accepted:
+            # Várias posições do mesmo ônibus no lote compartilham a linha do
+            # banco; os dados de cada resposta vêm da própria posição.
+            location = bus_location.to_dict()
+            timestamp = fix.timestamp.isoformat()
+            location.update(latitude=fix.latitude, longitude=fix.longitude,
+                            last_updated=timestamp, timestamp=timestamp)
+            results[index][1] = location
+            latest[fix.bus_id] = location
+        # Só a posição mais recente de cada ônibus é transmitida
+        for location in latest.values():
+            broadcast_location(location)
+        for name, payload, room in events:
+            socketio.emit(name, payload, namespace='/tracking', to=room)
+    return [tuple(r) for r in results]
+
+
+def ingest_fix(fix):
+    return ingest_fixes([fix])[0]
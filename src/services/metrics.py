@@ -0,0 +1,241 @@
+"""Instrumentação da aplicação no formato texto do Prometheus.
+
+Métricas ficam em memória, por processo, e são servidas em ``/metrics``.
+O custo por requisição é uma leitura de relógio no início e no fim, mais
+duas por consulta SQL, sem alocar nada além dos contadores.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [contagens por faixa (+Inf no fim), soma, total]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_samples(self, items):
+        lines = []
+        bounds = [_format_value(b) for b in self.buckets] + ['+Inf']
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', bound))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Latência das requisições HTTP por endpoint.',
+    ('endpoint', 'method', 'status'))
+REQUEST_DB_TIME = REGISTRY.histogram(
+    'http_request_db_seconds', 'Tempo gasto em SQL por requisição HTTP.',
+    ('endpoint',))
+REQUEST_DB_QUERIES = REGISTRY.histogram(
+    'http_request_db_queries', 'Consultas SQL executadas por requisição HTTP.',
+    ('endpoint',), buckets=COUNT_BUCKETS)
+DB_QUERIES = REGISTRY.counter(
+    'db_queries_total', 'Consultas SQL executadas, por endpoint (ou "background").',
+    ('endpoint',))
+SOCKETIO_CONNECTIONS = REGISTRY.gauge(
+    'socketio_connections', 'Conexões Socket.IO ativas por namespace.',
+    ('namespace',))
+SOCKETIO_EMIT_QUEUE_DEPTH = REGISTRY.gauge(
+    'socketio_emit_queue_depth', 'Mensagens aguardando envio nas filas de emissão.',
+    ('namespace',))
+SOCKETIO_COALESCED = REGISTRY.counter(
+    'socketio_coalesced_total', 'Mensagens retidas substituídas por uma mais recente do mesmo objeto.',
+    ('namespace',))
+SOCKETIO_EVICTIONS = REGISTRY.counter(
+    'socketio_slow_consumer_evictions_total', 'Clientes desconectados por não acompanharem as mensagens.',
+    ('namespace', 'reason'))
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_db_time = 0.0
+    g._metrics_db_queries = 0
+
+
+def _after_request(response):
+    start = g.pop('_metrics_start', None)
+    if start is not None:
+        endpoint = _endpoint()
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint,
+                                method=request.method, status=response.status_code)
+        REQUEST_DB_TIME.observe(g.get('_metrics_db_time', 0.0), endpoint=endpoint)
+        REQUEST_DB_QUERIES.observe(g.get('_metrics_db_queries', 0), endpoint=endpoint)
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_request_context() and '_metrics_start' in g:
+        g._metrics_db_time += elapsed
+        g._metrics_db_queries += 1
+        DB_QUERIES.inc(endpoint=_endpoint())
+    else:
+        DB_QUERIES.inc(endpoint='background')
+
+
+_engine_events_installed = False
+
+
+def init_app(app):
+    global _engine_events_installed
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if not _engine_events_installed:
+        # Ouvintes na classe Engine valem para todos os engines do processo
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _engine_events_installed = True
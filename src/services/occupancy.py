@@ -0,0 +1,238 @@
+"""Lotação estimada de cada veículo a partir dos embarques.
+
+Cada embarque soma 1 à carga do veículo que está servindo a linha; a carga
+decai exponencialmente com ``OCCUPANCY_DECAY_S`` (tempo médio a bordo),
+modelando os desembarques que não são registrados. Guardar só
+``(carga, instante)`` por veículo deixa embarque e consulta em O(1), sem
+ir ao banco.
+
+O veículo de um embarque é o informado pelo validador (``bus_id``) ou, na
+falta dele, o que mais recentemente enviou posição naquela linha. A linha
+de um veículo vem de ``BusLocation.route_id`` ou do ``Vehicle.bus_line``
+cadastrado. As cargas são gravadas em ``vehicle_occupancy`` a cada
+``OCCUPANCY_CHECKPOINT_S`` e restauradas (já com o decaimento) ao iniciar.
+
+Quem mostra a carga (o estado da frota) se registra com ``subscribe`` e é
+avisado a cada embarque. O cadastro de veículos e linhas é recarregado
+também quando ``TRANSIT_VERSION`` percebe um feed novo.
+"""
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert
+
+from src import config
+from src.extensions import socketio
+from src.models.user import db, BusRoute, Vehicle, VehicleOccupancy
+from src.services.profiler import profiled
+from src.services.transit_version import TRANSIT_VERSION
+
+LEVELS = ((0.4, 'baixa'), (0.75, 'media'), (1.0, 'alta'))
+
+
+def route_number(bus_line):
+    """Número da linha em ``bus_line``: '001 - Centro', 'Linha 001' ou '001'."""
+    if not bus_line or not bus_line.strip():
+        return None
+    return bus_line.split(' - ')[0].split()[-1]
+
+
+class OccupancyEngine:
+    def __init__(self, decay_s, vehicle_max_age_s):
+        self.decay_s = decay_s
+        self.vehicle_max_age_s = vehicle_max_age_s
+        self._lock = threading.Lock()
+        self._loads = {}       # bus_id -> [carga, instante epoch]
+        self._serving = {}     # route_id -> (bus_id, visto em)
+        self._capacity = {}    # bus_id -> capacidade
+        self._vehicle_route = {}
+        self._roster_loaded = False
+        self._restored = False
+        self._dirty = False
+        self._checkpoint_task = None
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """Chama ``listener(bus_id)`` a cada embarque atribuído a um veículo."""
+        self._listeners.append(listener)
+        return listener
+
+    def invalidate(self):
+        """Recarrega capacidades e linhas dos veículos na próxima consulta."""
+        with self._lock:
+            self._roster_loaded = False
+
+    def _ensure_roster(self):
+        if self._roster_loaded:
+            return
+        routes = {route_number: route_id for route_id, route_number in
+                  db.session.query(BusRoute.id, BusRoute.route_number)}
+        rows = db.session.query(Vehicle.id, Vehicle.capacity, Vehicle.bus_line).all()
+        with self._lock:
+            self._capacity = {vehicle_id: capacity for vehicle_id, capacity, _ in rows}
+            self._vehicle_route = {
+                vehicle_id: routes[route_number(bus_line)]
+                for vehicle_id, _, bus_line in rows if route_number(bus_line) in routes
+            }
+            self._roster_loaded = True
+
+    def _ensure_restored(self):
+        if self._restored:
+            return
+        rows = VehicleOccupancy.query.all()
+        with self._lock:
+            if self._restored:
+                return
+            for row in rows:
+                if row.bus_id not in self._loads:
+                    self._loads[row.bus_id] = [row.load, row.updated_at.replace(tzinfo=timezone.utc).timestamp()]
+            self._restored = True
+
+    def _ensure_started(self):
+        # Só a primeira chamada vai ao banco; depois são apenas verificações de flag
+        TRANSIT_VERSION.check()
+        self._ensure_roster()
+        self._ensure_restored()
+        if self._checkpoint_task is None:
+            with self._lock:
+                if self._checkpoint_task is None:
+                    self._checkpoint_task = socketio.start_background_task(
+                        self._checkpoint_loop, current_app._get_current_object())
+
+    def _checkpoint_loop(self, app):
+        while True:
+            socketio.sleep(config.OCCUPANCY_CHECKPOINT_S)
+            with app.app_context(), profiled('occupancy_checkpoint'):
+                try:
+                    self.checkpoint()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Falha ao gravar a lotação dos veículos')
+
+    def _decayed(self, bus_id, now):
+        state = self._loads.get(bus_id)
+        if state is None:
+            return 0.0
+        load, at = state
+        return load * math.exp(-max(now - at, 0.0) / self.decay_s)
+
+    def seen(self, bus_id, route_id=None, now=None):
+        """Registra que o veículo está em serviço (chamado a cada posição transmitida)."""
+        self._ensure_started()
+        route_id = route_id or self._vehicle_route.get(bus_id)
+        if route_id is not None:
+            self._serving[route_id] = (bus_id, time.time() if now is None else now)
+
+    def vehicle_for(self, route_id, now=None):
+        serving = self._serving.get(route_id)
+        now = time.time() if now is None else now
+        if serving is None or now - serving[1] > self.vehicle_max_age_s:
+            return None
+        return serving[0]
+
+    def known(self, bus_id):
+        """O veículo existe no cadastro (validação do ``bus_id`` informado pelo validador).
+
+        Um veículo fora do cadastro em memória (criado por outro worker ou por
+        um script) é procurado uma vez no banco e entra no cadastro.
+        """
+        self._ensure_roster()
+        if bus_id in self._capacity:
+            return True
+        vehicle = Vehicle.query.get(bus_id)
+        if vehicle is None:
+            return False
+        route_id = None
+        number = route_number(vehicle.bus_line)
+        if number is not None:
+            route_id = db.session.query(BusRoute.id).filter_by(route_number=number).scalar()
+        with self._lock:
+            self._capacity[vehicle.id] = vehicle.capacity
+            if route_id is not None:
+                self._vehicle_route[vehicle.id] = route_id
+        return True
+
+    def tap(self, route_id, bus_id=None, now=None):
+        """Soma um embarque; retorna o veículo atribuído ou None.
+
+        Um ``bus_id`` fora do cadastro é ignorado (vale o veículo que serve a
+        linha): a carga só é guardada para veículos que existem.
+        """
+        self._ensure_started()
+        now = time.time() if now is None else now
+        if bus_id is not None and not self.known(bus_id):
+            bus_id = None
+        if bus_id is None:
+            bus_id = self.vehicle_for(route_id, now)
+            if bus_id is None:
+                return None
+        with self._lock:
+            self._loads[bus_id] = [self._decayed(bus_id, now) + 1.0, now]
+            self._dirty = True
+        for listener in self._listeners:
+            listener(bus_id)
+        return bus_id
+
+    def occupancy(self, bus_id, now=None):
+        load = self._decayed(bus_id, time.time() if now is None else now)
+        capacity = self._capacity.get(bus_id)
+        ratio = load / capacity if capacity else None
+        level = None
+        if ratio is not None:
+            level = next((name for limit, name in LEVELS if ratio < limit), 'lotado')
+        return {
+            'load': round(load),
+            'capacity': capacity,
+            'ratio': round(ratio, 2) if ratio is not None else None,
+            'level': level
+        }
+
+    def checkpoint(self, now=None):
+        """Grava as cargas deste processo; cargas desprezíveis são descartadas.
+
+        Cada worker só grava os veículos que tem em memória: as linhas dos
+        outros workers ficam, e saem da tabela apenas quando a carga já
+        decaiu a quase zero ou o veículo foi excluído.
+        """
+        if not self._dirty:
+            return 0
+        self._ensure_roster()
+        now = time.time() if now is None else now
+        with self._lock:
+            self._dirty = False
+            for bus_id in [b for b in self._loads if self._decayed(b, now) < 0.5 or b not in self._capacity]:
+                del self._loads[bus_id]
+            rows = [
+                {'bus_id': bus_id, 'load': load, 'updated_at': datetime.fromtimestamp(at, timezone.utc).replace(tzinfo=None)}
+                for bus_id, (load, at) in self._loads.items()
+            ]
+        try:
+            held = {row['bus_id'] for row in rows}
+            faded = [
+                bus_id for bus_id, load, updated_at in
+                db.session.query(VehicleOccupancy.bus_id, VehicleOccupancy.load, VehicleOccupancy.updated_at)
+                if bus_id not in held and load * math.exp(
+                    -max(now - updated_at.replace(tzinfo=timezone.utc).timestamp(), 0.0) / self.decay_s) < 0.5
+            ]
+            db.session.query(VehicleOccupancy).filter(db.or_(
+                VehicleOccupancy.bus_id.in_(faded),
+                VehicleOccupancy.bus_id.notin_(db.select(Vehicle.id))
+            )).delete(synchronize_session=False)
+            if rows:
+                statement = insert(VehicleOccupancy)
+                db.session.execute(statement.on_conflict_do_update(
+                    index_elements=['bus_id'],
+                    set_={'load': statement.excluded.load, 'updated_at': statement.excluded.updated_at}
+                ), rows)
+            db.session.commit()
+        except Exception:
+            # Tenta de novo no próximo ciclo
+            self._dirty = True
+            raise
+        return len(rows)
+
+OCCUPANCY = OccupancyEngine(config.OCCUPANCY_DECAY_S, config.OCCUPANCY_VEHICLE_MAX_AGE_S)
+TRANSIT_VERSION.subscribe(OCCUPANCY.invalidate)
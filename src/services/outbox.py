@@ -0,0 +1,185 @@
+"""Filas de saída por cliente no namespace /tracking, com contrapressão.
+
+O Engine.IO enfileira sem limite tudo o que é emitido para um cliente: um
+passageiro com conexão ruim acumula posições que nunca vai conseguir
+receber, e a memória do servidor cresce com ele. ``OutboxManager`` é o
+``client_manager`` do Socket.IO e intercepta as emissões para /tracking:
+
+* enquanto a fila do Engine.IO do cliente tem menos de
+  ``SOCKETIO_SEND_QUEUE_MAX`` pacotes, a mensagem segue direto;
+* acima disso ela fica retida para aquele cliente. Um ``location_update``
+  do mesmo ônibus (ou um novo ``clusters``) substitui o retido anterior:
+  quem se atrasa recebe o estado mais recente, não o histórico;
+* um laço em segundo plano repassa as retidas conforme a fila esvazia e
+  desconecta quem passa de ``SOCKETIO_PENDING_MAX`` retidas ou continua
+  atrasado depois de ``SOCKETIO_SLOW_CONSUMER_S``.
+
+A memória por cliente fica limitada à fila do Engine.IO mais as retidas.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from engineio import packet as eio_packet
+from socketio import Manager, packet as sio_packet
+
+from src import config
+from src.services.metrics import SOCKETIO_COALESCED, SOCKETIO_EMIT_QUEUE_DEPTH, SOCKETIO_EVICTIONS
+from src.services.profiler import profiled
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = '/tracking'
+# Eventos em que a mensagem nova torna obsoleta a anterior: evento -> campo
+# que identifica o objeto (None: o evento inteiro é um único estado)
+COALESCE = {'location_update': 'bus_id', 'clusters': None}
+# Intervalo entre as atualizações do gauge de profundidade das filas
+DEPTH_REPORT_S = 1.0
+
+
+class OutboxManager(Manager):
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._pending = {}        # eio_sid -> OrderedDict(chave -> pacotes Engine.IO)
+        self._behind_since = {}   # eio_sid -> instante em que passou a ter retidas
+        self._seq = itertools.count()
+        self._task = None
+        self._depth_reported = 0.0
+
+    def initialize(self):
+        super().initialize()
+        if self._task is None:
+            self._task = self.server.start_background_task(self._flush_loop)
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        if namespace != NAMESPACE or callback or namespace not in self.rooms:
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                callback=callback, to=to, **kwargs)
+        if isinstance(data, tuple):
+            data = list(data)
+        elif data is not None:
+            data = [data]
+        else:
+            data = []
+        # Codificado uma vez só, como no Manager original
+        encoded = self.server.packet_class(sio_packet.EVENT, namespace=namespace, data=[event] + data).encode()
+        if not isinstance(encoded, list):
+            encoded = [encoded]
+        packets = [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded]
+        key = self._key(event, data)
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+        for sid, eio_sid in self.get_participants(namespace, to or room):
+            if sid not in skip_sid:
+                self._deliver(eio_sid, packets, key)
+
+    @staticmethod
+    def _key(event, data):
+        if event not in COALESCE:
+            return None
+        field = COALESCE[event]
+        if field is None:
+            return event
+        if data and isinstance(data[0], dict) and field in data[0]:
+            return (event, data[0][field])
+        return None
+
+    def _deliver(self, eio_sid, packets, key):
+        socket = self.server.eio.sockets.get(eio_sid)
+        if socket is None or socket.closed:
+            return
+        overflow = False
+        with self._lock:
+            pending = self._pending.get(eio_sid)
+            direct = pending is None and socket.queue.qsize() < config.SOCKETIO_SEND_QUEUE_MAX
+            if not direct:
+                if pending is None:
+                    pending = self._pending[eio_sid] = OrderedDict()
+                    self._behind_since[eio_sid] = time.monotonic()
+                if key is None:
+                    key = next(self._seq)
+                elif key in pending:
+                    SOCKETIO_COALESCED.inc(namespace=NAMESPACE)
+                pending[key] = packets
+                overflow = len(pending) > config.SOCKETIO_PENDING_MAX
+        if direct:
+            for pkt in packets:
+                socket.send(pkt)
+        elif overflow:
+            self.evict(eio_sid, 'pending')
+
+    def _drop(self, eio_sid):
+        self._pending.pop(eio_sid, None)
+        self._behind_since.pop(eio_sid, None)
+
+    def evict(self, eio_sid, reason):
+        """Desconecta um cliente que não acompanha as mensagens."""
+        SOCKETIO_EVICTIONS.inc(namespace=NAMESPACE, reason=reason)
+        with self._lock:
+            self._drop(eio_sid)
+        eio = self.server.eio
+        socket = eio.sockets.pop(eio_sid, None)
+        if socket is not None:
+            # Sem esperar a fila nem enfileirar o CLOSE: é justamente ela que não anda
+            socket.close(wait=False, abort=True, reason=eio.reason.SERVER_DISCONNECT)
+
+    def disconnect(self, sid, namespace, **kwargs):
+        if namespace == NAMESPACE:
+            eio_sid = self.eio_sid_from_sid(sid, namespace)
+            with self._lock:
+                self._drop(eio_sid)
+        return super().disconnect(sid, namespace, **kwargs)
+
+    def flush(self, now=None):
+        """Repassa as retidas para quem tem espaço na fila; desconecta os atrasados."""
+        now = time.monotonic() if now is None else now
+        sockets = self.server.eio.sockets
+        sends = []
+        slow = []
+        with self._lock:
+            for eio_sid, pending in list(self._pending.items()):
+                socket = sockets.get(eio_sid)
+                if socket is None or socket.closed:
+                    self._drop(eio_sid)
+                    continue
+                room = config.SOCKETIO_SEND_QUEUE_MAX - socket.queue.qsize()
+                while room > 0 and pending:
+                    _, packets = pending.popitem(last=False)
+                    sends.append((socket, packets))
+                    room -= len(packets)
+                if not pending:
+                    self._drop(eio_sid)
+                elif now - self._behind_since[eio_sid] > config.SOCKETIO_SLOW_CONSUMER_S:
+                    slow.append(eio_sid)
+        for socket, packets in sends:
+            for pkt in packets:
+                socket.send(pkt)
+        for eio_sid in slow:
+            self.evict(eio_sid, 'slow')
+        if now - self._depth_reported >= DEPTH_REPORT_S:
+            self._depth_reported = now
+            SOCKETIO_EMIT_QUEUE_DEPTH.set(self.queue_depth(), namespace=NAMESPACE)
+
+    def queue_depth(self):
+        sockets = self.server.eio.sockets
+        queued = 0
+        if NAMESPACE not in self.rooms:
+            return 0
+        for _, eio_sid in self.get_participants(NAMESPACE, None):
+            socket = sockets.get(eio_sid)
+            if socket is not None:
+                queued += socket.queue.qsize()
+        with self._lock:
+            return queued + sum(len(pending) for pending in self._pending.values())
+
+    def _flush_loop(self):
+        while True:
+            self.server.sleep(config.SOCKETIO_FLUSH_INTERVAL_S)
+            try:
+                with profiled('outbox_flush'):
+                    self.flush()
+            except Exception:
+                logger.exception('Falha ao esvaziar as filas de saída do /tracking')
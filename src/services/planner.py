@@ -0,0 +1,408 @@
+"""Planejador de viagens com baldeações (RAPTOR) sobre os horários GTFS.
+
+Os horários são carregados uma vez em arrays compactos (``array('i')``):
+viagens com a mesma sequência de paradas na mesma linha formam um padrão,
+e os horários de cada padrão ficam contíguos, viagem após viagem. A busca é
+feita em rodadas: a rodada k encontra as melhores chegadas usando k
+veículos, olhando só os padrões que passam por paradas melhoradas na rodada
+anterior. Assim o custo depende das linhas alcançáveis, não do tamanho do
+feed, e o resultado é o conjunto de opções não dominadas entre horário de
+chegada e número de baldeações.
+
+A estrutura é reconstruída na primeira consulta após ``invalidate()``,
+chamado pelo ``TRANSIT_VERSION`` quando paradas ou feeds mudam (a rota de
+viagens verifica a cada pedido, em qualquer worker).
+"""
+import math
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+from src import config
+from src.models.user import db
+from src.models.transit import GtfsCalendar, GtfsCalendarDate, GtfsRoute, GtfsStopTime, GtfsTrip, Stop
+from src.services.geo import haversine_m
+from src.services.transit_version import TRANSIT_VERSION
+
+INF = 2 ** 31 - 1
+METERS_PER_DEGREE = 111320.0
+
+
+class _StopGrid:
+    def __init__(self, lats, lons, cell_m):
+        self.lats, self.lons = lats, lons
+        ref_lat = sum(lats) / len(lats) if lats else 0.0
+        self.cell_lat = cell_m / METERS_PER_DEGREE
+        self.cell_lon = cell_m / (METERS_PER_DEGREE * max(math.cos(math.radians(ref_lat)), 0.01))
+        self.cells = {}
+        for index, (lat, lon) in enumerate(zip(lats, lons)):
+            self.cells.setdefault(self._key(lat, lon), []).append(index)
+
+    def _key(self, lat, lon):
+        return int(math.floor(lat / self.cell_lat)), int(math.floor(lon / self.cell_lon))
+
+    def within(self, lat, lon, radius_m):
+        row, col = self._key(lat, lon)
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                for index in self.cells.get((row + dr, col + dc), ()):
+                    distance = haversine_m(lat, lon, self.lats[index], self.lons[index])
+                    if distance <= radius_m:
+                        yield index, distance
+
+
+class Timetable:
+    """Estrutura imutável usada pelas consultas."""
+
+    def __init__(self):
+        self.stop_ids = []            # índice -> stop.id
+        self.stop_index = {}          # stop.id -> índice
+        self.stop_names = []
+        self.stop_lats = array('d')
+        self.stop_lons = array('d')
+        self.pattern_route = array('i')        # padrão -> índice em route_names
+        self.pattern_stop_start = array('i')   # padrão -> início em pattern_stops
+        self.pattern_size = array('i')         # padrão -> nº de paradas
+        self.pattern_trip_start = array('i')   # padrão -> primeira viagem (índice global)
+        self.pattern_trip_count = array('i')
+        self.pattern_stops = array('i')
+        self.pattern_time_start = array('i')   # padrão -> início em arrivals/departures
+        self.arrivals = array('i')
+        self.departures = array('i')
+        self.trip_ids = array('i')             # viagem global -> gtfs_trip.id
+        self.trip_service = array('i')         # viagem global -> índice em services
+        self.trip_headsigns = []
+        self.route_names = []
+        self.services = []                     # (feed_id, service_id)
+        self.stop_patterns_start = array('i')  # CSR parada -> (padrão, posição)
+        self.stop_patterns = array('i')
+        self.transfer_start = array('i')       # CSR parada -> (parada, segundos a pé)
+        self.transfers = array('i')
+        self.grid = None
+        self.built_at = None
+        self._service_days = {}
+
+    @property
+    def size(self):
+        return {
+            'stops': len(self.stop_ids),
+            'patterns': len(self.pattern_size),
+            'trips': len(self.trip_ids),
+            'stop_times': len(self.arrivals),
+            'transfers': len(self.transfers) // 2,
+        }
+
+    def active_services(self, day):
+        """Bytearray com 1 para cada serviço que opera em ``day``."""
+        cached = self._service_days.get(day)
+        if cached is not None:
+            return cached
+        active = bytearray(len(self.services))
+        index = {service: i for i, service in enumerate(self.services)}
+        weekday_bit = 1 << day.weekday()
+        for calendar in GtfsCalendar.query.filter(GtfsCalendar.start_date <= day, GtfsCalendar.end_date >= day):
+            i = index.get((calendar.feed_id, calendar.service_id))
+            if i is not None and calendar.weekdays & weekday_bit:
+                active[i] = 1
+        for exception in GtfsCalendarDate.query.filter_by(date=day):
+            i = index.get((exception.feed_id, exception.service_id))
+            if i is not None:
+                active[i] = 1 if exception.exception_type == 1 else 0
+        if len(self._service_days) > 32:
+            self._service_days.clear()
+        self._service_days[day] = active
+        return active
+
+
+def build_timetable():
+    table = Timetable()
+
+    for stop in db.session.query(Stop.id, Stop.name, Stop.latitude, Stop.longitude).order_by(Stop.id):
+        table.stop_index[stop.id] = len(table.stop_ids)
+        table.stop_ids.append(stop.id)
+        table.stop_names.append(stop.name)
+        table.stop_lats.append(stop.latitude)
+        table.stop_lons.append(stop.longitude)
+
+    route_index = {}
+    for route in db.session.query(GtfsRoute.id, GtfsRoute.short_name, GtfsRoute.long_name):
+        route_index[route.id] = len(table.route_names)
+        table.route_names.append(route.short_name or route.long_name or str(route.id))
+
+    service_index = {}
+    trips = {}
+    for trip in db.session.query(GtfsTrip.id, GtfsTrip.route_id, GtfsTrip.feed_id,
+                                 GtfsTrip.service_id, GtfsTrip.headsign):
+        key = (trip.feed_id, trip.service_id)
+        if key not in service_index:
+            service_index[key] = len(table.services)
+            table.services.append(key)
+        trips[trip.id] = (route_index[trip.route_id], service_index[key], trip.headsign)
+
+    # Agrupa as viagens em padrões (linha + sequência de paradas), lendo os
+    # horários em ordem de viagem sem carregar a tabela de uma vez.
+    patterns = {}
+
+    def flush(trip_id, stops, arrs, deps):
+        if trip_id not in trips or len(stops) < 2:
+            return
+        route, service, headsign = trips[trip_id]
+        patterns.setdefault((route, tuple(stops)), []).append((deps[0], trip_id, service, headsign, arrs, deps))
+
+    current, stops, arrs, deps = None, [], [], []
+    query = (db.session.query(GtfsStopTime.trip_id, GtfsStopTime.stop_id,
+                              GtfsStopTime.arrival_secs, GtfsStopTime.departure_secs)
+             .order_by(GtfsStopTime.trip_id, GtfsStopTime.stop_sequence)
+             .yield_per(50000))
+    for trip_id, stop_id, arrival, departure in query:
+        if trip_id != current:
+            flush(current, stops, arrs, deps)
+            current, stops, arrs, deps = trip_id, [], array('i'), array('i')
+        index = table.stop_index.get(stop_id)
+        if index is None:
+            # Parada excluída depois da importação: a viagem segue sem ela
+            continue
+        stops.append(index)
+        arrs.append(arrival)
+        deps.append(departure)
+    flush(current, stops, arrs, deps)
+
+    stop_patterns = [[] for _ in table.stop_ids]
+    for (route, stop_seq), pattern_trips in patterns.items():
+        # Viagens ordenadas pela partida na primeira parada (FIFO)
+        pattern_trips.sort()
+        p = len(table.pattern_size)
+        table.pattern_route.append(route)
+        table.pattern_stop_start.append(len(table.pattern_stops))
+        table.pattern_size.append(len(stop_seq))
+        table.pattern_trip_start.append(len(table.trip_ids))
+        table.pattern_trip_count.append(len(pattern_trips))
+        table.pattern_time_start.append(len(table.arrivals))
+        for position, stop in enumerate(stop_seq):
+            table.pattern_stops.append(stop)
+            stop_patterns[stop].append((p, position))
+        for _, trip_id, service, headsign, arrs, deps in pattern_trips:
+            table.trip_ids.append(trip_id)
+            table.trip_service.append(service)
+            table.trip_headsigns.append(headsign)
+            table.arrivals.extend(arrs)
+            table.departures.extend(deps)
+    del patterns, trips
+
+    for entries in stop_patterns:
+        table.stop_patterns_start.append(len(table.stop_patterns) // 2)
+        for p, position in entries:
+            table.stop_patterns.extend((p, position))
+    table.stop_patterns_start.append(len(table.stop_patterns) // 2)
+
+    table.grid = _StopGrid(list(table.stop_lats), list(table.stop_lons),
+                           max(config.PLANNER_TRANSFER_RADIUS_M, config.PLANNER_ACCESS_RADIUS_M))
+    for s in range(len(table.stop_ids)):
+        table.transfer_start.append(len(table.transfers) // 2)
+        for other, distance in table.grid.within(table.stop_lats[s], table.stop_lons[s],
+                                                 config.PLANNER_TRANSFER_RADIUS_M):
+            if other != s:
+                table.transfers.extend((other, int(distance / config.PLANNER_WALK_SPEED_MPS)))
+    table.transfer_start.append(len(table.transfers) // 2)
+
+    table.built_at = datetime.utcnow()
+    return table
+
+
+class Planner:
+    def __init__(self):
+        self._table = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._table = None
+
+    def timetable(self):
+        table = self._table
+        if table is None:
+            with self._lock:
+                if self._table is None:
+                    self._table = build_timetable()
+                table = self._table
+        return table
+
+    def access_stops(self, lat, lon):
+        """Paradas a pé de um ponto: {índice: segundos}."""
+        table = self.timetable()
+        return {index: int(distance / config.PLANNER_WALK_SPEED_MPS)
+                for index, distance in table.grid.within(lat, lon, config.PLANNER_ACCESS_RADIUS_M)}
+
+    def plan(self, origins, destinations, day, departure_secs, max_transfers=None):
+        """RAPTOR a partir de ``origins``/``destinations`` ({índice da parada: segundos a pé}).
+
+        Retorna uma lista de itinerários, um por número de veículos, sem
+        opções dominadas (cada uma chega antes das que usam menos veículos).
+        """
+        table = self.timetable()
+        rounds = (config.PLANNER_MAX_TRANSFERS if max_transfers is None else max_transfers) + 1
+        active = table.active_services(day)
+        stop_count = len(table.stop_ids)
+
+        pattern_stop_start = table.pattern_stop_start
+        pattern_size = table.pattern_size
+        pattern_stops = table.pattern_stops
+        pattern_trip_start = table.pattern_trip_start
+        pattern_trip_count = table.pattern_trip_count
+        pattern_time_start = table.pattern_time_start
+        arrivals, departures = table.arrivals, table.departures
+        trip_service = table.trip_service
+        stop_patterns_start, stop_patterns = table.stop_patterns_start, table.stop_patterns
+        transfer_start, transfers = table.transfer_start, table.transfers
+
+        best = [INF] * stop_count
+        previous = [INF] * stop_count
+        parents = [{}]
+        marked = set()
+        for stop, walk in origins.items():
+            arrival = departure_secs + walk
+            if arrival < previous[stop]:
+                previous[stop] = best[stop] = arrival
+                parents[0][stop] = ('access', walk)
+                marked.add(stop)
+
+        journeys = []
+        best_target = INF
+        for k in range(1, rounds + 1):
+            current = previous[:]
+            parent = {}
+            queue = {}
+            for stop in marked:
+                for j in range(stop_patterns_start[stop], stop_patterns_start[stop + 1]):
+                    p, position = stop_patterns[2 * j], stop_patterns[2 * j + 1]
+                    if position < queue.get(p, INF):
+                        queue[p] = position
+            marked = set()
+
+            for p, start in queue.items():
+                size = pattern_size[p]
+                first_stop = pattern_stop_start[p]
+                trip_base = pattern_trip_start[p]
+                trip_count = pattern_trip_count[p]
+                time_base = pattern_time_start[p]
+                trip = -1
+                board_position = -1
+                for position in range(start, size):
+                    stop = pattern_stops[first_stop + position]
+                    if trip >= 0:
+                        arrival = arrivals[time_base + trip * size + position]
+                        if arrival < best[stop] and arrival < best_target:
+                            best[stop] = current[stop] = arrival
+                            parent[stop] = ('ride', p, trip, board_position, position)
+                            marked.add(stop)
+                    ready = previous[stop]
+                    if ready == INF:
+                        continue
+                    if trip >= 0 and ready > departures[time_base + trip * size + position]:
+                        continue
+                    # Primeira viagem que parte depois de ``ready`` (busca binária) e opera no dia
+                    lo, hi = 0, trip_count if trip < 0 else trip
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if departures[time_base + mid * size + position] < ready:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    limit = trip_count if trip < 0 else trip
+                    while lo < limit and not active[trip_service[trip_base + lo]]:
+                        lo += 1
+                    if lo < limit:
+                        trip = lo
+                        board_position = position
+
+            for stop in list(marked):
+                base = current[stop]
+                for j in range(transfer_start[stop], transfer_start[stop + 1]):
+                    other, walk = transfers[2 * j], transfers[2 * j + 1]
+                    if base + walk < best[other] and base + walk < best_target:
+                        best[other] = current[other] = base + walk
+                        parent[other] = ('walk', stop, walk)
+                        marked.add(other)
+
+            parents.append(parent)
+            improved = None
+            for stop, walk in destinations.items():
+                if stop in parent and current[stop] + walk < best_target:
+                    best_target = current[stop] + walk
+                    improved = stop
+            if improved is not None:
+                journeys.append(self._reconstruct(table, parents, improved, k, destinations[improved], day))
+            if not marked:
+                break
+            previous = current
+
+        return journeys
+
+    def _reconstruct(self, table, parents, stop, k, egress, day):
+        legs = []
+        while True:
+            # Rótulos sem melhora numa rodada vêm de rodadas anteriores
+            while k > 0 and stop not in parents[k]:
+                k -= 1
+            if k == 0:
+                break
+            entry = parents[k][stop]
+            while entry[0] == 'walk':
+                _, from_stop, walk = entry
+                legs.append({'mode': 'walk', 'from_stop': table.stop_ids[from_stop],
+                             'to_stop': table.stop_ids[stop], 'duration_s': walk})
+                stop = from_stop
+                entry = parents[k][stop]
+            _, p, trip, board, alight = entry
+            size = table.pattern_size[p]
+            time_base = table.pattern_time_start[p] + trip * size
+            stop_base = table.pattern_stop_start[p]
+            board_stop = table.pattern_stops[stop_base + board]
+            global_trip = table.pattern_trip_start[p] + trip
+            legs.append({
+                'mode': 'bus',
+                'route': table.route_names[table.pattern_route[p]],
+                'headsign': table.trip_headsigns[global_trip],
+                'trip_id': table.trip_ids[global_trip],
+                'from_stop': table.stop_ids[board_stop],
+                'from_name': table.stop_names[board_stop],
+                'to_stop': table.stop_ids[stop],
+                'to_name': table.stop_names[stop],
+                'departure': _clock(day, table.departures[time_base + board]),
+                'arrival': _clock(day, table.arrivals[time_base + alight]),
+                'stops': alight - board,
+            })
+            stop = board_stop
+            k -= 1
+        access = parents[0].get(stop)
+        if access and access[1]:
+            legs.append({'mode': 'walk', 'to_stop': table.stop_ids[stop], 'duration_s': access[1]})
+        legs.reverse()
+        if egress:
+            legs.append({'mode': 'walk', 'from_stop': legs[-1]['to_stop'], 'duration_s': egress})
+        rides = [leg for leg in legs if leg['mode'] == 'bus']
+        return {
+            'transfers': len(rides) - 1,
+            'departure': rides[0]['departure'],
+            'arrival': rides[-1]['arrival'],
+            'legs': legs,
+        }
+
+
+def _clock(day, seconds):
+    return (datetime.combine(day, datetime.min.time()) + timedelta(seconds=seconds)).isoformat()
+
+
+def parse_day_and_time(date_value=None, time_value=None, now=None):
+    """Data (YYYY-MM-DD) e hora (HH:MM) da consulta; padrão: agora."""
+    now = now or datetime.now()
+    day = datetime.strptime(date_value, '%Y-%m-%d').date() if date_value else now.date()
+    if time_value:
+        hours, minutes = time_value.split(':')[:2]
+        seconds = int(hours) * 3600 + int(minutes) * 60
+    else:
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+    return day, seconds
+
+
+PLANNER = Planner()
+TRANSIT_VERSION.subscribe(PLANNER.invalidate)
@@ -0,0 +1,214 @@
+"""Profiler por amostragem ativável em tempo de execução.
+
+Uma thread amostradora lê periodicamente a pilha das threads marcadas (uma
+fração das requisições, requisições de endpoints escolhidos ou tarefas de
+fundo envolvidas em ``profiled``) e agrega as pilhas no formato "collapsed"
+(``quadro;quadro;quadro contagem``), aceito por flamegraph.pl e speedscope.
+Desligado, o custo por requisição é a leitura de um atributo.
+
+No modo de produção (gevent) cada requisição é um greenlet e
+``sys._current_frames()`` só enxerga a pilha do greenlet que está rodando.
+Nesse modo o alvo guarda o próprio greenlet: suspenso, a pilha vem de
+``gr_frame``; rodando, da thread do sistema onde ele está. A amostradora é
+uma thread de verdade (a original, de antes do monkey patch), para
+continuar amostrando enquanto um greenlet segura a CPU.
+"""
+import _thread
+import math
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+from src.extensions import socketio
+
+DEFAULT_INTERVAL = 0.005
+DEFAULT_MAX_STACKS = 5000
+DEFAULT_MAX_DEPTH = 64
+TRUNCATED_STACK = '[pilhas descartadas: limite de memória]'
+
+
+def _native(module, name, default):
+    """``module.name`` de antes do monkey patch do gevent (se aplicado)."""
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is None or not monkey.is_module_patched(module):
+        return default
+    return monkey.get_original(module, name)
+
+
+def _finite(value):
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f'valor não finito: {value!r}')
+    return value
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.endpoints = set()
+        self.interval = DEFAULT_INTERVAL
+        self.max_stacks = DEFAULT_MAX_STACKS
+        self.max_depth = DEFAULT_MAX_DEPTH
+        self.samples = 0
+        self.started_at = None
+        self._stacks = {}
+        self._targets = {}
+        # Trava real: é disputada pela amostradora, que roda fora do hub do gevent
+        self._lock = _native('_thread', 'allocate_lock', threading.Lock)()
+        self._generation = 0
+
+    def configure(self, enabled=None, sample_rate=None, endpoints=None, interval=None, max_stacks=None):
+        # Converte tudo antes de aplicar; NaN e infinito dão ValueError
+        values = {}
+        if sample_rate is not None:
+            values['sample_rate'] = min(max(_finite(sample_rate), 0.0), 1.0)
+        if endpoints is not None:
+            values['endpoints'] = set(endpoints)
+        if interval is not None:
+            values['interval'] = max(_finite(interval), 0.001)
+        if max_stacks is not None:
+            values['max_stacks'] = max(int(max_stacks), 1)
+        for name, value in values.items():
+            setattr(self, name, value)
+        if enabled is True:
+            self.start()
+        elif enabled is False:
+            self.stop()
+
+    def start(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started_at = time.time()
+        # Uma amostradora anterior ainda dormindo encerra ao ver a geração nova
+        self._generation += 1
+        start_thread = _native('_thread', 'start_new_thread', _thread.start_new_thread)
+        start_thread(self._run, (self._generation,))
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._generation += 1
+        with self._lock:
+            self._targets.clear()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def should_sample(self, endpoint):
+        return endpoint in self.endpoints or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def attach(self, label, ident=None):
+        ident = ident or threading.get_ident()
+        greenlet = None
+        if getattr(socketio, 'async_mode', None) == 'gevent':
+            import gevent
+            greenlet = gevent.getcurrent()
+        target = (label, greenlet, _native('_thread', 'get_ident', _thread.get_ident)())
+        with self._lock:
+            self._targets[ident] = target
+        return ident
+
+    def detach(self, ident):
+        with self._lock:
+            self._targets.pop(ident, None)
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    def _sample(self):
+        with self._lock:
+            targets = dict(self._targets)
+        if not targets:
+            return
+        frames = sys._current_frames()
+        collapsed = []
+        for ident, (label, greenlet, thread_ident) in targets.items():
+            if greenlet is None:
+                frame = frames.get(ident)
+            elif greenlet.dead:
+                frame = None
+            else:
+                # Sem gr_frame, o greenlet é o que está rodando na sua thread
+                frame = greenlet.gr_frame or frames.get(thread_ident)
+            if frame is not None:
+                collapsed.append(f'{label};{self._collapse(frame)}')
+        with self._lock:
+            for stack in collapsed:
+                if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                    stack = TRUNCATED_STACK
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+                self.samples += 1
+
+    def _run(self, generation):
+        sleep = _native('time', 'sleep', time.sleep)
+        while True:
+            sleep(self.interval)
+            if generation != self._generation:
+                return
+            self._sample()
+
+    def dump(self):
+        with self._lock:
+            items = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+    def status(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'endpoints': sorted(self.endpoints),
+            'interval': self.interval,
+            'max_stacks': self.max_stacks,
+            'samples': self.samples,
+            'unique_stacks': len(self._stacks),
+            'active_targets': len(self._targets),
+            'started_at': self.started_at,
+        }
+
+
+PROFILER = SamplingProfiler()
+
+
+@contextmanager
+def profiled(label):
+    """Marca o trecho (ex.: um ciclo de flush ou de emissão) para amostragem."""
+    if not PROFILER.enabled:
+        yield
+        return
+    ident = PROFILER.attach(f'task:{label}')
+    try:
+        yield
+    finally:
+        PROFILER.detach(ident)
+
+
+def _before_request():
+    if PROFILER.enabled and PROFILER.should_sample(request.endpoint):
+        g._profiler_ident = PROFILER.attach(f'request:{request.endpoint or "unmatched"}')
+
+
+def _teardown_request(exc):
+    ident = g.pop('_profiler_ident', None)
+    if ident is not None:
+        PROFILER.detach(ident)
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,23 @@
+"""Avisos ao vivo para o passageiro, no namespace /user do Socket.IO.
+
+Cada conexão autenticada entra na sala ``user:<id>`` (e nas ``route:<id>``
+das linhas em que está inscrita). As rotas chamam ``push_balance`` e
+``push_notification`` depois do commit, no lugar do painel perguntar de
+tempos em tempos: o cliente carrega o retrato de /api/dashboard uma vez
+e depois só aplica o que chega aqui.
+"""
+from src.extensions import socketio
+
+NAMESPACE = '/user'
+
+
+def user_room(user_id):
+    return f'user:{user_id}'
+
+
+def push_balance(user):
+    socketio.emit('balance', {'balance': user.card_balance}, namespace=NAMESPACE, to=user_room(user.id))
+
+
+def push_notification(notification):
+    socketio.emit('notification', notification.to_dict(), namespace=NAMESPACE, to=user_room(notification.user_id))
@@ -0,0 +1,70 @@
+"""Contadores horários de embarques por linha.
+
+``record_tap`` soma um embarque ao contador da hora na mesma sessão da
+transação de uso, então os dois são gravados (ou descartados) juntos. Os
+relatórios leem só ``ridership_hourly``, nunca as transações.
+"""
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.user import db, BusRoute, RidershipHourly
+
+GROUPS = ('hour', 'day', 'route')
+
+
+def hour_bucket(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_tap(route_id, fare, moment):
+    statement = insert(RidershipHourly).values(
+        route_id=route_id,
+        hour=hour_bucket(moment),
+        taps=1,
+        revenue=fare
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['route_id', 'hour'],
+        set_={
+            'taps': RidershipHourly.taps + 1,
+            'revenue': RidershipHourly.revenue + statement.excluded.revenue
+        }
+    ))
+
+
+def ridership(since, until, route_ids=None, group='hour'):
+    """Embarques e receita em ``[since, until)``, agrupados por hora, dia ou linha."""
+    if group == 'hour':
+        bucket = RidershipHourly.hour
+    elif group == 'day':
+        bucket = func.date(RidershipHourly.hour)
+    elif group == 'route':
+        bucket = None
+    else:
+        raise ValueError(f'group deve ser um de {GROUPS}')
+
+    columns = [RidershipHourly.route_id, BusRoute.route_number]
+    if bucket is not None:
+        columns.append(bucket.label('bucket'))
+    query = (
+        db.select(*columns, func.sum(RidershipHourly.taps), func.sum(RidershipHourly.revenue))
+        .join(BusRoute, BusRoute.id == RidershipHourly.route_id)
+        .where(RidershipHourly.hour >= hour_bucket(since), RidershipHourly.hour < until)
+    )
+    if route_ids:
+        query = query.where(RidershipHourly.route_id.in_(route_ids))
+    group_by = [RidershipHourly.route_id] + ([bucket] if bucket is not None else [])
+    query = query.group_by(*group_by).order_by(*(group_by[::-1]))
+
+    series = []
+    for row in db.session.execute(query):
+        item = {'route_id': row[0], 'route_number': row[1]}
+        if bucket is not None:
+            value = row[2]
+            item[group] = value.isoformat() if isinstance(value, datetime) else value
+        item['taps'] = row[-2]
+        item['revenue'] = round(row[-1], 2)
+        series.append(item)
+    return series
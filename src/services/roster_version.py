@@ -0,0 +1,37 @@
+"""Versão dos cadastros de veículos, motoristas e usuários vista pelo banco.
+
+Como em ``TRANSIT_VERSION``: o estado da frota (``FLEET``) e o índice de
+busca (``SEARCH``) são mantidos pelas rotas de escrita do próprio processo,
+e uma edição atendida por outro worker nunca chegava a eles. Cada rota que
+grava veículos, motoristas ou usuários chama ``ROSTER_VERSION.bump()``
+antes do commit, somando 1 ao contador ``roster`` da tabela
+``data_version`` na mesma transação. ``check()`` compara esse contador,
+junto com a quantidade e o maior id das tabelas (que pegam inserções
+feitas por scripts), e chama os ouvintes quando ele muda.
+"""
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from src import config
+from src.models.user import db, DataVersion, Driver, User, Vehicle
+from src.services.transit_version import TransitVersion
+
+NAME = 'roster'
+
+
+class RosterVersion(TransitVersion):
+    def _read(self):
+        counter = db.session.query(DataVersion.version).filter_by(name=NAME).scalar()
+        vehicles = db.session.query(func.count(Vehicle.id), func.max(Vehicle.id)).one()
+        drivers = db.session.query(func.count(Driver.id), func.max(Driver.id)).one()
+        users = db.session.query(func.count(User.id), func.max(User.id)).one()
+        return (counter,) + tuple(vehicles) + tuple(drivers) + tuple(users)
+
+    def bump(self):
+        """Marca o cadastro como alterado; vale com o commit da sessão atual."""
+        statement = insert(DataVersion).values(name=NAME, version=1)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['name'], set_={'version': DataVersion.version + 1}))
+
+
+ROSTER_VERSION = RosterVersion(config.ROSTER_VERSION_CHECK_S)
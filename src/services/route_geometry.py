@@ -0,0 +1,70 @@
+"""Traçados de rota em vários níveis de simplificação.
+
+Os níveis são gerados quando o traçado é gravado (a rota buscada na API de
+direções, os traçados da importação GTFS) e guardados em ``route_geometry``
+com o hash do original, na mesma transação. A leitura só consulta os níveis
+prontos: a simplificação, com suas verificações de cruzamento, nunca roda
+num pedido de leitura. Um nível que falta ou foi gerado de outro original
+é servido como o traçado original. O ETag de cada nível é o hash do
+polyline servido, então é forte e estável entre processos.
+"""
+import hashlib
+
+from sqlalchemy.dialects.sqlite import insert
+
+from src import config
+from src.models.user import db
+from src.models.bus_location import RouteGeometry
+
+
+def polyline_etag(polyline):
+    return hashlib.sha256(polyline.encode('ascii')).hexdigest()[:32]
+
+
+def tier_for_zoom(zoom):
+    """Nível para o zoom pedido; None significa o traçado original."""
+    if zoom is None:
+        return None
+    for tier, (max_zoom, _) in enumerate(config.ROUTE_GEOMETRY_TIERS):
+        if zoom <= max_zoom:
+            return tier
+    return None
+
+
+def build_tiers(route_id, polyline):
+    """Gera os níveis do traçado e os grava na sessão; o commit fica com quem chama."""
+    from src.services.geo import decode_polyline, encode_polyline
+    from src.services.simplify import simplify
+
+    source_etag = polyline_etag(polyline)
+    points = decode_polyline(polyline)
+    # Só os níveis de um original antigo; os do original atual ficam
+    RouteGeometry.query.filter(RouteGeometry.route_id == route_id,
+                               RouteGeometry.source_etag != source_etag).delete(synchronize_session=False)
+    tiers = []
+    for tier, (_, tolerance_m) in enumerate(config.ROUTE_GEOMETRY_TIERS):
+        simplified = encode_polyline(simplify(points, tolerance_m))
+        tiers.append({
+            'route_id': route_id,
+            'tier': tier,
+            'tolerance_m': tolerance_m,
+            'polyline': simplified,
+            'point_count': len(decode_polyline(simplified)),
+            'source_etag': source_etag,
+            'etag': polyline_etag(simplified),
+        })
+    db.session.execute(insert(RouteGeometry).on_conflict_do_nothing(), tiers)
+    return tiers
+
+
+def geometry_for(route, zoom):
+    """Retorna ``(polyline, etag)`` do traçado adequado ao zoom."""
+    tier = tier_for_zoom(zoom)
+    if tier is None:
+        return route.polyline, polyline_etag(route.polyline)
+
+    etag = polyline_etag(route.polyline)
+    geometry = RouteGeometry.query.get((route.id, tier))
+    if geometry is None or geometry.source_etag != etag:
+        return route.polyline, etag
+    return geometry.polyline, geometry.etag
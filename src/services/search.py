@@ -0,0 +1,227 @@
+"""Busca administrativa por prefixo: motoristas, veículos e usuários.
+
+Índice em memória, montado uma vez com três consultas e mantido pelas rotas
+de escrita (``refresh_*`` e ``remove`` depois de cada commit, como em
+``FLEET``); escritas atendidas por outro worker (ou feitas por scripts) são
+percebidas pelo ``ROSTER_VERSION``, que faz o índice ser remontado. Cada campo pesquisável vira um ou mais termos normalizados
+(minúsculas, sem acento, só letras e dígitos: "123.456.789-00" e
+"12345678900" dão o mesmo termo) guardados numa lista ordenada por tipo;
+um prefixo é localizado com ``bisect`` e os resultados saem na ordem dos
+termos, sem nenhuma consulta ao banco.
+
+Consultas com várias palavras exigem que cada palavra seja prefixo de
+algum termo do registro: percorre-se o intervalo da palavra mais seletiva
+e as demais são conferidas nos termos do próprio registro. A varredura
+para em ``SEARCH_MAX_MATCHES`` registros, o que limita o custo de um
+prefixo curto como "a".
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from itertools import islice
+
+from src import config
+from src.models.user import db, Driver, User, Vehicle
+from src.services.roster_version import ROSTER_VERSION
+
+# Ordem dos tipos nos resultados
+KINDS = ('driver', 'vehicle', 'user')
+# Campos devolvidos para cada tipo
+FIELDS = {
+    'driver': ('id', 'name', 'email', 'cpf', 'cnh', 'bus_line', 'code'),
+    'vehicle': ('id', 'plate', 'brand', 'model', 'status', 'bus_line'),
+    'user': ('id', 'username', 'email', 'role'),
+}
+# Campos indexados; os de texto livre ('name') entram palavra por palavra
+INDEXED = {
+    'driver': ('name', 'email', 'cpf', 'cnh', 'code'),
+    'vehicle': ('plate',),
+    'user': ('username', 'email'),
+}
+MODELS = {'driver': Driver, 'vehicle': Vehicle, 'user': User}
+
+_NOT_ALNUM = re.compile(r'[^0-9a-z]+')
+# Maior caractere possível: prefixo + _END delimita o fim do intervalo
+_END = '\U0010ffff'
+
+
+def fold(text):
+    """Minúsculas, sem acentos e só com letras e dígitos."""
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _NOT_ALNUM.sub('', text)
+
+
+def _terms(kind, doc):
+    terms = set()
+    for field in INDEXED[kind]:
+        value = doc.get(field)
+        if not value:
+            continue
+        if field == 'name':
+            terms.update(fold(word) for word in str(value).split())
+        terms.add(fold(value))
+    terms.discard('')
+    return tuple(sorted(terms))
+
+
+class SearchIndex:
+    def __init__(self, max_matches):
+        self.max_matches = max_matches
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._docs = {kind: {} for kind in KINDS}   # tipo -> id -> campos de FIELDS
+        self._doc_terms = {kind: {} for kind in KINDS}  # tipo -> id -> termos
+        self._entries = {kind: [] for kind in KINDS}    # tipo -> [(termo, id)] ordenada
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def ensure_loaded(self):
+        ROSTER_VERSION.check()
+        if self._loaded:
+            return
+        rows = {kind: MODELS[kind].query.with_entities(
+                    *(getattr(MODELS[kind], field) for field in FIELDS[kind])
+                ).order_by(MODELS[kind].id).all()
+                for kind in KINDS}
+        with self._lock:
+            if self._loaded:
+                return
+            for kind in KINDS:
+                docs = self._docs[kind] = {}
+                doc_terms = self._doc_terms[kind] = {}
+                entries = []
+                for row in rows[kind]:
+                    doc = dict(zip(FIELDS[kind], row))
+                    docs[doc['id']] = doc
+                    doc_terms[doc['id']] = terms = _terms(kind, doc)
+                    entries.extend((term, doc['id']) for term in terms)
+                entries.sort()
+                self._entries[kind] = entries
+            self._loaded = True
+
+    def _unindex(self, kind, doc_id):
+        entries = self._entries[kind]
+        for term in self._doc_terms[kind].pop(doc_id, ()):
+            i = bisect_left(entries, (term, doc_id))
+            if i < len(entries) and entries[i] == (term, doc_id):
+                del entries[i]
+        return self._docs[kind].pop(doc_id, None)
+
+    def _put(self, kind, row):
+        doc = dict(zip(FIELDS[kind], row))
+        with self._lock:
+            self._unindex(kind, doc['id'])
+            self._docs[kind][doc['id']] = doc
+            self._doc_terms[kind][doc['id']] = terms = _terms(kind, doc)
+            for term in terms:
+                insort(self._entries[kind], (term, doc['id']))
+
+    def _refresh(self, kind, doc_id):
+        if not self._loaded:
+            return
+        model = MODELS[kind]
+        row = db.session.query(*(getattr(model, field) for field in FIELDS[kind])) \
+            .filter(model.id == doc_id).first()
+        if row is None:
+            self.remove(kind, doc_id)
+        else:
+            self._put(kind, row)
+
+    def refresh_driver(self, driver_id):
+        self._refresh('driver', driver_id)
+
+    def refresh_vehicle(self, vehicle_id):
+        self._refresh('vehicle', vehicle_id)
+
+    def refresh_user(self, user_id):
+        self._refresh('user', user_id)
+
+    def remove(self, kind, doc_id):
+        with self._lock:
+            self._unindex(kind, doc_id)
+
+    def _range(self, kind, word):
+        entries = self._entries[kind]
+        return bisect_left(entries, (word,)), bisect_left(entries, (word + _END,))
+
+    def _matches(self, kind, words):
+        """Ids que casam com todas as palavras (na ordem dos termos) e quantos são."""
+        if not words:
+            # Sem consulta: todos, os mais recentes (maior id) primeiro
+            return sorted(self._docs[kind], reverse=True), len(self._docs[kind])
+        ranges = sorted((self._range(kind, word) + (word,) for word in words),
+                        key=lambda r: r[1] - r[0])
+        start, stop, _ = ranges[0]
+        others = [word for _, _, word in ranges[1:]]
+        entries = self._entries[kind]
+        doc_terms = self._doc_terms[kind]
+        found = []
+        seen = set()
+        for i in range(start, stop):
+            doc_id = entries[i][1]
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            terms = doc_terms[doc_id]
+            if all(any(term.startswith(word) for term in terms) for word in others):
+                found.append(doc_id)
+                if len(found) >= self.max_matches:
+                    break
+        return found, len(found)
+
+    def search(self, query, kinds=KINDS, page=1, per_page=20):
+        """Página ``page`` dos resultados de ``query`` nos tipos ``kinds``, em ordem.
+
+        Com uma consulta, ``total`` conta no máximo ``max_matches`` registros
+        por tipo e ``truncated`` indica que a varredura parou antes do fim.
+        """
+        self.ensure_loaded()
+        words = {fold(word) for word in str(query or '').split()} - {''}
+        skip = (page - 1) * per_page
+        results = []
+        total = 0
+        truncated = False
+        with self._lock:
+            for kind in kinds:
+                ids, count = self._matches(kind, words)
+                total += count
+                truncated = truncated or (bool(words) and count >= self.max_matches)
+                if skip >= count:
+                    skip -= count
+                    continue
+                docs = self._docs[kind]
+                results.extend({'kind': kind, **docs[doc_id]}
+                               for doc_id in islice(ids, skip, skip + per_page - len(results)))
+                skip = 0
+        return {
+            'query': query or '',
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'truncated': truncated,
+            'results': results,
+        }
+
+
+def first_conflict(model, values, exclude_id=None):
+    """Primeiro campo de ``values`` (na ordem dada) já usado por outro registro.
+
+    Uma única consulta para todos os campos únicos, em vez de uma por campo.
+    """
+    columns = [getattr(model, field) for field in values]
+    query = db.session.query(*columns).filter(db.or_(*(column == values[field]
+                                                       for field, column in zip(values, columns))))
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    taken = set()
+    for row in query.limit(len(values)).all():
+        taken.update(field for field, value in zip(values, row) if value == values[field])
+    return next((field for field in values if field in taken), None)
+
+
+SEARCH = SearchIndex(config.SEARCH_MAX_MATCHES)
+ROSTER_VERSION.subscribe(SEARCH.invalidate)
@@ -0,0 +1,121 @@
+"""Simplificação de linhas (Douglas-Peucker) que preserva a topologia.
+
+O Douglas-Peucker puro pode fazer trechos distantes da linha se cruzarem
+quando a tolerância é grande (ex.: ida e volta por ruas paralelas). Depois
+da simplificação, cada par de segmentos não adjacentes que se cruza é
+comparado com os cruzamentos do original: se nenhum trecho original coberto
+por um segmento cruza um trecho coberto pelo outro, o cruzamento é novo e é
+corrigido reinserindo o ponto mais distante de cada trecho, até não restar
+cruzamento novo.
+
+Importado sob demanda: só é necessário quando um nível ainda não foi gerado.
+"""
+import math
+
+METERS_PER_DEGREE = 111320.0
+
+
+def _project(points):
+    """Projeção equiretangular local em metros; suficiente para distâncias urbanas."""
+    ref_lat = math.radians(sum(lat for lat, _ in points) / len(points))
+    kx = METERS_PER_DEGREE * math.cos(ref_lat)
+    return [(lon * kx, lat * METERS_PER_DEGREE) for lat, lon in points]
+
+
+def _segment_distance(p, a, b):
+    (px, py), (ax, ay), (bx, by) = p, a, b
+    dx, dy = bx - ax, by - ay
+    if dx == 0 and dy == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def _farthest(xy, start, end):
+    best, best_distance = None, -1.0
+    for i in range(start + 1, end):
+        distance = _segment_distance(xy[i], xy[start], xy[end])
+        if distance > best_distance:
+            best, best_distance = i, distance
+    return best, best_distance
+
+
+def _douglas_peucker(xy, tolerance):
+    keep = [False] * len(xy)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        index, distance = _farthest(xy, start, end)
+        if distance > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _intersects(a, b, c, d):
+    d1, d2 = _cross(c, d, a), _cross(c, d, b)
+    d3, d4 = _cross(a, b, c), _cross(a, b, d)
+    return ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0)) and d1 and d2 and d3 and d4
+
+
+def _crossing_segments(xy, indices):
+    """Pares de segmentos não adjacentes que se cruzam (varredura por caixa envolvente)."""
+    segments = []
+    for n, (i, j) in enumerate(zip(indices, indices[1:])):
+        (ax, ay), (bx, by) = xy[i], xy[j]
+        segments.append((min(ax, bx), max(ax, bx), min(ay, by), max(ay, by), n, i, j))
+    segments.sort()
+    crossings = []
+    active = []
+    for segment in segments:
+        min_x = segment[0]
+        active = [s for s in active if s[1] >= min_x]
+        for other in active:
+            if abs(other[4] - segment[4]) < 2 or other[3] < segment[2] or other[2] > segment[3]:
+                continue
+            if _intersects(xy[other[5]], xy[other[6]], xy[segment[5]], xy[segment[6]]):
+                crossings.append((other, segment))
+        active.append(segment)
+    return crossings
+
+
+def _inherited(crossing, original):
+    """O cruzamento dos segmentos simplificados já existia entre os trechos originais que eles cobrem."""
+    (a_start, a_end), (b_start, b_end) = ((segment[5], segment[6]) for segment in crossing)
+    return any((a_start <= k < a_end and b_start <= m < b_end) or (b_start <= k < b_end and a_start <= m < a_end)
+               for k, m in original)
+
+
+def simplify(points, tolerance_m, max_passes=20):
+    """Simplifica ``points`` [(lat, lon)] com tolerância em metros."""
+    if len(points) < 3 or tolerance_m <= 0:
+        return list(points)
+    xy = _project(points)
+    indices = _douglas_peucker(xy, tolerance_m)
+    original = None
+    for _ in range(max_passes):
+        crossings = _crossing_segments(xy, indices)
+        if crossings and original is None:
+            # Pares de segmentos originais (pelo ponto inicial) que já se cruzam: são legítimos
+            original = [(first[5], second[5]) for first, second in _crossing_segments(xy, list(range(len(xy))))]
+        crossings = [crossing for crossing in crossings if not _inherited(crossing, original)]
+        if not crossings:
+            break
+        added = set()
+        for first, second in crossings:
+            for segment in (first, second):
+                start, end = segment[5], segment[6]
+                if end - start >= 2:
+                    added.add(_farthest(xy, start, end)[0])
+        if not added:
+            break
+        indices = sorted(set(indices) | added)
+    return [points[i] for i in indices]
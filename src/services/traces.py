@@ -0,0 +1,136 @@
+"""Formato compacto de trilhas GPS para gravação e replay.
+
+Arquivo::
+
+    cabeçalho  b'BTRC' + versão (uint16)
+    registro   <Idii   bus_id, epoch em segundos (float64), lat * 1e7, lon * 1e7
+
+São 20 bytes por posição, em ordem de chegada. ``TraceWriter`` só acrescenta
+registros, então o mesmo arquivo pode ser estendido entre execuções.
+Posições que não cabem no registro (bus_id fora de 0..2³²-1, epoch não
+finito, coordenadas fora de ±90/±180) não são gravadas.
+"""
+import csv
+import math
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+
+MAGIC = b'BTRC'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+RECORD = struct.Struct('<Idii')
+SCALE = 10_000_000
+
+
+class TraceError(ValueError):
+    pass
+
+
+def _packable(bus_id, epoch, lat, lon):
+    return (0 <= int(bus_id) <= 0xFFFFFFFF and math.isfinite(epoch)
+            and -90 <= lat <= 90 and -180 <= lon <= 180)
+
+
+class TraceWriter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'ab')
+        if new_file:
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+
+    def write(self, bus_id, epoch, lat, lon):
+        self.write_many([(bus_id, epoch, lat, lon)])
+
+    def write_many(self, records):
+        data = b''.join(RECORD.pack(int(bus_id), float(epoch), round(lat * SCALE), round(lon * SCALE))
+                        for bus_id, epoch, lat, lon in records if _packable(bus_id, epoch, lat, lon))
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_trace(path):
+    """Gera ``(bus_id, epoch, lat, lon)`` sem carregar o arquivo inteiro."""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise TraceError('arquivo de trilha vazio')
+        magic, version = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise TraceError('arquivo não é uma trilha BTRC v1')
+        while True:
+            chunk = f.read(RECORD.size * 4096)
+            if not chunk:
+                break
+            usable = len(chunk) - len(chunk) % RECORD.size
+            for bus_id, epoch, lat, lon in RECORD.iter_unpack(chunk[:usable]):
+                yield bus_id, epoch, lat / SCALE, lon / SCALE
+
+
+def write_trace(path, records):
+    """Grava uma trilha nova, ordenada por horário."""
+    if os.path.exists(path):
+        os.remove(path)
+    writer = TraceWriter(path)
+    try:
+        writer.write_many(sorted(records, key=lambda r: (r[1], r[0])))
+    finally:
+        writer.close()
+
+
+def _epoch(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def load_csv(path, default_bus_id=None):
+    """CSV com cabeçalho ``bus_id,timestamp,latitude,longitude`` (bus_id opcional)."""
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            bus_id = row.get('bus_id') or default_bus_id
+            if bus_id is None:
+                raise TraceError('CSV sem coluna bus_id: informe o ônibus padrão')
+            yield int(bus_id), _epoch(row['timestamp']), float(row['latitude']), float(row['longitude'])
+
+
+def load_gpx(path, bus_id):
+    """Pontos ``trkpt`` de um GPX; todos são atribuídos a ``bus_id``."""
+    for _, element in ElementTree.iterparse(path, events=('end',)):
+        if element.tag.rsplit('}', 1)[-1] != 'trkpt':
+            continue
+        time_text = None
+        for child in element:
+            if child.tag.rsplit('}', 1)[-1] == 'time':
+                time_text = child.text
+        if time_text:
+            yield int(bus_id), _epoch(time_text), float(element.get('lat')), float(element.get('lon'))
+        element.clear()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def recorder(path):
+    """Gravador compartilhado do processo para ``config.TRACE_RECORD_PATH``."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None or _recorder.path != path:
+            _recorder = TraceWriter(path)
+        return _recorder
@@ -0,0 +1,64 @@
+"""Versão dos dados de transporte (paradas e feeds GTFS) vista pelo banco.
+
+Os caches por processo montados a partir das paradas e dos horários (a
+grade do ``GEOFENCE``, a tabela do ``PLANNER``) eram invalidados só pelo
+processo que fez a alteração: a rota administrativa atende um worker, e a
+importação GTFS roda num processo à parte. ``TRANSIT_VERSION.check()``
+lê um carimbo barato do banco (quantidade e maior id das paradas,
+quantidade e última importação dos feeds) e, quando ele muda, chama os
+ouvintes registrados com ``subscribe``.
+
+Cada cache se registra ao ser importado, então módulos carregados sob
+demanda continuam sob demanda. A consulta é feita no máximo a cada
+``TRANSIT_VERSION_CHECK_S`` segundos, salvo quando o chamador pede
+``max_age=0`` (como o planejador, a cada viagem).
+"""
+import threading
+import time
+
+from sqlalchemy import func
+
+from src import config
+from src.models.user import db
+from src.models.transit import GtfsFeed, Stop
+
+
+class TransitVersion:
+    def __init__(self, interval_s):
+        self.interval_s = interval_s
+        self._stamp = None
+        self._checked_at = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        """Chama ``listener()`` sempre que os dados mudarem."""
+        self._listeners.append(listener)
+        return listener
+
+    def _read(self):
+        stops = db.session.query(func.count(Stop.id), func.max(Stop.id)).one()
+        feeds = db.session.query(func.count(GtfsFeed.id), func.max(GtfsFeed.imported_at)).one()
+        return tuple(stops) + tuple(feeds)
+
+    def check(self, max_age=None):
+        """Invalida os caches se os dados mudaram desde a última verificação.
+
+        A primeira verificação do processo também invalida: um cache montado
+        antes dela não tem com o que ser comparado.
+        """
+        max_age = self.interval_s if max_age is None else max_age
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < max_age:
+            return False
+        self._checked_at = now
+        stamp = self._read()
+        with self._lock:
+            changed, self._stamp = stamp != self._stamp, stamp
+        if changed:
+            for listener in list(self._listeners):
+                listener()
+        return changed
+
+
+TRANSIT_VERSION = TransitVersion(config.TRANSIT_VERSION_CHECK_S)
@@ -0,0 +1,273 @@
+"""Gravação, importação, síntese e replay de trilhas GPS.
+
+Exemplos::
+
+    python -m src.simulator synth trilha.btrc --buses 200 --duration 3600
+    python -m src.simulator import-csv posicoes.csv trilha.btrc
+    python -m src.simulator import-gpx viagem.gpx trilha.btrc --bus-id 12
+    python -m src.simulator info trilha.btrc
+    python -m src.simulator replay trilha.btrc --speed 10 --mode http --url http://localhost:5000
+    python -m src.simulator replay trilha.btrc --mode inproc --database sqlite:////tmp/sim.db --no-sleep
+
+Para gravar o tráfego real, defina ``TRACE_RECORD_PATH`` em ``src/config.py``.
+
+No modo ``inproc`` as posições entram direto no pipeline de ingestão com um
+relógio virtual, então o resultado do filtro não depende da velocidade nem
+da carga da máquina. Sem ``--database`` ele usa um SQLite temporário, apagado
+ao final, e nunca o banco da aplicação. No modo ``http`` os horários
+enviados são comprimidos pela velocidade (o servidor compara com o próprio
+relógio), como se cada ônibus reportasse N vezes mais rápido. Com o
+intervalo padrão de 5 s, ``--speed 3`` já põe as posições de um ônibus a
+menos de ``INGEST_MIN_INTERVAL_S`` umas das outras e o filtro as descarta
+como ``rate_limited``: para replays acelerados, suba o servidor com
+``python -m src.server --replay``, que desliga esse intervalo.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from src import config
+from src.services import traces
+from src.services.geo import PolylineWalker, decode_polyline, densify
+
+
+def _route_lines(database=None):
+    """Polylines da tabela ``route``; sem nenhuma, a linha reta origem-destino de config.py."""
+    lines = []
+    if database:
+        from src.main import create_app
+        from src.models.bus_location import Route
+        app = create_app({'SQLALCHEMY_DATABASE_URI': database})
+        with app.app_context():
+            for route in Route.query.filter(Route.polyline.isnot(None)).all():
+                points = decode_polyline(route.polyline)
+                if len(points) >= 2:
+                    lines.append(points)
+    if not lines:
+        lines.append([(config.ROUTE_ORIGIN_LAT, config.ROUTE_ORIGIN_LON),
+                      (config.ROUTE_DEST_LAT, config.ROUTE_DEST_LON)])
+    return [densify(points, 25.0) for points in lines]
+
+
+def synthesize(lines, buses, duration_s, interval_s, seed, first_bus_id=1, start_epoch=0.0):
+    """Gera posições de ``buses`` ônibus indo e voltando pelas linhas.
+
+    Determinístico para a mesma semente: velocidades, paradas e ruído do GPS
+    vêm de um ``random.Random(seed)``.
+    """
+    rng = random.Random(seed)
+    walkers = [PolylineWalker(points) for points in lines]
+    records = []
+    for n in range(buses):
+        walker = walkers[n % len(walkers)]
+        bus_id = first_bus_id + n
+        distance = rng.uniform(0, walker.length)
+        direction = 1 if n % 2 == 0 else -1
+        speed = rng.uniform(6.0, 11.0)
+        dwell = 0.0
+        t = rng.uniform(0, interval_s)
+        while t < duration_s:
+            if dwell > 0:
+                dwell -= interval_s
+            else:
+                distance += direction * speed * interval_s
+                if distance >= walker.length or distance <= 0:
+                    # Fim da linha: aguarda no terminal e volta
+                    distance = min(max(distance, 0.0), walker.length)
+                    direction = -direction
+                    dwell = rng.uniform(60, 300)
+                elif rng.random() < 0.05:
+                    dwell = rng.uniform(15, 45)
+            lat, lon = walker.position(distance)
+            jitter = 0.00002
+            records.append((bus_id, start_epoch + t,
+                            lat + rng.uniform(-jitter, jitter), lon + rng.uniform(-jitter, jitter)))
+            t += interval_s
+    records.sort(key=lambda r: (r[1], r[0]))
+    return records
+
+
+def _batches(records):
+    """Agrupa posições com o mesmo horário para serem enviadas juntas."""
+    batch = []
+    for record in records:
+        if batch and record[1] != batch[0][1]:
+            yield batch
+            batch = []
+        batch.append(record)
+    if batch:
+        yield batch
+
+
+class _HttpSink:
+    def __init__(self, url):
+        import requests
+        self.session = requests.Session()
+        self.url = url.rstrip('/') + '/api/update_location'
+
+    def send(self, batch, device_epochs, virtual_now):
+        results = []
+        for (bus_id, _, lat, lon), epoch in zip(batch, device_epochs):
+            response = self.session.post(self.url, json={
+                'bus_id': bus_id, 'latitude': lat, 'longitude': lon, 'timestamp': epoch
+            })
+            body = response.json() if response.ok else {}
+            results.append('accepted' if body.get('accepted') else body.get('reason', f'http_{response.status_code}'))
+        return results
+
+
+class _InProcessSink:
+    def __init__(self, database):
+        from src.main import create_app
+        from src.migrations import upgrade
+        from src.models.user import db
+        from src.services import ingest
+        self.ingest = ingest
+        self._tmpdir = None
+        if not database:
+            self._tmpdir = tempfile.TemporaryDirectory(prefix='simulator-')
+            database = f"sqlite:///{os.path.join(self._tmpdir.name, 'sim.db')}"
+            print(f'Sem --database: usando o banco temporário {database}', file=sys.stderr)
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': database})
+        with self.app.app_context():
+            upgrade(db.engine)
+
+    def send(self, batch, device_epochs, virtual_now):
+        fixes = [
+            self.ingest.Fix(bus_id, lat, lon, datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None))
+            for (bus_id, _, lat, lon), epoch in zip(batch, device_epochs)
+        ]
+        now = datetime.fromtimestamp(virtual_now, timezone.utc).replace(tzinfo=None)
+        with self.app.app_context():
+            return [result for result, _ in self.ingest.ingest_fixes(fixes, now=now)]
+
+
+def replay(records, sink, speed, sleep=True, http_clock=False, log=print):
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return Counter()
+    t0 = first[1]
+    wall_start = time.time()
+    mono_start = time.monotonic()
+    outcome = Counter()
+    sent = 0
+    max_lag = 0.0
+
+    def chain():
+        yield first
+        yield from records
+
+    for batch in _batches(chain()):
+        offset = (batch[0][1] - t0) / speed
+        if sleep:
+            delay = mono_start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        if http_clock:
+            device_epochs = [wall_start + (r[1] - t0) / speed for r in batch]
+            virtual_now = wall_start + offset
+        else:
+            device_epochs = [wall_start + (r[1] - t0) for r in batch]
+            virtual_now = device_epochs[0]
+        outcome.update(sink.send(batch, device_epochs, virtual_now))
+        sent += len(batch)
+
+    elapsed = time.monotonic() - mono_start
+    log(f'{sent} posições em {elapsed:.2f}s ({sent / elapsed if elapsed else 0:.0f}/s), '
+        f'atraso máximo {max_lag * 1000:.0f} ms')
+    for result, count in outcome.most_common():
+        log(f'  {result}: {count}')
+    return outcome
+
+
+def _info(path):
+    buses = set()
+    count = 0
+    first = last = None
+    for bus_id, epoch, _, _ in traces.read_trace(path):
+        buses.add(bus_id)
+        count += 1
+        first = epoch if first is None else min(first, epoch)
+        last = epoch if last is None else max(last, epoch)
+    print(f'{path}: {count} posições, {len(buses)} ônibus, {os.path.getsize(path)} bytes')
+    if count:
+        print(f'  de {datetime.fromtimestamp(first, timezone.utc).isoformat()} '
+              f'a {datetime.fromtimestamp(last, timezone.utc).isoformat()} ({last - first:.0f}s)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Trilhas GPS: importação, síntese e replay.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    synth = commands.add_parser('synth', help='sintetiza trilhas sobre as rotas cadastradas')
+    synth.add_argument('output')
+    synth.add_argument('--buses', type=int, default=20)
+    synth.add_argument('--duration', type=float, default=3600.0, help='segundos de trilha')
+    synth.add_argument('--interval', type=float, default=5.0, help='segundos entre posições')
+    synth.add_argument('--seed', type=int, default=1)
+    synth.add_argument('--first-bus-id', type=int, default=1)
+    synth.add_argument('--database', help='URI do banco com as polylines da tabela route')
+
+    import_csv = commands.add_parser('import-csv', help='converte CSV bus_id,timestamp,latitude,longitude')
+    import_csv.add_argument('input')
+    import_csv.add_argument('output')
+    import_csv.add_argument('--bus-id', type=int)
+
+    import_gpx = commands.add_parser('import-gpx', help='converte os trkpt de um GPX')
+    import_gpx.add_argument('input')
+    import_gpx.add_argument('output')
+    import_gpx.add_argument('--bus-id', type=int, required=True)
+
+    info = commands.add_parser('info', help='resume uma trilha')
+    info.add_argument('trace')
+
+    replay_cmd = commands.add_parser('replay', help='reproduz uma trilha contra o servidor')
+    replay_cmd.add_argument('trace')
+    replay_cmd.add_argument('--speed', type=float, default=1.0, help='multiplicador do tempo real')
+    replay_cmd.add_argument('--mode', choices=['http', 'inproc'], default='inproc')
+    replay_cmd.add_argument('--url', default='http://localhost:5000')
+    replay_cmd.add_argument('--database', help='URI do banco no modo inproc (padrão: SQLite temporário)')
+    replay_cmd.add_argument('--no-sleep', action='store_true',
+                            help='no modo inproc, não espera entre lotes (relógio só virtual)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'synth':
+        records = synthesize(_route_lines(args.database), args.buses, args.duration, args.interval,
+                             args.seed, args.first_bus_id, start_epoch=time.time())
+        traces.write_trace(args.output, records)
+        _info(args.output)
+    elif args.command == 'import-csv':
+        traces.write_trace(args.output, traces.load_csv(args.input, args.bus_id))
+        _info(args.output)
+    elif args.command == 'import-gpx':
+        traces.write_trace(args.output, traces.load_gpx(args.input, args.bus_id))
+        _info(args.output)
+    elif args.command == 'info':
+        _info(args.trace)
+    elif args.command == 'replay':
+        if args.speed <= 0:
+            parser.error('--speed deve ser positivo')
+        if args.mode == 'http':
+            if args.speed > 1:
+                print('Modo http acelerado: rode o servidor com --replay, ou o filtro de ingestão '
+                      'descarta as posições comprimidas como rate_limited', file=sys.stderr)
+            sink = _HttpSink(args.url)
+        else:
+            sink = _InProcessSink(args.database)
+        replay(traces.read_trace(args.trace), sink, args.speed,
+               sleep=not (args.no_sleep and args.mode == 'inproc'),
+               http_clock=args.mode == 'http')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,11 +12,11 @@
 
 const NOTIFICATION_CONFIG = {
   MIN_BALANCE: 5.00,
-  CHECK_BALANCE_INTERVAL: 30000,      // 30 segundos
-  CHECK_DELAYS_INTERVAL: 60000,       // 60 segundos
+  SOCKET_NAMESPACE: '/user',          // Saldo e notificações chegam por push (Socket.IO)
   MAX_NOTIFICATIONS: 50,              // Máximo de notificações armazenadas
   NOTIFICATION_EXPIRY: 7 * 24 * 60 * 60 * 1000, // 7 dias em milissegundos
   STORAGE_KEY: 'notifications',
+  LATEST_SEEN_KEY: 'notifications_latest_seen', // Id da notificação mais recente já sincronizada
   ENABLE_SOUND: false,                // Habilitar som de notificação
   ENABLE_DESKTOP_NOTIFICATIONS: true, // Habilitar notificações do navegador
 };
@@ -26,8 +26,9 @@ const NOTIFICATION_CONFIG = {
 // ============================================================================
 
 let notifications = [];
-let notificationWebSocket = null;
+let notificationSocket = null;
 let isWebSocketConnected = false;
+let hasConnectedBefore = false;
 
 // ============================================================================
 // CLASSE DE NOTIFICAÇÃO
@@ -175,6 +176,9 @@ class NotificationManager {
   markAsRead(notificationId) {
     const notification = this.notifications.find(n => n.id === notificationId);
     if (notification) {
+      if (!notification.read) {
+        syncReadToBackend(notification);
+      }
       notification.read = true;
       this.saveToStorage();
       this.updateBadge();
@@ -185,6 +189,7 @@ class NotificationManager {
    * Marcar todas as notificações como lidas
    */
   markAllAsRead() {
+    this.notifications.filter(n => !n.read).forEach(syncReadToBackend);
     this.notifications.forEach(n => n.read = true);
     this.saveToStorage();
     this.updateBadge();
@@ -354,7 +359,8 @@ const notificationManager = new NotificationManager();
  */
 async function fetchNotificationsFromAPI() {
   try {
-    const response = await fetch("/api/notifications", {
+    // Só as mais recentes: o sistema local guarda no máximo MAX_NOTIFICATIONS
+    const response = await fetch(`/api/notifications?limit=${NOTIFICATION_CONFIG.MAX_NOTIFICATIONS}`, {
       method: "GET",
       credentials: "include",
     });
@@ -363,34 +369,100 @@ async function fetchNotificationsFromAPI() {
       const apiNotifications = await response.json();
       
       // Adicionar notificações da API ao sistema local, se ainda não existirem
-      apiNotifications.forEach(apiNotif => {
-        // Verificar se a notificação já existe no sistema local (pelo ID do backend)
-        const exists = notificationManager.notifications.some(n => n.options.backendId === apiNotif.id);
-        
-        if (!exists) {
-          // Determinar o tipo da notificação
-          let type = 'info';
-          if (apiNotif.title.includes('Recarga')) {
-            type = 'success';
-          } else if (apiNotif.title.includes('Atraso')) {
-            type = 'line_delay';
-          }
-          
-          // Criar notificação local com o ID do backend
-          notificationManager.add(
-            apiNotif.title, 
-            apiNotif.message, 
-            type,
-            { backendId: apiNotif.id }
-          );
-        }
-      });
+      apiNotifications.reverse().forEach(addBackendNotification);
     }
   } catch (error) {
     console.error('Erro ao buscar notificações da API:', error);
   }
 }
 
+/**
+ * Adicionar uma notificação do backend (da API ou recebida por push), sem duplicar
+ */
+function addBackendNotification(apiNotif) {
+  // Aviso de linha ao vivo: ainda sem ID; a cópia gravada chega depois pela API
+  if (apiNotif.broadcast_id) {
+    notificationManager.add(apiNotif.title, apiNotif.message, 'line_delay', { broadcastId: apiNotif.broadcast_id });
+    return;
+  }
+
+  // Verificar se a notificação já existe no sistema local (pelo ID do backend)
+  if (notificationManager.notifications.some(n => n.options.backendId === apiNotif.id)) {
+    return;
+  }
+
+  // Cópia gravada de um aviso já exibido ao vivo: só associa o ID
+  const live = notificationManager.notifications.find(n =>
+    n.options.broadcastId && !n.options.backendId &&
+    n.title === apiNotif.title && n.message === apiNotif.message
+  );
+  if (live) {
+    live.options.backendId = apiNotif.id;
+    notificationManager.saveToStorage();
+    return;
+  }
+
+  // Determinar o tipo da notificação
+  let type = 'info';
+  if (apiNotif.title.includes('Recarga')) {
+    type = 'success';
+  } else if (apiNotif.title.includes('Atraso')) {
+    type = 'line_delay';
+  }
+  
+  // Criar notificação local com o ID do backend; arquivadas são somente leitura no servidor
+  const notification = notificationManager.add(
+    apiNotif.title, 
+    apiNotif.message, 
+    type,
+    { backendId: apiNotif.id, archived: Boolean(apiNotif.archived) }
+  );
+  if (apiNotif.read) {
+    notification.read = true;
+    notificationManager.saveToStorage();
+    notificationManager.updateBadge();
+  }
+}
+
+/**
+ * Marcar como lida também no servidor. Notificações arquivadas (409) ficam
+ * marcadas só neste navegador.
+ */
+async function syncReadToBackend(notification) {
+  const backendId = notification.options.backendId;
+  if (!backendId || notification.options.archived) {
+    return;
+  }
+  try {
+    const response = await fetch(`/api/notifications/${backendId}/read`, {
+      method: "PUT",
+      credentials: "include",
+    });
+    if (response.status === 409) {
+      notification.options.archived = true;
+      notificationManager.saveToStorage();
+    }
+  } catch (error) {
+    console.error('Erro ao marcar notificação como lida:', error);
+  }
+}
+
+/**
+ * Sincronizar com a notificação mais recente do retrato do painel (/api/dashboard):
+ * a lista só é buscada quando chegou uma notificação de id maior que a última
+ * já sincronizada (a contagem de não lidas pode ficar igual com uma nova lida
+ * e outra recebida)
+ */
+function syncLatestNotification(userId, latestId) {
+  const key = `${NOTIFICATION_CONFIG.LATEST_SEEN_KEY}:${userId}`;
+  const seen = Number(localStorage.getItem(key) || 0);
+  if (!latestId || latestId <= seen) {
+    return;
+  }
+  localStorage.setItem(key, String(latestId));
+  fetchNotificationsFromAPI();
+}
+
 // ============================================================================
 // FUNÇÕES DE VERIFICAÇÃO
 // ============================================================================
@@ -483,53 +555,39 @@ function simulateLineDelays() {
 // ============================================================================
 
 /**
- * Conectar ao WebSocket de notificações
+ * Conectar ao namespace /user do Socket.IO: saldo e notificações do usuário
+ * chegam por push, sem verificações periódicas
  */
 function connectWebSocket() {
-  try {
-    const token = localStorage.getItem('auth_token');
-    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${protocol}//${window.location.host}/ws/notifications?token=${token}`;
-    
-    notificationWebSocket = new WebSocket(wsUrl);
-    
-    notificationWebSocket.onopen = () => {
-      console.log('WebSocket conectado');
-      isWebSocketConnected = true;
-    };
-    
-    notificationWebSocket.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data);
-        
-        if (data.type === 'line_delay') {
-          const title = `Atraso na ${data.line_name}`;
-          const message = `Motivo: ${data.reason}. Tempo estimado de atraso: ${data.delay_minutes} minutos.`;
-          notificationManager.add(title, message, 'line_delay');
-        } else if (data.type === 'low_balance') {
-          const title = 'Atenção: Saldo Baixo!';
-          const message = `Seu saldo atual é de R$ ${data.current_balance.toFixed(2).replace(".", ",")}. Recarregue para evitar interrupções.`;
-          notificationManager.add(title, message, 'low_balance');
-        }
-      } catch (error) {
-        console.error('Erro ao processar mensagem WebSocket:', error);
-      }
-    };
-    
-    notificationWebSocket.onerror = (error) => {
-      console.error('Erro no WebSocket:', error);
-      isWebSocketConnected = false;
-    };
-    
-    notificationWebSocket.onclose = () => {
-      console.log('WebSocket desconectado');
-      isWebSocketConnected = false;
-      // Tentar reconectar em 5 segundos
-      setTimeout(connectWebSocket, 5000);
-    };
-  } catch (error) {
-    console.error('Erro ao conectar WebSocket:', error);
+  if (typeof io === 'undefined') {
+    console.debug('Cliente Socket.IO indisponível: notificações ao vivo desativadas');
+    return;
   }
+
+  notificationSocket = io(NOTIFICATION_CONFIG.SOCKET_NAMESPACE, { withCredentials: true });
+
+  notificationSocket.on('connect', () => {
+    isWebSocketConnected = true;
+    // Ao reconectar, busca o que pode ter chegado enquanto a conexão estava caída
+    if (hasConnectedBefore) {
+      fetchNotificationsFromAPI();
+      window.dispatchEvent(new CustomEvent('realtime:reconnect'));
+    }
+    hasConnectedBefore = true;
+  });
+
+  notificationSocket.on('disconnect', () => {
+    isWebSocketConnected = false;
+  });
+
+  notificationSocket.on('notification', (data) => {
+    addBackendNotification(data);
+  });
+
+  notificationSocket.on('balance', (data) => {
+    checkLowBalance(data.balance);
+    window.dispatchEvent(new CustomEvent('realtime:balance', { detail: data }));
+  });
 }
 
 // ============================================================================
@@ -560,13 +618,11 @@ function initializeNotifications() {
   // Conectar ao WebSocket
   connectWebSocket();
   
-  // Buscar notificações da API na inicialização
-  fetchNotificationsFromAPI();
-  
-  // Iniciar verificações periódicas
-  setInterval(checkLineDelays, NOTIFICATION_CONFIG.CHECK_DELAYS_INTERVAL);
-  // Adicionar verificação periódica para a API (opcional, se o WebSocket não for usado para todas as notificações)
-  // setInterval(fetchNotificationsFromAPI, 60000); // A cada 1 minuto
+  // Buscar notificações da API na inicialização; o painel usa a notificação
+  // mais recente do seu retrato (syncLatestNotification) e só busca quando há novidade
+  if (!window.NOTIFICATIONS_FROM_SNAPSHOT) {
+    fetchNotificationsFromAPI();
+  }
 }
 
 /**
@@ -631,6 +687,7 @@ window.NotificationSystem = {
   getByType: (type) => notificationManager.getByType(type),
   initialize: initializeNotifications,
   checkLowBalance: checkLowBalance,
+  syncLatestNotification: syncLatestNotification,
   checkLineDelays: checkLineDelays,
   connectWebSocket: connectWebSocket,
 };
@@ -0,0 +1,27 @@
+"""Ponto de entrada para servidores WSGI/ASGI (ex.: ``gunicorn src.wsgi:app``).
+
+Com ``--preload`` a aplicação é criada uma única vez no processo mestre e
+herdada pelos workers; as conexões do pool não atravessam o fork. As
+migrações devem rodar antes, uma única vez: ``python -m src.migrate``.
+
+Com ``SERVER_MODE = 'production'`` o Socket.IO usa o gevent, e o servidor
+precisa aplicar o monkey patch (``gunicorn -k gevent``). Para um único
+processo, ``python -m src.server`` já faz isso e esvazia ao desligar.
+"""
+import os
+
+from src import config
+from src.main import create_app
+from src.models.user import db
+
+app = create_app({'SOCKETIO_ASYNC_MODE': 'gevent' if config.SERVER_MODE == 'production' else 'threading'})
+
+
+def _dispose_engines_after_fork():
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engines_after_fork)
@@ -0,0 +1,21 @@
+"""Testes: ``python -m pytest`` na raiz do repositório (como os ``python -m src...``)."""
+import pytest
+
+from src.main import create_app
+from src.migrations import upgrade
+from src.models.user import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Aplicação com um SQLite novo, migrado até a última versão."""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'ARCHIVE_DIR': str(tmp_path / 'archive'),
+        'TESTING': True,
+    })
+    with app.app_context():
+        upgrade(db.engine)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+
+from src.models.archive import ArchiveSegment
+from src.models.user import db, Transaction, User
+from src.services.archive import archive, history, is_archived
+
+CUTOFF = datetime(2024, 6, 1)
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='ana', email='ana@example.com', password='x')
+    other = User(username='bia', email='bia@example.com', password='x')
+    db.session.add_all([user, other])
+    db.session.flush()
+    moments = [datetime(2024, 3, 5), datetime(2024, 3, 20), datetime(2024, 4, 10),
+               datetime(2024, 5, 31, 23), datetime(2024, 6, 2), datetime(2024, 7, 1)]
+    for i, moment in enumerate(moments):
+        db.session.add(Transaction(user_id=user.id, amount=float(i + 1), transaction_type='usage',
+                                   description=f'viagem {i}', created_at=moment))
+        db.session.add(Transaction(user_id=other.id, amount=-1.0, transaction_type='usage',
+                                   created_at=moment))
+    db.session.commit()
+    return user.id
+
+
+def test_archive_moves_old_rows(app, user):
+    assert archive(cutoff=CUTOFF, tables=['transaction']) == {'transaction': 8}
+    assert Transaction.query.filter_by(user_id=user).count() == 2
+    assert {s.month for s in ArchiveSegment.query} == {'2024-03', '2024-04', '2024-05'}
+
+
+def test_history_merges_hot_and_archived(app, user):
+    expected = [row.to_dict() for row in
+                Transaction.query.filter_by(user_id=user)
+                .order_by(Transaction.created_at.desc(), Transaction.id.desc())]
+    archive(cutoff=CUTOFF, tables=['transaction'])
+
+    rows = history('transaction', user)
+    assert [row['id'] for row in rows] == [row['id'] for row in expected]
+    assert [row.get('archived', False) for row in rows] == [False, False, True, True, True, True]
+    assert rows[2]['description'] == 'viagem 3'
+    assert {row['user_id'] for row in rows} == {user}
+
+
+def test_history_limit_and_range(app, user):
+    archive(cutoff=CUTOFF, tables=['transaction'])
+
+    # As linhas quentes bastam: nenhuma arquivada entra
+    assert [row['description'] for row in history('transaction', user, limit=2)] == ['viagem 5', 'viagem 4']
+    assert [row['description'] for row in history('transaction', user, limit=4)] == \
+        ['viagem 5', 'viagem 4', 'viagem 3', 'viagem 2']
+    ranged = history('transaction', user, since=datetime(2024, 3, 10), until=datetime(2024, 6, 1))
+    assert [row['description'] for row in ranged] == ['viagem 3', 'viagem 2', 'viagem 1']
+
+
+def test_is_archived(app, user):
+    old_id = Transaction.query.filter_by(user_id=user).order_by(Transaction.created_at).first().id
+    hot_id = Transaction.query.filter_by(user_id=user).order_by(Transaction.created_at.desc()).first().id
+    archive(cutoff=CUTOFF, tables=['transaction'])
+    assert is_archived('transaction', user, old_id)
+    assert not is_archived('transaction', user, hot_id)
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.services.ingest import ACCEPTED, Fix, IngestFilter
+
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+# ~111 m por 0.001 grau de latitude
+LAT, LON = -23.55, -46.63
+
+
+@pytest.fixture
+def ingest_filter():
+    return IngestFilter(min_interval_s=2.0, min_distance_m=10.0, heartbeat_s=60.0,
+                        max_fix_age_s=300.0, max_clock_skew_s=30.0)
+
+
+def fix(seconds, lat=LAT, bus_id=1):
+    return Fix(bus_id, lat, LON, NOW + timedelta(seconds=seconds))
+
+
+def test_accepts_first_fix(ingest_filter):
+    assert ingest_filter.check(fix(0), now=NOW) == ACCEPTED
+
+
+@pytest.mark.parametrize('seconds, reason', [(31, 'future'), (-301, 'stale')])
+def test_drops_by_device_clock(ingest_filter, seconds, reason):
+    assert ingest_filter.check(fix(seconds), now=NOW) == reason
+
+
+def test_drops_by_previous_fix(ingest_filter):
+    assert ingest_filter.check(fix(0), now=NOW) == ACCEPTED
+    assert ingest_filter.check(fix(0, lat=LAT + 0.001), now=NOW) == 'out_of_order'
+    assert ingest_filter.check(fix(-5, lat=LAT + 0.001), now=NOW) == 'out_of_order'
+    assert ingest_filter.check(fix(1, lat=LAT + 0.001), now=NOW) == 'rate_limited'
+    assert ingest_filter.check(fix(5, lat=LAT + 0.00001), now=NOW) == 'stationary'
+    assert ingest_filter.check(fix(5, lat=LAT + 0.001), now=NOW) == ACCEPTED
+
+
+def test_heartbeat_accepts_stationary_bus(ingest_filter):
+    assert ingest_filter.check(fix(-100), now=NOW) == ACCEPTED
+    assert ingest_filter.check(fix(-50), now=NOW) == 'stationary'
+    assert ingest_filter.check(fix(0), now=NOW) == ACCEPTED
+
+
+def test_buses_are_independent(ingest_filter):
+    assert ingest_filter.check(fix(0, bus_id=1), now=NOW) == ACCEPTED
+    assert ingest_filter.check(fix(0, bus_id=2), now=NOW) == ACCEPTED
+
+
+def test_pending_only_counts_after_remember(ingest_filter):
+    pending = {}
+    assert ingest_filter.check(fix(0), now=NOW, pending=pending) == ACCEPTED
+    # Dentro do lote, a posição pendente já vale como a última
+    assert ingest_filter.check(fix(1, lat=LAT + 0.001), now=NOW, pending=pending) == 'rate_limited'
+    # Lote sem commit: o próximo lote não a vê
+    assert ingest_filter.check(fix(1, lat=LAT + 0.001), now=NOW, pending={}) == ACCEPTED
+
+    ingest_filter.clear()
+    ingest_filter.remember(pending.values())
+    assert ingest_filter.check(fix(1, lat=LAT + 0.001), now=NOW, pending={}) == 'rate_limited'
@@ -0,0 +1,35 @@
+from src.migrations import MIGRATIONS, current_version, latest_version, pending, upgrade
+from src.models.user import db
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')}
+
+
+def test_versions_are_sequential():
+    assert [m.VERSION for m in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_fresh_database_reaches_latest_version(app):
+    assert current_version(db.engine) == latest_version()
+    assert pending(db.engine) == []
+    # Uma segunda execução não aplica nada
+    assert upgrade(db.engine) == []
+
+
+def test_schema_matches_models(app):
+    with db.engine.connect() as conn:
+        for table in db.metadata.sorted_tables:
+            missing = {column.name for column in table.columns} - _columns(conn, table.name)
+            assert not missing, f'{table.name}: colunas ausentes {sorted(missing)}'
+
+
+def test_upgrade_by_steps(tmp_path):
+    from sqlalchemy import create_engine
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'steps.db'}")
+    assert upgrade(engine, target=3) == [1, 2, 3]
+    assert current_version(engine) == 3
+    assert upgrade(engine) == [m.VERSION for m in MIGRATIONS[3:]]
+    assert current_version(engine) == latest_version()
+    engine.dispose()